@@ -1,14 +1,22 @@
 import uvicorn
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from sqlmodel import Session
 
-from database.database import init_db
+from database.config import get_settings
+from database.database import engine, init_db
+from database.partitioning import start_partition_maintenance
 from routes.home import home_route
 from routes.admin import admin_route
 from routes.user import user_route
 from routes.service import service_route
+from services.crud import service as PredictService
+from workers.publisher import publisher
+from workers.routing import model_slug
 
 
+settings = get_settings()
+
 app = FastAPI()
 app.include_router(home_route)
 app.include_router(admin_route)
@@ -29,6 +37,19 @@ app.add_middleware(
 @app.on_event("startup")
 def on_startup():
     init_db()
+    # Exchange задач и очереди моделей объявляются сразу, а не при первой публикации
+    with Session(engine) as session:
+        slugs = {model_slug(m.artifact_path) for m in PredictService.get_all_models(session)}
+    publisher.start(model_slugs=slugs)
+    # Секции predictions и mltasks на следующие месяцы создаются без перезапуска API
+    app.state.partition_maintenance = start_partition_maintenance(
+        engine, settings.PARTITION_CHECK_HOURS * 3600)
+
+
+@app.on_event("shutdown")
+def on_shutdown():
+    publisher.close()
+    app.state.partition_maintenance.set()
 
 
 if __name__ == "__main__":
@@ -15,6 +15,19 @@ class Settings(BaseSettings):
     RMQ_USERNAME: Optional[str] = None
     RMQ_PASSWORD: Optional[str] = None
     RMQ_QUEUE: Optional[str] = None
+    # Очередь уточнения стадии роста по Sentinel-1
+    RMQ_ENRICH_QUEUE: str = "enrichment"
+    # Число долгоживущих каналов публикации в API
+    RMQ_PUBLISHER_POOL_SIZE: int = 4
+    # Задачи маршрутизируются по модели: exchange -> очередь <RMQ_QUEUE>.<модель> с приоритетами
+    RMQ_TASK_EXCHANGE: str = "inference"
+    RMQ_MAX_PRIORITY: int = 10
+    # Модели, которые обслуживает воркер (имена артефактов через запятую); пусто — все
+    WORKER_MODELS: Optional[str] = None
+    # Повторы неудачных сообщений: задержка RMQ_RETRY_BASE_MS * 2^(n-1), после
+    # RMQ_MAX_ATTEMPTS попыток — в очередь <queue>.dlq (см. workers/retry.py)
+    RMQ_MAX_ATTEMPTS: int = 5
+    RMQ_RETRY_BASE_MS: int = 1000
 
     COOKIE_NAME: Optional[str] = None
     SECRET_KEY: Optional[str] = None
@@ -26,6 +39,46 @@ class Settings(BaseSettings):
     MINIO_ACCESS_KEY: Optional[str] = None
     MINIO_SECRET_KEY: Optional[str] = None
     MINIO_SECURE: Optional[str] = None
+    # Клиент MinIO в воркере: пул keep-alive соединений, таймаут чтения, ретраи
+    MINIO_POOL_SIZE: int = 10
+    MINIO_TIMEOUT_SECONDS: float = 30
+    MINIO_RETRIES: int = 3
+    # Локальный read-through кэш объектов в воркере (выключен, если каталог не задан)
+    OBJECT_CACHE_DIR: Optional[str] = None
+    OBJECT_CACHE_MAX_MB: int = 256
+
+    # Потоковая загрузка изображений в MinIO
+    UPLOAD_MAX_BYTES: int = 25 * 1024 * 1024
+    UPLOAD_PART_SIZE: int = 5 * 1024 * 1024
+    UPLOAD_MAX_CONCURRENCY: int = 4
+
+    # Лимит памяти под веса моделей на контейнер воркера: модели, закреплённые до fork,
+    # общие для всех процессов, остаток делится между процессами супервизора поровну
+    MODEL_CACHE_MAX_MB: int = 512
+    # Микробатчинг: до WORKER_BATCH_SIZE сообщений, ожидание не дольше WORKER_BATCH_WAIT_MS
+    WORKER_BATCH_SIZE: int = 1
+    WORKER_BATCH_WAIT_MS: int = 50
+    # Супервизор воркера: WORKER_PROCESSES процессов инференса (0 — по одному на
+    # WORKER_THREADS_PER_PROCESS ядер), ядра контейнера делятся между ними поровну
+    WORKER_PROCESSES: int = 0
+    WORKER_THREADS_PER_PROCESS: int = 2
+    # Как часто API создаёт месячные секции predictions и mltasks наперёд
+    PARTITION_CHECK_HOURS: int = 24
+    # Как часто воркер сверяет метку версии таблицы рекомендаций (перечитывает только при изменении)
+    RECOMMENDATION_REFRESH_SECONDS: int = 300
+
+    # Локальное хранилище артефактов моделей; ARTIFACT_SOURCE_DIR подменяет WandB каталогом
+    ARTIFACT_STORE_DIR: str = "/root/.cache/agrispectra/artifacts"
+    ARTIFACT_SOURCE_DIR: Optional[str] = None
+    GROWTH_KMEANS_ARTIFACT: str = "a-gapeeva/growth-and-moisture-kmeans/growth-kmeans:latest"
+
+    # Google Earth Engine и кэш стадии роста по Sentinel-1
+    EE_SERVICE_ACCOUNT: str = "earthengine-service@agrispectra.iam.gserviceaccount.com"
+    EE_KEY_FILE: str = "/app/workers/earthengine-key.json"
+    SENTINEL_CACHE_TTL_HOURS: int = 24
+    SENTINEL_MISS_TTL_MINUTES: int = 30
+    SENTINEL_CELL_DECIMALS: int = 4
+    SENTINEL_WINDOW_DAYS: int = 10
 
     @property
     def DATABASE_URL_asyncpg(self):
@@ -1,8 +1,15 @@
+from sqlalchemy.ext.asyncio import create_async_engine
 from sqlmodel import SQLModel, Session, create_engine
+from sqlmodel.ext.asyncio.session import AsyncSession
 from .config import get_settings
+from .partitioning import ensure_partitions
 from models.user import Users
 from models.model import Models
 from models.recommendation import Recommendation
+from models.sentinel_cache import SentinelGrowthCache
+from models.inference_cache import InferenceCache
+from models.credit_hold import CreditHolds
+from models.usage_rollup import DailyUsage
 from services.crud.user import create_user
 from services.crud.service import create_model
 from webui.auth.hash_password import HashPassword
@@ -12,12 +19,23 @@ engine = create_engine(url=get_settings().DATABASE_URL_psycopg,
                        echo=True, pool_size=15, max_overflow=20)
 
 
+# Асинхронный движок для маршрутов FastAPI; синхронный остаётся воркерам и скриптам
+async_engine = create_async_engine(url=get_settings().DATABASE_URL_asyncpg,
+                                   pool_size=15, max_overflow=20)
+
+
 def get_session():
     """Генератор сессий для FastAPI"""
     with Session(engine) as session:
         yield session
 
 
+async def get_async_session():
+    """Генератор асинхронных сессий для FastAPI: запросы не блокируют event loop"""
+    async with AsyncSession(async_engine, expire_on_commit=False) as session:
+        yield session
+
+
 hash_password = HashPassword()
 
 
@@ -25,6 +43,8 @@ def init_db():
     """Инициализирует БД, создаёт записи о тестовых пользователях и моделях"""
     SQLModel.metadata.drop_all(engine)
     SQLModel.metadata.create_all(engine)
+    # Месячные секции predictions и mltasks (в Postgres)
+    ensure_partitions(engine)
 
 # Initialise some start data in database:
     hashed_password = hash_password.create_hash('test')
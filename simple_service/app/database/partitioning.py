@@ -0,0 +1,221 @@
+import argparse
+import gzip
+import logging
+import threading
+from datetime import date
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+from sqlalchemy import PrimaryKeyConstraint, inspect, text
+from sqlalchemy.ext.compiler import compiles
+
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+# Таблицы, секционированные по месяцам по колонке timestamp (см. __table_args__ моделей)
+PARTITIONED_TABLES = ("predictions", "mltasks")
+
+
+@compiles(PrimaryKeyConstraint, "postgresql")
+def _partitioned_primary_key(constraint, compiler, **kw):
+    """
+    В секционированной таблице Postgres первичный ключ обязан включать ключ секционирования.
+    ORM по-прежнему идентифицирует строки по id, в DDL ключ дополняется колонкой секционирования.
+    """
+    key = constraint.table.info.get("partition_key") if constraint.table is not None else None
+    if key is None:
+        return compiler.visit_primary_key_constraint(constraint, **kw)
+    columns = [c.name for c in constraint.columns]
+    if key not in columns:
+        columns.append(key)
+    ddl = ""
+    if constraint.name is not None:
+        ddl += f"CONSTRAINT {compiler.preparer.format_constraint(constraint)} "
+    return ddl + "PRIMARY KEY (%s)" % ", ".join(compiler.preparer.quote(c) for c in columns)
+
+
+def add_months(day: date, months: int) -> date:
+    month = day.month - 1 + months
+    return date(day.year + month // 12, month % 12 + 1, 1)
+
+
+def partition_name(table: str, month: date) -> str:
+    return f"{table}_y{month.year:04d}m{month.month:02d}"
+
+
+def month_partitions(table: str, today: date, behind: int = 1,
+                     ahead: int = 3) -> List[Tuple[str, date, date]]:
+    """Секции (имя, начало, конец) с behind месяцев до текущего по ahead месяцев после"""
+    first = date(today.year, today.month, 1)
+    return [(partition_name(table, start), start, add_months(start, 1))
+            for start in (add_months(first, i) for i in range(-behind, ahead + 1))]
+
+
+def partition_ddl(table: str, name: str, start: date, end: date) -> str:
+    return (f'CREATE TABLE IF NOT EXISTS "{name}" PARTITION OF "{table}" '
+            f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')")
+
+
+def default_partition_name(table: str) -> str:
+    return f"{table}_default"
+
+
+def default_partition_ddl(table: str) -> str:
+    return f'CREATE TABLE IF NOT EXISTS "{default_partition_name(table)}" PARTITION OF "{table}" DEFAULT'
+
+
+def is_partitioned(engine) -> bool:
+    return engine.dialect.name == "postgresql"
+
+
+def _create_month_partition(conn, table: str, name: str, start: date, end: date) -> None:
+    """
+    Создаёт секцию месяца. Строки этого месяца, уже попавшие в секцию DEFAULT,
+    переносятся в новую: иначе Postgres не даст её создать.
+    """
+    default = default_partition_name(table)
+    bounds = {"start": start, "end": end}
+    stray = conn.execute(text(
+        f'SELECT count(*) FROM "{default}" WHERE "timestamp" >= :start AND "timestamp" < :end'),
+        bounds).scalar_one()
+    if not stray:
+        conn.execute(text(partition_ddl(table, name, start, end)))
+        return
+    conn.execute(text(f'ALTER TABLE "{table}" DETACH PARTITION "{default}"'))
+    conn.execute(text(partition_ddl(table, name, start, end)))
+    conn.execute(text(
+        f'INSERT INTO "{table}" SELECT * FROM "{default}" '
+        f'WHERE "timestamp" >= :start AND "timestamp" < :end'), bounds)
+    conn.execute(text(
+        f'DELETE FROM "{default}" WHERE "timestamp" >= :start AND "timestamp" < :end'), bounds)
+    conn.execute(text(f'ALTER TABLE "{table}" ATTACH PARTITION "{default}" DEFAULT'))
+    logging.warning(f"Moved {stray} rows of {name} out of {default}")
+
+
+def ensure_partitions(engine, today: Optional[date] = None,
+                      behind: int = 1, ahead: int = 3) -> int:
+    """
+    Создаёт секцию DEFAULT и недостающие месячные секции. Вызывается из init_db
+    и раз в PARTITION_CHECK_HOURS из API (start_partition_maintenance).
+    DEFAULT принимает строки месяцев без секции, чтобы вставка не падала,
+    пока секция не создана.
+    """
+    if not is_partitioned(engine):
+        return 0
+    today = today or date.today()
+    created = 0
+    with engine.begin() as conn:
+        existing = set(inspect(conn).get_table_names())
+        for table in PARTITIONED_TABLES:
+            if default_partition_name(table) not in existing:
+                conn.execute(text(default_partition_ddl(table)))
+                logging.info(f"Created partition {default_partition_name(table)}")
+            for name, start, end in month_partitions(table, today, behind, ahead):
+                if name in existing:
+                    continue
+                _create_month_partition(conn, table, name, start, end)
+                created += 1
+                logging.info(f"Created partition {name} [{start}, {end})")
+    return created
+
+
+def start_partition_maintenance(engine, interval_seconds: float) -> threading.Event:
+    """
+    Фоновый поток, создающий секции наперёд каждые interval_seconds.
+    Возвращает событие остановки. Несколько экземпляров API безопасны: DDL идемпотентен.
+    """
+    stop = threading.Event()
+
+    def loop():
+        while not stop.wait(interval_seconds):
+            try:
+                ensure_partitions(engine)
+            except Exception as e:
+                logging.error(f"Partition maintenance failed: {e}", exc_info=True)
+
+    threading.Thread(target=loop, name="partition-maintenance", daemon=True).start()
+    return stop
+
+
+def old_partitions(engine, table: str, before: date) -> List[str]:
+    """Присоединённые секции table, целиком лежащие раньше before"""
+    with engine.connect() as conn:
+        names = conn.execute(text(
+            "SELECT c.relname FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid "
+            "JOIN pg_class p ON p.oid = i.inhparent "
+            "WHERE p.relname = :table ORDER BY c.relname"), {"table": table}).scalars().all()
+    return [name for name in names
+            if name != default_partition_name(table) and name < partition_name(table, before)]
+
+
+def archive_partition(engine, name: str, archive_dir: str) -> Path:
+    """Выгружает секцию в <archive_dir>/<name>.csv.gz через COPY"""
+    path = Path(archive_dir) / f"{name}.csv.gz"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    raw = engine.raw_connection()
+    try:
+        with raw.cursor() as cur, gzip.open(path, "wb") as out:
+            with cur.copy(f'COPY "{name}" TO STDOUT (FORMAT csv, HEADER)') as copy:
+                for chunk in copy:
+                    out.write(chunk)
+    finally:
+        raw.close()
+    return path
+
+
+def detach_old_partitions(engine, older_than_months: int, archive_dir: Optional[str] = None,
+                          drop: bool = False, today: Optional[date] = None) -> List[str]:
+    """
+    Отсоединяет секции старше older_than_months месяцев: запросы к родительской
+    таблице их больше не видят. Опционально выгружает их в архив и удаляет.
+    """
+    if not is_partitioned(engine):
+        return []
+    today = today or date.today()
+    before = add_months(date(today.year, today.month, 1), -older_than_months)
+    detached = []
+    for table in PARTITIONED_TABLES:
+        for name in old_partitions(engine, table, before):
+            with engine.begin() as conn:
+                conn.execute(text(f'ALTER TABLE "{table}" DETACH PARTITION "{name}"'))
+            logging.info(f"Detached partition {name}")
+            if archive_dir:
+                logging.info(f"Archived {name} to {archive_partition(engine, name, archive_dir)}")
+            if drop:
+                with engine.begin() as conn:
+                    conn.execute(text(f'DROP TABLE "{name}"'))
+                logging.info(f"Dropped partition {name}")
+            detached.append(name)
+    return detached
+
+
+def main(argv=None):
+    """
+    python -m database.partitioning ensure [--behind N] [--ahead N]
+    python -m database.partitioning detach --older-than-months N [--archive-dir DIR] [--drop]
+    """
+    parser = argparse.ArgumentParser(description="Monthly partitions of predictions and mltasks")
+    sub = parser.add_subparsers(dest="command", required=True)
+    ensure_cmd = sub.add_parser("ensure", help="create missing monthly partitions")
+    ensure_cmd.add_argument("--behind", type=int, default=1)
+    ensure_cmd.add_argument("--ahead", type=int, default=3)
+    detach_cmd = sub.add_parser("detach", help="detach (and archive) old partitions")
+    detach_cmd.add_argument("--older-than-months", type=int, required=True)
+    detach_cmd.add_argument("--archive-dir")
+    detach_cmd.add_argument("--drop", action="store_true",
+                            help="drop detached partitions (after archiving, if --archive-dir is set)")
+    args = parser.parse_args(argv)
+
+    from database.database import engine
+
+    if args.command == "ensure":
+        ensure_partitions(engine, behind=args.behind, ahead=args.ahead)
+    else:
+        detach_old_partitions(engine, args.older_than_months,
+                              archive_dir=args.archive_dir, drop=args.drop)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,23 @@
+from datetime import datetime, timezone
+from typing import Optional
+from sqlmodel import SQLModel, Field, Index
+
+
+class CreditHolds(SQLModel, table=True):
+    """
+    Резерв стоимости задачи на балансе пользователя: held -> captured | released.
+    Доступный баланс = Users.balance - сумма активных (held) резервов.
+    """
+    __tablename__ = "credit_holds"
+    __table_args__ = (Index("ix_credit_holds_user_status", "user_id", "status"),)
+
+    hold_id: Optional[int] = Field(default=None, primary_key=True)
+    user_id: int = Field(foreign_key="users.user_id", nullable=False)
+    task_id: int = Field(nullable=False, unique=True)
+    amount: float = Field(nullable=False)
+    status: str = Field(default="held", nullable=False)
+    created_at: datetime = Field(
+        default_factory=lambda: datetime.now(timezone.utc),
+        nullable=False
+    )
+    settled_at: Optional[datetime] = None
@@ -0,0 +1,26 @@
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+from sqlmodel import SQLModel, Field, Column, UniqueConstraint
+from sqlalchemy.dialects.postgresql import JSON
+
+
+class InferenceCache(SQLModel, table=True):
+    """
+    Результат классификации для пары (содержимое изображения, версия модели).
+    Версия — дайджест зафиксированного артефакта и бэкенд, а не алиас вроде ':latest':
+    после refresh алиаса на новую модель старые результаты не используются.
+    """
+    __tablename__ = "inference_cache"
+    __table_args__ = (UniqueConstraint("content_digest", "artifact_digest", "backend"),)
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    content_digest: str = Field(nullable=False, description="sha256 содержимого изображения")
+    artifact_digest: str = Field(nullable=False, description="Дайджест артефакта модели в хранилище")
+    backend: str = Field(nullable=False, description="Бэкенд инференса модели")
+    prediction_result: Dict[str, Any] = Field(
+        sa_column=Column(JSON, nullable=False)
+    )
+    created_at: datetime = Field(
+        default_factory=lambda: datetime.now(timezone.utc),
+        nullable=False
+    )
@@ -1,22 +1,38 @@
 from typing import Optional, Dict, Any
 from pydantic import BaseModel
 from datetime import datetime, timezone
-from sqlmodel import SQLModel, Field, Column
+from sqlmodel import SQLModel, Field, Column, Index
+from sqlalchemy import func
 from sqlalchemy.dialects.postgresql import JSON
 
 
 class MLTasks(SQLModel, table=True):
+    # История пользователя по убыванию (timestamp, id) — см. постраничную выдачу.
+    # В Postgres таблица секционирована по месяцам (database/partitioning.py)
+    __table_args__ = (
+        Index("ix_mltasks_user_id_timestamp", "user_id", "timestamp", "task_id"),
+        Index("ix_mltasks_timestamp_brin", "timestamp", postgresql_using="brin"),
+        {"postgresql_partition_by": 'RANGE ("timestamp")', "info": {"partition_key": "timestamp"}},
+    )
+
     title: Optional[str]
     task_id: int = Field(default=None, primary_key=True)
     user_id: int = Field(foreign_key="users.user_id", nullable=False)
     model_id: int = Field(foreign_key="models.model_id", nullable=False)
-    prediction_id: int = Field(foreign_key="predictions.prediction_id", nullable=True)
+    # Без внешнего ключа: в секционированной predictions prediction_id уникален только вместе с timestamp
+    prediction_id: Optional[int] = Field(default=None, nullable=True)
     input_data: str
     prediction_result: Dict[str, Any] = Field(
         sa_column=Column(JSON, nullable=True)
     )
     task_status: str
-    timestamp: datetime = datetime.now(timezone.utc)
+    # Причина статуса failed: последняя ошибка воркера или отказ до инференса
+    failure_reason: Optional[str] = None
+    timestamp: datetime = Field(
+        default_factory=lambda: datetime.now(timezone.utc),
+        sa_column_kwargs={"server_default": func.now()},
+        nullable=False
+    )
 
     def to_dict(self):
         return self.model_dump()
@@ -34,7 +50,7 @@ class MLTasksUpdate(BaseModel):
     input_data: Optional[str] = None
     prediction_result: Optional[str] = None
     task_status: str
-    timestamp: datetime = datetime.now(timezone.utc)
+    timestamp: Optional[datetime] = None
 
     def to_dict(self):
         return self.model_dump()
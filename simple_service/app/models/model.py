@@ -1,4 +1,5 @@
 from datetime import datetime, timezone
+from typing import Optional
 from sqlmodel import SQLModel, Field
 
 
@@ -8,6 +9,12 @@ class Models(SQLModel, table=True):
     description: str = Field(nullable=False)
     cost: float = Field(nullable=False)
     artifact_path: str = Field(nullable=False, description="WandB artifact identifier, e.g. 'entity/project/artifact_name:version'")
+    artifact_digest: Optional[str] = Field(default=None, description="Digest of the pinned artifact in the worker artifact store")
+    label_map_version: Optional[str] = Field(default=None, description="Version of inverse_label_maps of the pinned artifact")
+    backend: str = Field(default="torchscript", description="Inference backend: torchscript, frozen, int8 or onnx")
+    latency_ms: Optional[float] = Field(default=None, description="Measured CPU latency per image of this variant, ms")
+    accuracy: Optional[float] = Field(default=None, description="Mean accuracy over heads on the evaluation set")
+    active: bool = Field(default=True, description="Variant served to users; the others of the artifact are kept for comparison")
     created_at: datetime = Field(
         default_factory=lambda: datetime.now(timezone.utc),
         nullable=False,
@@ -21,6 +28,7 @@ class ModelArtifactCreate(SQLModel):
     description: str
     cost: float
     artifact_path: str
+    backend: str = "torchscript"
 
 
 # Pydantic-модель для чтения (response)
@@ -30,6 +38,12 @@ class ModelArtifactRead(SQLModel):
     description: str
     cost: float
     artifact_path: str
+    artifact_digest: Optional[str] = None
+    label_map_version: Optional[str] = None
+    backend: str = "torchscript"
+    latency_ms: Optional[float] = None
+    accuracy: Optional[float] = None
+    active: bool = True
     created_at: datetime
 
     class Config:
@@ -1,11 +1,24 @@
 from datetime import datetime, timezone
-from sqlmodel import SQLModel, Field, Column, Float
+from sqlmodel import SQLModel, Field, Column, Float, Index
 from pydantic import BaseModel
 from typing import Dict, Optional, Any
+from sqlalchemy import event, func
 from sqlalchemy.dialects.postgresql import JSON
+from services import geo
 
 
 class Predictions(SQLModel, table=True):
+    # История пользователя по убыванию (timestamp, id) — см. постраничную выдачу.
+    # В Postgres таблица секционирована по месяцам (database/partitioning.py)
+    __table_args__ = (
+        Index("ix_predictions_user_id_timestamp", "user_id", "timestamp", "prediction_id"),
+        Index("ix_predictions_timestamp_brin", "timestamp", postgresql_using="brin"),
+        # Поиск по окрестности: LIKE 'префикс%' по geohash (см. services/geo.py)
+        Index("ix_predictions_geohash_timestamp", "geohash", "timestamp",
+              postgresql_ops={"geohash": "text_pattern_ops"}),
+        {"postgresql_partition_by": 'RANGE ("timestamp")', "info": {"partition_key": "timestamp"}},
+    )
+
     prediction_id: int = Field(default=None, primary_key=True)
     user_id: int = Field(foreign_key="users.user_id", nullable=False)
     model_id: int = Field(foreign_key="models.model_id", nullable=True)
@@ -14,6 +27,8 @@ class Predictions(SQLModel, table=True):
     input_data:         str
     input_latitude: float | None = Field(default=None, sa_column=Column(Float, nullable=True))
     input_longitude: float | None = Field(default=None, sa_column=Column(Float, nullable=True))
+    # Заполняется при вставке из input_latitude/input_longitude
+    geohash: str | None = Field(default=None, max_length=12)
     prediction_result:  Dict[str, Any] = Field(
         sa_column=Column(JSON, nullable=False)
     )
@@ -21,12 +36,25 @@ class Predictions(SQLModel, table=True):
     recommendation:     str = Field(nullable=False)
     source:             str | None = None
     cost:               float
-    timestamp:          datetime = datetime.now(timezone.utc)
+    # Уточнение стадии роста по Sentinel-1: None — без координат, pending — ждёт, done — выполнено,
+    # failed — исчерпаны повторы (см. workers/retry.py)
+    enrichment_status:  str | None = None
+    timestamp:          datetime = Field(
+        default_factory=lambda: datetime.now(timezone.utc),
+        sa_column_kwargs={"server_default": func.now()},
+        nullable=False
+    )
 
     class Config:
         from_attributes = True
 
 
+@event.listens_for(Predictions, "before_insert")
+def _set_geohash(mapper, connection, target: Predictions) -> None:
+    if target.input_latitude is not None and target.input_longitude is not None:
+        target.geohash = geo.encode(target.input_latitude, target.input_longitude)
+
+
 class PredictionRequest(BaseModel):
     model_id: int
     image_id: Optional[int] = None
@@ -1,6 +1,7 @@
+from datetime import datetime, timezone
 from enum import Enum
 from typing import Optional
-from sqlmodel import SQLModel, Field
+from sqlmodel import SQLModel, Field, UniqueConstraint
 
 
 class DamageType(str, Enum):
@@ -24,6 +25,9 @@ class SeverityLevel(str, Enum):
 
 class Recommendation(SQLModel, table=True):
     __tablename__ = "recommendations"
+    # Одна рекомендация на сочетание; индекс обслуживает поиск по всем трём полям
+    __table_args__ = (UniqueConstraint("damage_type", "growth_stage", "severity",
+                                       name="uq_recommendations_key"),)
 
     id: Optional[int] = Field(default=None, primary_key=True)
     damage_type: DamageType = Field(
@@ -42,3 +46,9 @@ class Recommendation(SQLModel, table=True):
         default=None,
         sa_column_kwargs={"nullable": True, "comment": "Источник (агро-экспертная литература или URL)"}
     )
+    # Метка версии для воркеров: по max(updated_at) они узнают, что матрицу пора перечитать
+    updated_at: datetime = Field(
+        default_factory=lambda: datetime.now(timezone.utc),
+        nullable=False,
+        sa_column_kwargs={"onupdate": lambda: datetime.now(timezone.utc)}
+    )
@@ -0,0 +1,21 @@
+from datetime import datetime, timezone
+from typing import Optional
+from sqlmodel import SQLModel, Field, UniqueConstraint
+
+
+class SentinelGrowthCache(SQLModel, table=True):
+    """Кэш значения VH Sentinel-1 и стадии роста по ячейке координат и окну дат"""
+    __tablename__ = "sentinel_growth_cache"
+    __table_args__ = (UniqueConstraint("cell", "window_end"),)
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    cell: str = Field(nullable=False, description="Округлённые координаты 'lat:lon'")
+    window_start: str = Field(nullable=False)
+    window_end: str = Field(nullable=False)
+    vh: Optional[float] = Field(default=None, nullable=True)
+    growth_stage: str = Field(nullable=False)
+    created_at: datetime = Field(
+        default_factory=lambda: datetime.now(timezone.utc),
+        nullable=False
+    )
+    expires_at: datetime = Field(nullable=False, index=True)
@@ -0,0 +1,42 @@
+from typing import Any, Dict, Optional, Union
+from pydantic import BaseModel
+
+
+TASK_MESSAGE_VERSION = 2
+
+
+class TaskMessage(BaseModel):
+    """
+    Сообщение задачи инференса (версия 2): всё, что нужно воркеру до финализации,
+    передаётся в самом сообщении, без запросов к БД.
+    Сообщения версии 1 (без поля version) содержат только id и читаются воркером из БД.
+    """
+    version: int = TASK_MESSAGE_VERSION
+    task_id: int
+    user_id: int
+    model_id: int
+    cost: float
+    artifact_path: str
+    artifact_digest: Optional[str] = None
+    label_map_version: Optional[str] = None
+    # Бэкенд инференса модели (Models.backend)
+    backend: str = "torchscript"
+    image_id: int
+    object_key: str
+    derivative_key: Optional[str] = None
+    image_url: str
+    content_digest: Optional[str] = None
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
+    # Результат из кэша инференса на момент постановки задачи
+    cached_result: Optional[Dict[str, str]] = None
+
+    class Config:
+        protected_namespaces = ()
+
+
+def parse_task_message(msg: Dict[str, Any]) -> Union[TaskMessage, Dict[str, Any]]:
+    """TaskMessage для сообщений версии 2+, исходный dict — для сообщений версии 1"""
+    if int(msg.get("version", 1)) >= TASK_MESSAGE_VERSION:
+        return TaskMessage.model_validate(msg)
+    return msg
@@ -1,14 +1,22 @@
 from datetime import datetime, timezone
-from sqlmodel import SQLModel, Field
+from sqlalchemy import func
+from sqlmodel import SQLModel, Field, Index
 from pydantic import BaseModel
 
 
 class Transactions(SQLModel, table=True):
+    # История пользователя по убыванию (timestamp, id) — см. постраничную выдачу
+    __table_args__ = (Index("ix_transactions_user_id_timestamp", "user_id", "timestamp", "transaction_id"),)
+
     transaction_id: int = Field(default=None, primary_key=True)
     user_id: int = Field(foreign_key="users.user_id", nullable=False)
     transaction_type: str
     amount: float
-    timestamp: datetime = datetime.now(timezone.utc)
+    timestamp: datetime = Field(
+        default_factory=lambda: datetime.now(timezone.utc),
+        sa_column_kwargs={"server_default": func.now()},
+        nullable=False
+    )
 
 
 class BalanceUpdate(BaseModel):
@@ -0,0 +1,21 @@
+from datetime import date
+from typing import Optional
+from sqlmodel import SQLModel, Field, UniqueConstraint
+
+
+class DailyUsage(SQLModel, table=True):
+    """
+    Агрегат использования за день: пользователь × модель × тип повреждения.
+    Обновляется при финализации задачи; статистика для админки читается только отсюда.
+    """
+    __tablename__ = "daily_usage"
+    __table_args__ = (UniqueConstraint("day", "user_id", "model_id", "damage_type",
+                                       name="uq_daily_usage_key"),)
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    day: date = Field(nullable=False, index=True)
+    user_id: int = Field(nullable=False, index=True)
+    model_id: int = Field(nullable=False, default=0, description="0 — модель не указана")
+    damage_type: str = Field(nullable=False, default="unknown")
+    predictions: int = Field(default=0, nullable=False)
+    credits: float = Field(default=0.0, nullable=False)
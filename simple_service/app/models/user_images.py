@@ -1,14 +1,22 @@
 from datetime import datetime, timezone
-from sqlmodel import SQLModel, Field
+from typing import Optional
+from sqlmodel import SQLModel, Field, Index
 
 
 class UserImages(SQLModel, table=True):
+    # История пользователя по убыванию (timestamp, id) — см. постраничную выдачу
+    __table_args__ = (Index("ix_userimages_user_id_timestamp", "user_id", "timestamp", "image_id"),)
+
     image_id: int = Field(default=None, primary_key=True)
     user_id: int = Field(foreign_key="users.user_id", nullable=False)
     # task_id: int = Field(foreign_key="mltasks.task_id")
     image_url: str
     internal_url: str
     input_data: str
+    content_digest: Optional[str] = Field(default=None, index=True,
+                                          description="sha256 содержимого изображения")
+    derivative_data: Optional[str] = Field(default=None,
+                                           description="Объект с копией 256×256 (uint8 .npy) для воркера")
     timestamp: datetime = Field(
         default_factory=lambda: datetime.now(timezone.utc),
         nullable=False,
@@ -1,38 +1,70 @@
-from fastapi import APIRouter, HTTPException, status, Depends
-from typing import List
+from datetime import date, datetime
+from fastapi import APIRouter, HTTPException, status, Depends, Query, Response
+from typing import Any, Dict, List, Literal, Optional
 from pydantic import EmailStr
-from database.database import get_session
+from fastapi.responses import StreamingResponse
+from database.database import get_async_session, get_session
 from models.user import Users
 from models.transaction import Transactions
 from models.prediction import Predictions
 from models.ml_task import MLTasks
 from services.crud import user as UserService
-from services.crud import transaction as TransactionService
-from services.crud import service as PredictService
+from services.crud import rollup as RollupService
+from services import export as ExportService
+from services.crud.pagination import PageParams
+from routes.pagination import paginate, page_params
 
 
 admin_route = APIRouter(tags=['Admin'], prefix='/admins')
 
 
-@admin_route.get('/users', response_model=List[Users])
-async def get_all_users(email: EmailStr,
-                        session=Depends(get_session)) -> List[Users]:
-    """Возвращает всех пользователей"""
-    user = UserService.get_user_by_email(email, session)
+def columns(model, exclude=()) -> Dict[str, Any]:
+    """Поля постраничной выдачи — колонки таблицы"""
+    return {c.name: c for c in model.__table__.c if c.name not in exclude}
+
+
+USER_FIELDS = columns(Users, exclude=("password",))
+TRANSACTION_FIELDS = columns(Transactions)
+PREDICTION_FIELDS = columns(Predictions)
+TASK_FIELDS = columns(MLTasks)
+# JSON с результатом классификации отдаётся только по явному fields=...
+PREDICTION_DEFAULT_FIELDS = [name for name in PREDICTION_FIELDS if name != "prediction_result"]
+TASK_DEFAULT_FIELDS = [name for name in TASK_FIELDS if name != "prediction_result"]
+
+
+async def require_admin(email: EmailStr, session) -> Users:
+    user = await UserService.get_user_by_email_async(email, session)
+    if user is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
+                            detail="User with this email does not exist")
     if not user.is_admin:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN,
                             detail="Admin access required")
+    return user
 
-    return UserService.get_all_users(user, session)
+
+def user_filter(column, user_id: Optional[int]) -> List[Any]:
+    return [column == user_id] if user_id is not None else []
+
+
+@admin_route.get('/users')
+async def get_all_users(email: EmailStr,
+                        response: Response,
+                        params: PageParams = Depends(page_params),
+                        session=Depends(get_async_session)) -> List[Dict[str, Any]]:
+    """Возвращает пользователей постранично (без хешей паролей)"""
+    await require_admin(email, session)
+    return await paginate(session, response, params, USER_FIELDS, list(USER_FIELDS),
+                          id_col=Users.user_id)
 
 
 @admin_route.post('/balance/replenish')
 async def add_balance_to_user(admin_email: EmailStr, user_email: EmailStr,
                               amount: float,
-                              session=Depends(get_session)) -> dict:
+                              session=Depends(get_async_session)) -> dict:
     """Пополнение баланса пользователю"""
-    admin = UserService.get_user_by_email(admin_email, session)
-    user = UserService.get_user_by_email(user_email, session)
+    admin = await UserService.get_user_by_email_async(admin_email, session)
+    user = await UserService.get_user_by_email_async(user_email, session)
     if not admin.is_admin:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN,
                             detail="Admin acssess required")
@@ -41,50 +73,97 @@ async def add_balance_to_user(admin_email: EmailStr, user_email: EmailStr,
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
                             detail="User does not exist")
 
-    if UserService.add_balance_to_user(admin, user.user_id,
-                                       amount, session) is None:
+    if await UserService.add_balance_to_user_async(
+            admin, user.user_id, amount, session) is None:
         return {"message": f'{amount} added to user {user.email}'}
 
 
-@admin_route.get('/transactions', response_model=List[Transactions])
+@admin_route.get('/transactions')
 async def view_all_transactions(email: EmailStr,
-                                session=Depends(get_session)) -> List[Transactions]:
-    """Возвращает все успешно завершенные транзакции"""
-    user = UserService.get_user_by_email(email, session)
-    if not user.is_admin:
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN,
-                            detail="Admin access required")
-
-    return TransactionService.view_all_transactions(user, session)
-
-
-@admin_route.get('/predictions', response_model=List[Predictions])
+                                response: Response,
+                                user_id: Optional[int] = None,
+                                params: PageParams = Depends(page_params),
+                                session=Depends(get_async_session)) -> List[Dict[str, Any]]:
+    """Возвращает транзакции постранично, новые первыми"""
+    await require_admin(email, session)
+    return await paginate(session, response, params, TRANSACTION_FIELDS, list(TRANSACTION_FIELDS),
+                          id_col=Transactions.transaction_id, timestamp_col=Transactions.timestamp,
+                          where=user_filter(Transactions.user_id, user_id))
+
+
+@admin_route.get('/predictions')
 async def get_predictions_all(email: EmailStr,
-                              session=Depends(get_session)) -> List[Predictions]:
-    """Возвращает все успешно завершенные предсказания"""
-    user = UserService.get_user_by_email(email, session)
-    if user is None:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
-                            detail="User with this email does not exist")
-
-    if not user.is_admin:
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN,
-                            detail="Admin access required")
-
-    return PredictService.get_all_predictions(user, session)
-
-
-@admin_route.get('/tasks', response_model=List[MLTasks])
+                              response: Response,
+                              user_id: Optional[int] = None,
+                              params: PageParams = Depends(page_params),
+                              session=Depends(get_async_session)) -> List[Dict[str, Any]]:
+    """Возвращает предсказания постранично, новые первыми"""
+    await require_admin(email, session)
+    return await paginate(session, response, params, PREDICTION_FIELDS, PREDICTION_DEFAULT_FIELDS,
+                          id_col=Predictions.prediction_id, timestamp_col=Predictions.timestamp,
+                          where=user_filter(Predictions.user_id, user_id))
+
+
+@admin_route.get('/tasks')
 async def get_tasks_all(email: EmailStr,
-                        session=Depends(get_session)) -> List[MLTasks]:
-    """Возвращает все отправленные таски RabbitMQ"""
+                        response: Response,
+                        user_id: Optional[int] = None,
+                        params: PageParams = Depends(page_params),
+                        session=Depends(get_async_session)) -> List[Dict[str, Any]]:
+    """Возвращает отправленные таски RabbitMQ постранично, новые первыми"""
+    await require_admin(email, session)
+    return await paginate(session, response, params, TASK_FIELDS, TASK_DEFAULT_FIELDS,
+                          id_col=MLTasks.task_id, timestamp_col=MLTasks.timestamp,
+                          where=user_filter(MLTasks.user_id, user_id))
+
+
+@admin_route.get('/stats/{dimension}')
+async def get_usage_stats(dimension: Literal["day", "model", "damage_type", "user"],
+                          email: EmailStr,
+                          since: Optional[date] = None,
+                          until: Optional[date] = None,
+                          limit: int = Query(100, ge=1, le=1000),
+                          session=Depends(get_async_session)) -> List[Dict[str, Any]]:
+    """
+    Число предсказаний и потраченные кредиты по дням, моделям, типам повреждений
+    или пользователям. Читает только дневные агрегаты, а не predictions.
+    """
+    await require_admin(email, session)
+    return await RollupService.get_usage_stats_async(dimension, session, since=since,
+                                                     until=until, limit=limit)
+
+
+@admin_route.get('/export/predictions')
+def export_predictions(email: EmailStr,
+                       format: Literal["csv", "parquet"] = "csv",
+                       since: Optional[datetime] = None,
+                       until: Optional[datetime] = None,
+                       model_id: Optional[int] = None,
+                       bbox: Optional[str] = Query(None, description="min_lon,min_lat,max_lon,max_lat"),
+                       session=Depends(get_session)) -> StreamingResponse:
+    """
+    Потоковая выгрузка предсказаний в CSV или Parquet. Строки читаются серверным
+    курсором пачками и сразу отдаются клиенту — память не растёт с числом строк,
+    а синхронный генератор работает в пуле потоков, не занимая event loop.
+    """
     user = UserService.get_user_by_email(email, session)
     if user is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
                             detail="User with this email does not exist")
-
     if not user.is_admin:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN,
                             detail="Admin access required")
-
-    return PredictService.get_all_tasks(user, session)
+    try:
+        flt = ExportService.ExportFilter(since=since, until=until, model_id=model_id,
+                                         bbox=ExportService.parse_bbox(bbox) if bbox else None)
+        ExportService.check_format(format)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=status.HTTP_501_NOT_IMPLEMENTED, detail=str(e))
+
+    # Сессия запроса закрывается до конца выгрузки — генератор открывает свою на том же движке
+    stream = ExportService.export_stream(session.get_bind(), format, flt)
+    return StreamingResponse(
+        stream, media_type=ExportService.FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="predictions.{format}"'})
@@ -0,0 +1,38 @@
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence
+
+from fastapi import HTTPException, Query, Response, status
+
+from services.crud.pagination import PageParams, fetch_page_async, select_fields
+
+
+MAX_PAGE_SIZE = 500
+
+
+def page_params(
+        cursor: Optional[str] = Query(None, description="Значение заголовка X-Next-Cursor предыдущей страницы"),
+        limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
+        since: Optional[datetime] = Query(None, description="Не раньше этого момента"),
+        until: Optional[datetime] = Query(None, description="Раньше этого момента"),
+        fields: Optional[str] = Query(None, description="Поля через запятую"),
+) -> PageParams:
+    """Зависимость FastAPI с параметрами постраничной выдачи"""
+    return PageParams(cursor=cursor, limit=limit, since=since, until=until, fields=fields)
+
+
+async def paginate(session, response: Response, params: PageParams,
+                   columns: Dict[str, Any], default_fields: Sequence[str],
+                   id_col, timestamp_col=None, where: Sequence[Any] = ()) -> List[Dict[str, Any]]:
+    """
+    Одна страница записей. Тело ответа — список, как и раньше;
+    курсор следующей страницы — в заголовке X-Next-Cursor.
+    """
+    try:
+        fields = select_fields(params.fields, columns, default_fields)
+        page = await fetch_page_async(session, columns, fields, id_col,
+                                      timestamp_col=timestamp_col, where=where, params=params)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    if page.next_cursor:
+        response.headers["X-Next-Cursor"] = page.next_cursor
+    return page.items
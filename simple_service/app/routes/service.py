@@ -1,23 +1,28 @@
 import os
 import uuid
-import io
+import asyncio
 import logging
-import pika
-import json
 from minio import Minio
 from sqlalchemy import select, desc
-from fastapi import APIRouter, HTTPException, status, Depends, UploadFile, File
-from typing import List, Dict, Any, Annotated
+from datetime import datetime
+from fastapi import APIRouter, HTTPException, status, Depends, UploadFile, File, Query
+from fastapi.concurrency import run_in_threadpool
+from typing import List, Dict, Any, Annotated, Optional, Tuple
 
-from database.database import get_session
+from database.database import get_session, get_async_session
 from database.config import get_settings
 from models.model import ModelArtifactRead, Models
 from models.prediction import PredictionResponse, PredictionRequest
 from models.user_images import UserImages
 from models.ml_task import MLTasks
+from models.task_message import TaskMessage
 from services.crud import user as UserService
 from services.crud import service as PredictService
-from workers.connect import connect_to_rabbitmq
+from services.crud import credit_hold as CreditService
+from services.crud import nearby as NearbyService
+from services import geo
+from services.storage import UploadTooLarge, hash_stream, put_stream, put_derivative
+from workers.publisher import RabbitPublisher, get_publisher
 from webui.auth.authenticate import authenticate_user
 
 # Настройка логирования
@@ -38,6 +43,9 @@ minio_client = Minio(
 )
 bucket_name = os.getenv('MINIO_BUCKET_NAME')
 
+# Ограничение параллельных загрузок в хранилище на процесс uvicorn
+upload_slots = asyncio.Semaphore(settings.UPLOAD_MAX_CONCURRENCY)
+
 logging.info(f"MINIO_SECURE raw: {os.getenv('MINIO_SECURE')} → secure flag: {_secure}")
 
 # Проверяем наличие бакета, если нет — создаём
@@ -49,40 +57,74 @@ except Exception as e:
 
 
 @service_route.get('/models', response_model=List[ModelArtifactRead])
-async def get_all_models(session=Depends(get_session)):
-    return session.query(Models).all()
+async def get_all_models(session=Depends(get_async_session)):
+    return await PredictService.get_all_models_async(session)
 
 
 @service_route.post('/upload', status_code=status.HTTP_201_CREATED)
 async def upload_image(
     user_id: Annotated[int, Depends(authenticate_user)],
-    session=Depends(get_session),
+    session=Depends(get_async_session),
     file: UploadFile = File(...),
         ) -> List[Dict[str, Any]]:
     """
     Принимает изображение, загружает его в MinIO
     и сохраняет информацию в таблицу UserImages.
     """
-    # Читаем содержимое файла
-    data = await file.read()
-    ext = os.path.splitext(file.filename)[1]
-    object_name = f"{uuid.uuid4().hex}{ext}"
+    # Размер известен заранее — отказываем, не начиная загрузку
+    if file.size is not None and file.size > settings.UPLOAD_MAX_BYTES:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Файл больше {settings.UPLOAD_MAX_BYTES} байт"
+        )
 
-    # Загружаем в MinIO
+    # Хешируем уже принятый файл до загрузки: дубликат не отправляется в MinIO
     try:
-        minio_client.put_object(
-            bucket_name=bucket_name,
-            object_name=object_name,
-            data=io.BytesIO(data),
-            length=len(data),
-            content_type=file.content_type
-        )
-    except Exception as e:
+        size, sha256 = await run_in_threadpool(hash_stream, file.file, settings.UPLOAD_MAX_BYTES)
+    except UploadTooLarge as e:
         raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Ошибка загрузки в хранилище: {e}"
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=str(e)
         )
 
+    # Такое же содержимое уже загружено — ссылаемся на существующий объект
+    duplicate = await PredictService.get_image_by_digest_async(sha256, session)
+    if duplicate is not None:
+        logging.info(f"Duplicate of {duplicate.input_data} ({size} bytes, sha256={sha256}), upload skipped")
+        object_name = duplicate.input_data
+        derivative = duplicate.derivative_data
+    else:
+        ext = os.path.splitext(file.filename)[1]
+        object_name = f"{uuid.uuid4().hex}{ext}"
+
+        # Загружаем в MinIO частями, вне event loop; число одновременных загрузок ограничено
+        try:
+            async with upload_slots:
+                size, sha256 = await run_in_threadpool(
+                    put_stream, minio_client, bucket_name, object_name, file.file,
+                    file.content_type, settings.UPLOAD_MAX_BYTES, settings.UPLOAD_PART_SIZE
+                )
+            logging.info(f"Uploaded {object_name}: {size} bytes, sha256={sha256}")
+        except UploadTooLarge as e:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail=str(e)
+            )
+        except Exception as e:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Ошибка загрузки в хранилище: {e}"
+            )
+
+        # Уменьшенная копия для воркера, вне event loop
+        try:
+            derivative = await run_in_threadpool(
+                put_derivative, minio_client, bucket_name, object_name, file.file)
+        except Exception as e:
+            # Воркер обработает исходное изображение
+            logging.warning(f"Failed to create derivative for {object_name}: {e}")
+            derivative = None
+
     # Генерируем presigned URL на чтение (например, сроком на 1 час)
     try:
         public_url = f"http://localhost:9000/{bucket_name}/{object_name}"   # доступен в браузере
@@ -98,11 +140,13 @@ async def upload_image(
                             user_id=user_id,
                             image_url=public_url,
                             internal_url=internal_url,
-                            input_data=object_name
+                            input_data=object_name,
+                            content_digest=sha256,
+                            derivative_data=derivative
                             )
     session.add(user_image)
-    session.commit()
-    session.refresh(user_image)
+    await session.commit()
+    await session.refresh(user_image)
 
     return [{
         "image_id": user_image.image_id,
@@ -118,6 +162,7 @@ def send_data_to_predict(
     req: PredictionRequest,
     user_id: int = Depends(authenticate_user),
     session=Depends(get_session),
+    publisher: RabbitPublisher = Depends(get_publisher),
 ) -> PredictionResponse:
     # Проверяем пользователя
     user = UserService.get_user_by_id(user_id, session)
@@ -164,17 +209,10 @@ def send_data_to_predict(
 
     # Берём модель
     model_ent = session.get(Models, req.model_id)
-    if not model_ent:
+    if not model_ent or not model_ent.active:
         raise HTTPException(404, "Model not found")
 
-    # Проверяем баланс
-    if user.balance < model_ent.cost:
-        diff = model_ent.cost - user.balance
-        raise HTTPException(
-            403, f"Insufficient balance, top up for {diff}"
-        )
-
-    # Создаём задачу
+    # Создаём задачу и резервируем её стоимость одной транзакцией
     task = MLTasks(
         user_id=user_id,
         model_id=req.model_id,
@@ -182,30 +220,53 @@ def send_data_to_predict(
         task_status="created",
     )
     session.add(task)
+    session.flush()
+    if not CreditService.place_hold(user_id, task.task_id, model_ent.cost, session):
+        session.rollback()
+        available = CreditService.available_balance(user_id, session)
+        diff = model_ent.cost - available
+        raise HTTPException(
+            403, f"Insufficient balance, top up for {diff}"
+        )
     session.commit()
     session.refresh(task)
 
     logging.info(f"🚀 sending task with lat={req.latitude}, lon={req.longitude}")
-    # Публикуем в очередь
-    payload = {
-        "task_id": task.task_id,
-        "user_id": user_id,
-        "model_id": req.model_id,
-        "artifact_path": model_ent.artifact_path,
-        "image_id": img.image_id,
-        "latitude": req.latitude,
-        "longitude": req.longitude,
-    }
-    conn = connect_to_rabbitmq()
-    ch = conn.channel()
-    ch.queue_declare(queue=settings.RMQ_QUEUE, durable=True)
-    ch.basic_publish(
-        exchange="",
-        routing_key=settings.RMQ_QUEUE,
-        body=json.dumps(payload),
-        properties=pika.BasicProperties(delivery_mode=2),
-    )
-    conn.close()
+    # Публикуем в очередь самодостаточное сообщение: воркеру не нужна БД до финализации
+    cached_result = None
+    if img.content_digest:
+        cached_result = PredictService.get_cached_inference(
+            img.content_digest, model_ent.artifact_digest, model_ent.backend, session)
+    payload = TaskMessage(
+        task_id=task.task_id,
+        user_id=user_id,
+        model_id=req.model_id,
+        cost=model_ent.cost,
+        artifact_path=model_ent.artifact_path,
+        artifact_digest=model_ent.artifact_digest,
+        label_map_version=model_ent.label_map_version,
+        backend=model_ent.backend,
+        image_id=img.image_id,
+        object_key=img.input_data,
+        derivative_key=img.derivative_data,
+        image_url=img.image_url,
+        content_digest=img.content_digest,
+        latitude=latitude,
+        longitude=longitude,
+        cached_result=cached_result,
+    ).model_dump()
+    # Задача с готовым результатом не требует инференса — пропускаем её вперёд в очереди модели
+    priority = settings.RMQ_MAX_PRIORITY if cached_result is not None else None
+    try:
+        publisher.publish_task(model_ent.artifact_path, payload, priority=priority)
+    except Exception as e:
+        logging.error(f"Failed to publish task {task.task_id}: {e}", exc_info=True)
+        task.task_status = "failed"
+        task.failure_reason = "task queue is unavailable"
+        session.add(task)
+        CreditService.release_hold(task.task_id, session)
+        session.commit()
+        raise HTTPException(503, "Task queue is unavailable, try again later")
 
     return PredictionResponse(
         task_id=task.task_id,
@@ -218,13 +279,13 @@ def send_data_to_predict(
 async def check_task_status(
         task_id: int,
         user_id: Annotated[int, Depends(authenticate_user)],
-        session=Depends(get_session)):
+        session=Depends(get_async_session)):
     """Возвращает все таски в RabbitMQ для пользователя с их статусом"""
-    user = UserService.get_user_by_id(user_id, session)
+    user = await UserService.get_user_by_id_async(user_id, session)
     if user is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
                             detail="User with this email does not exist")
-    task = PredictService.get_task_by_id(task_id, session)
+    task = await PredictService.get_task_by_id_async(task_id, session)
     if task is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
                             detail="Task with this id does not exist")
@@ -234,8 +295,66 @@ async def check_task_status(
                 "model_id": task.model_id,
                 "input_data": task.input_data,
                 "status": task.task_status,
+                "failure_reason": task.failure_reason,
                 "prediction_id": task.prediction_id,
                 "prediction_result": task.prediction_result,
                 "created_at": task.timestamp.isoformat(),
             }
         ]
+
+
+class Area:
+    """Область запроса: круг lat/lon/radius_km или прямоугольник bbox"""
+
+    def __init__(self,
+                 lat: Optional[float] = Query(None, ge=-90, le=90),
+                 lon: Optional[float] = Query(None, ge=-180, le=180),
+                 radius_km: Optional[float] = Query(None, gt=0, le=100),
+                 bbox: Optional[str] = Query(None, description="min_lon,min_lat,max_lon,max_lat")):
+        self.center: Optional[Tuple[float, float]] = None
+        self.radius_km = radius_km
+        if bbox is not None:
+            try:
+                self.bbox = geo.parse_bbox(bbox)
+            except ValueError as e:
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+        elif lat is not None and lon is not None and radius_km is not None:
+            self.center = (lat, lon)
+            self.bbox = geo.radius_bbox(lat, lon, radius_km)
+        else:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                                detail="Either bbox or lat, lon and radius_km are required")
+
+
+@service_route.get('/predictions/nearby')
+async def get_nearby_predictions(
+        user_id: Annotated[int, Depends(authenticate_user)],
+        area: Area = Depends(),
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        limit: int = Query(100, ge=1, le=1000),
+        session=Depends(get_async_session)) -> List[Dict[str, Any]]:
+    """
+    Предсказания всех пользователей в окрестности, новые первыми (без персональных данных).
+    Точные координаты — только у своих предсказаний, чужие огрублены до ячейки geohash.
+    """
+    return await NearbyService.nearby_predictions_async(
+        session, area.bbox, center=area.center, radius_km=area.radius_km,
+        since=since, until=until, limit=limit, viewer_id=user_id)
+
+
+@service_route.get('/predictions/cells')
+async def get_damage_by_cell(
+        user_id: Annotated[int, Depends(authenticate_user)],
+        area: Area = Depends(),
+        precision: int = Query(5, ge=1, le=geo.PRECISION),
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        limit: int = Query(500, ge=1, le=5000),
+        session=Depends(get_async_session)) -> List[Dict[str, Any]]:
+    """
+    Число предсказаний по ячейкам geohash и типам повреждений — карта вспышек в регионе.
+    Для круга учитывается описанный вокруг него прямоугольник.
+    """
+    return await NearbyService.cell_damage_async(
+        session, area.bbox, precision=precision, since=since, until=until, limit=limit)
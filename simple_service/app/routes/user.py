@@ -1,17 +1,20 @@
 import logging
-from fastapi import APIRouter, HTTPException, status, Depends
+from fastapi import APIRouter, HTTPException, status, Depends, Response
 from fastapi.security import OAuth2PasswordRequestForm
 from typing import List, Dict, Any, Annotated
 
-from database.database import get_session
+from database.database import get_async_session
 from models.user import Users
-from models.transaction import BalanceUpdate
+from models.transaction import BalanceUpdate, Transactions
+from models.prediction import Predictions
 from services.crud import user as UserService
-from services.crud import transaction as TransactionService
+from services.crud import credit_hold as CreditService
 from services.crud import service as PredictService
 from webui.auth.hash_password import HashPassword
 from webui.auth.jwt_handler import create_access_token
 from webui.auth.authenticate import authenticate_user
+from routes.pagination import paginate, page_params
+from services.crud.pagination import PageParams
 
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
@@ -21,22 +24,22 @@ hash_password = HashPassword()
 
 
 @user_route.post('/signup')
-async def signup(user: Users, session=Depends(get_session)) -> dict:
-    user_exist = UserService.get_user_by_email(user.email, session)
+async def signup(user: Users, session=Depends(get_async_session)) -> dict:
+    user_exist = await UserService.get_user_by_email_async(user.email, session)
     if user_exist:
         raise HTTPException(status_code=status.HTTP_409_CONFLICT,
                             detail="User with this email already exists")
     hashed_password = hash_password.create_hash(user.password)
     user.password = hashed_password
-    UserService.create_user(user, session)
+    await UserService.create_user_async(user, session)
     return {"message": "User successfully registered!"}
 
 
 @user_route.post('/signin')
 async def signin(data: Annotated[OAuth2PasswordRequestForm, Depends()],
-                 session=Depends(get_session)) -> dict:
+                 session=Depends(get_async_session)) -> dict:
     logging.info(f"Received data: {data}")
-    user_exist = UserService.authenticate(data.username, data.password, session)
+    user_exist = await UserService.authenticate_async(data.username, data.password, session)
     if user_exist is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
                             detail="User with this email does not exist")
@@ -52,8 +55,8 @@ async def signin(data: Annotated[OAuth2PasswordRequestForm, Depends()],
 @user_route.post('/balance/replenish')
 async def add_balance(user_id: Annotated[int, Depends(authenticate_user)],
                       balance_update: BalanceUpdate,
-                      session=Depends(get_session)) -> dict:
-    user = UserService.get_user_by_id(user_id, session)
+                      session=Depends(get_async_session)) -> dict:
+    user = await UserService.get_user_by_id_async(user_id, session)
     if user is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
                             detail="User does not exist")
@@ -61,7 +64,7 @@ async def add_balance(user_id: Annotated[int, Depends(authenticate_user)],
     if balance_update.amount <= 0:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN,
                             detail="Amount should be greater then 0")
-    if UserService.add_balance(user_id, balance_update.amount, session) is not None:
+    if await UserService.add_balance_async(user_id, balance_update.amount, session) is not None:
         raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="User does not exist or amount less or equal to 0")
@@ -71,52 +74,81 @@ async def add_balance(user_id: Annotated[int, Depends(authenticate_user)],
 
 @user_route.get('/balance')
 async def check_balance(user_id: Annotated[int, Depends(authenticate_user)],
-                        session=Depends(get_session)) -> dict:
-    user = UserService.get_user_by_id(user_id, session)
+                        session=Depends(get_async_session)) -> dict:
+    user = await UserService.get_user_by_id_async(user_id, session)
     if user is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
                             detail="User does not exist")
-    balance = UserService.check_balance(user_id, session)
-    return {"message": f"Your balance is {balance}", "balance": f"{balance}"}
+    balance = await UserService.check_balance_async(user_id, session)
+    # Часть баланса может быть зарезервирована под ещё не выполненные задачи
+    available = await CreditService.available_balance_async(user_id, session)
+    return {"message": f"Your balance is {balance}", "balance": f"{balance}",
+            "available": f"{available}"}
+
+
+# Поля постраничной выдачи: имя в ответе -> колонка
+TRANSACTION_FIELDS = {
+    "id": Transactions.transaction_id,
+    "type": Transactions.transaction_type,
+    "amount": Transactions.amount,
+    "created_at": Transactions.timestamp,
+}
+
+PREDICTION_FIELDS = {
+    "id": Predictions.prediction_id,
+    "model_id": Predictions.model_id,
+    "input_photo_url": Predictions.input_photo_url,
+    "latitude": Predictions.input_latitude,
+    "longitude": Predictions.input_longitude,
+    "prediction_result": Predictions.recommendation,
+    "severity": Predictions.severity,
+    "created_at": Predictions.timestamp,
+    "cost": Predictions.cost,
+}
+PREDICTION_DEFAULT_FIELDS = ["id", "model_id", "input_photo_url", "latitude", "longitude",
+                             "prediction_result", "created_at", "cost"]
 
 
 @user_route.get('/transactions')
 async def get_transactions_by_user(
         user_id: Annotated[int, Depends(authenticate_user)],
-        session=Depends(get_session)) -> List[Dict[str, Any]]:
-    user = UserService.get_user_by_id(user_id, session)
+        response: Response,
+        params: PageParams = Depends(page_params),
+        session=Depends(get_async_session)) -> List[Dict[str, Any]]:
+    """Операции пользователя, новые первыми; следующая страница — по курсору X-Next-Cursor"""
+    user = await UserService.get_user_by_id_async(user_id, session)
     if user is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
                             detail="User does not exist")
-    transactions = TransactionService.get_transactions_by_user(user_id, session)
-    return [
-            {
-                "id": transaction.transaction_id,
-                "type": transaction.transaction_type,
-                "amount": transaction.amount,
-                "created_at": transaction.timestamp.isoformat()
-            } for transaction in transactions
-        ]
+    return await paginate(session, response, params, TRANSACTION_FIELDS, list(TRANSACTION_FIELDS),
+                          id_col=Transactions.transaction_id, timestamp_col=Transactions.timestamp,
+                          where=[Transactions.user_id == user_id])
 
 
 @user_route.get('/predictions')
 async def get_predictions_user(
         user_id: Annotated[int, Depends(authenticate_user)],
-        session=Depends(get_session)) -> List[Dict[str, Any]]:
-    user = UserService.get_user_by_id(user_id, session)
+        response: Response,
+        params: PageParams = Depends(page_params),
+        session=Depends(get_async_session)) -> List[Dict[str, Any]]:
+    """Предсказания пользователя, новые первыми; следующая страница — по курсору X-Next-Cursor"""
+    user = await UserService.get_user_by_id_async(user_id, session)
     if user is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
                             detail="User with this email does not exist")
-    predictions = PredictService.get_predictions_by_user(user_id, session)
-    return [
-            {
-                "id": prediction.prediction_id,
-                "model_id": prediction.model_id,
-                "input_photo_url": prediction.input_photo_url,
-                "latitude": prediction.input_latitude,
-                "longitude": prediction.input_longitude,
-                "prediction_result": prediction.recommendation,
-                "created_at": prediction.timestamp.isoformat(),
-                "cost": prediction.cost
-            } for prediction in predictions
-        ]
+    return await paginate(session, response, params, PREDICTION_FIELDS, PREDICTION_DEFAULT_FIELDS,
+                          id_col=Predictions.prediction_id, timestamp_col=Predictions.timestamp,
+                          where=[Predictions.user_id == user_id])
+
+
+@user_route.get('/predictions/{prediction_id}')
+async def get_prediction_user(
+        prediction_id: int,
+        user_id: Annotated[int, Depends(authenticate_user)],
+        session=Depends(get_async_session)) -> Dict[str, Any]:
+    """Одно предсказание пользователя — например, результат только что завершённой задачи"""
+    prediction = await PredictService.get_prediction_by_id_async(prediction_id, user_id, session)
+    if prediction is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
+                            detail="Prediction with this id does not exist")
+    return {name: getattr(prediction, PREDICTION_FIELDS[name].key) for name in PREDICTION_DEFAULT_FIELDS}
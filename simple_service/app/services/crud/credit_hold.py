@@ -0,0 +1,102 @@
+from datetime import datetime, timezone
+from typing import Optional
+from sqlalchemy import func, update
+from sqlmodel import select
+from models.credit_hold import CreditHolds
+from models.user import Users
+
+
+HELD = "held"
+CAPTURED = "captured"
+RELEASED = "released"
+
+
+def held_amount_query(user_id: int):
+    """Подзапрос: сумма активных резервов пользователя"""
+    return (select(func.coalesce(func.sum(CreditHolds.amount), 0.0))
+            .where(CreditHolds.user_id == user_id, CreditHolds.status == HELD)
+            .scalar_subquery())
+
+
+def available_balance(user_id: int, session) -> Optional[float]:
+    """Баланс за вычетом активных резервов — одним запросом"""
+    return session.execute(
+        select(Users.balance - held_amount_query(user_id))
+        .where(Users.user_id == user_id)
+    ).scalar_one_or_none()
+
+
+async def available_balance_async(user_id: int, session) -> Optional[float]:
+    """Баланс за вычетом активных резервов — одним запросом (AsyncSession)"""
+    result = await session.execute(
+        select(Users.balance - held_amount_query(user_id))
+        .where(Users.user_id == user_id)
+    )
+    return result.scalar_one_or_none()
+
+
+def place_hold(user_id: int, task_id: int, amount: float, session) -> bool:
+    """
+    Резервирует amount под задачу, если хватает доступного баланса.
+    Строка пользователя блокируется (SELECT ... FOR UPDATE), поэтому параллельные
+    запросы одного пользователя не резервируют одни и те же кредиты.
+    Не коммитит: резерв записывается вместе с задачей.
+    """
+    balance = session.execute(
+        select(Users.balance).where(Users.user_id == user_id).with_for_update()
+    ).scalar_one_or_none()
+    if balance is None:
+        return False
+    held = session.execute(select(held_amount_query(user_id))).scalar_one()
+    if balance - held < amount:
+        return False
+    session.add(CreditHolds(user_id=user_id, task_id=task_id, amount=amount))
+    return True
+
+
+def _settle(task_id: int, new_status: str, session) -> Optional[float]:
+    return session.execute(
+        update(CreditHolds)
+        .where(CreditHolds.task_id == task_id, CreditHolds.status == HELD)
+        .values(status=new_status, settled_at=datetime.now(timezone.utc))
+        .returning(CreditHolds.amount)
+        .execution_options(synchronize_session=False)
+    ).scalar_one_or_none()
+
+
+def capture_hold(task_id: int, session) -> Optional[float]:
+    """Переводит резерв задачи в captured; возвращает его сумму или None, если резерва нет"""
+    return _settle(task_id, CAPTURED, session)
+
+
+def release_hold(task_id: int, session) -> Optional[float]:
+    """Снимает резерв задачи, которая не будет выполнена; не коммитит"""
+    return _settle(task_id, RELEASED, session)
+
+
+def reinstate_hold(task_id: int, session) -> bool:
+    """
+    Возвращает снятый резерв задачи (повтор из очереди недоставленных), если хватает
+    доступного баланса. True — резерв активен или задача ставилась без резерва. Не коммитит.
+    """
+    hold = get_hold(task_id, session)
+    if hold is None or hold.status == HELD:
+        return True
+    if hold.status != RELEASED:
+        return False
+    balance = session.execute(
+        select(Users.balance).where(Users.user_id == hold.user_id).with_for_update()
+    ).scalar_one_or_none()
+    held = session.execute(select(held_amount_query(hold.user_id))).scalar_one()
+    if balance is None or balance - held < hold.amount:
+        return False
+    hold.status = HELD
+    hold.settled_at = None
+    session.add(hold)
+    return True
+
+
+def get_hold(task_id: int, session) -> Optional[CreditHolds]:
+    return session.execute(
+        select(CreditHolds).where(CreditHolds.task_id == task_id)
+    ).scalars().first()
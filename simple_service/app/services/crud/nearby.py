@@ -0,0 +1,163 @@
+import argparse
+import logging
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import func, or_, select, update
+
+from models.prediction import Predictions
+from services import geo
+
+
+# Сколько ячеек geohash допускается в префиксном фильтре одного запроса
+MAX_COVER_CELLS = 16
+# Точность, до которой огрубляются чужие координаты: ячейка ~1.2 × 0.6 км,
+# по ней видна вспышка в районе, но не конкретное поле
+PUBLIC_PRECISION = 6
+
+
+def area_filter(bbox: geo.BBox, max_cells: int = MAX_COVER_CELLS) -> List[Any]:
+    """
+    Условия WHERE для прямоугольника: префиксы geohash сужают поиск по индексу
+    ix_predictions_geohash_timestamp, сравнение координат отсекает края ячеек
+    """
+    min_lon, min_lat, max_lon, max_lat = bbox
+    conditions = [Predictions.input_longitude.between(min_lon, max_lon),
+                  Predictions.input_latitude.between(min_lat, max_lat)]
+    prefixes = geo.cover(bbox, max_cells=max_cells)
+    if prefixes is not None:
+        conditions.insert(0, or_(*[Predictions.geohash.startswith(prefix) for prefix in prefixes]))
+    return conditions
+
+
+def _time_filter(since: Optional[datetime], until: Optional[datetime]) -> List[Any]:
+    conditions = []
+    if since is not None:
+        conditions.append(Predictions.timestamp >= since)
+    if until is not None:
+        conditions.append(Predictions.timestamp < until)
+    return conditions
+
+
+DAMAGE = Predictions.prediction_result["damage"].as_string()
+
+
+def _public_point(row: Dict[str, Any], viewer_id: Optional[int],
+                  precision: int) -> Dict[str, Any]:
+    """Точка для ответа: свои предсказания — как есть, чужие — центр ячейки geohash"""
+    item = dict(row)
+    owner_id = item.pop("user_id")
+    if owner_id != viewer_id:
+        item["latitude"], item["longitude"] = geo.cell_center(
+            geo.encode(item["latitude"], item["longitude"], precision))
+    return item
+
+
+async def nearby_predictions_async(session, bbox: geo.BBox,
+                                   center: Optional[Tuple[float, float]] = None,
+                                   radius_km: Optional[float] = None,
+                                   since: Optional[datetime] = None,
+                                   until: Optional[datetime] = None,
+                                   limit: int = 100,
+                                   viewer_id: Optional[int] = None,
+                                   precision: int = PUBLIC_PRECISION) -> List[Dict[str, Any]]:
+    """
+    Предсказания в прямоугольнике (или в круге center/radius_km внутри описанного
+    прямоугольника), новые первыми. Без user_id и ссылок на фото — для карты региона.
+    Точные координаты отдаются только по предсказаниям viewer_id; у остальных это
+    центр ячейки geohash точности precision, по нему же считается расстояние.
+    """
+    stmt = (
+        select(Predictions.prediction_id, Predictions.timestamp, Predictions.model_id,
+               Predictions.user_id,
+               Predictions.input_latitude.label("latitude"),
+               Predictions.input_longitude.label("longitude"),
+               DAMAGE.label("damage"), Predictions.severity)
+        .where(*area_filter(bbox), *_time_filter(since, until))
+        .order_by(Predictions.timestamp.desc(), Predictions.prediction_id.desc())
+    )
+    if center is None:
+        result = await session.execute(stmt.limit(limit))
+        return [_public_point(row, viewer_id, precision) for row in result.mappings().all()]
+
+    # Углы описанного прямоугольника отсекаются по расстоянию; строки читаются потоком
+    # ровно до limit совпадений
+    items = []
+    result = await session.stream(stmt)
+    try:
+        async for row in result.mappings():
+            item = _public_point(row, viewer_id, precision)
+            distance = geo.haversine_km(center[0], center[1], item["latitude"], item["longitude"])
+            if radius_km is not None and distance > radius_km:
+                continue
+            items.append({**item, "distance_km": round(distance, 3)})
+            if len(items) >= limit:
+                break
+    finally:
+        await result.close()
+    return items
+
+
+async def cell_damage_async(session, bbox: geo.BBox, precision: int = 5,
+                            since: Optional[datetime] = None,
+                            until: Optional[datetime] = None,
+                            limit: int = 500) -> List[Dict[str, Any]]:
+    """Число предсказаний по ячейкам geohash точности precision и типам повреждений"""
+    cell = func.substr(Predictions.geohash, 1, precision)
+    stmt = (
+        select(cell.label("cell"), DAMAGE.label("damage"),
+               func.count().label("predictions"),
+               func.max(Predictions.timestamp).label("last_seen"))
+        .where(*area_filter(bbox), *_time_filter(since, until))
+        .group_by(cell, DAMAGE)
+        .order_by(func.count().desc())
+        .limit(limit)
+    )
+    result = await session.execute(stmt)
+    items = []
+    for row in result.mappings().all():
+        latitude, longitude = geo.cell_center(row["cell"])
+        items.append({**row, "latitude": latitude, "longitude": longitude})
+    return items
+
+
+def backfill_geohash(session, batch_size: int = 1000) -> int:
+    """Заполняет geohash у записей, вставленных до появления колонки"""
+    updated = 0
+    while True:
+        rows = session.execute(
+            select(Predictions.prediction_id, Predictions.input_latitude, Predictions.input_longitude)
+            .where(Predictions.geohash.is_(None),
+                   Predictions.input_latitude.is_not(None),
+                   Predictions.input_longitude.is_not(None))
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            return updated
+        for prediction_id, latitude, longitude in rows:
+            session.execute(update(Predictions)
+                            .where(Predictions.prediction_id == prediction_id)
+                            .values(geohash=geo.encode(latitude, longitude)))
+        session.commit()
+        updated += len(rows)
+
+
+def main(argv=None):
+    """python -m services.crud.nearby backfill [--batch-size N]"""
+    parser = argparse.ArgumentParser(description="Geohash index of prediction coordinates")
+    sub = parser.add_subparsers(dest="command", required=True)
+    backfill_cmd = sub.add_parser("backfill", help="fill geohash for existing predictions")
+    backfill_cmd.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args(argv)
+
+    from sqlmodel import Session
+    from database.database import engine
+
+    with Session(engine) as session:
+        updated = backfill_geohash(session, batch_size=args.batch_size)
+    logging.info(f"Geohash filled for {updated} predictions")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
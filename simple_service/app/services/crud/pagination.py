@@ -0,0 +1,89 @@
+import base64
+import json
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import and_, or_, select
+
+
+@dataclass
+class PageParams:
+    """Параметры страницы: курсор, размер, диапазон дат и набор полей"""
+    cursor: Optional[str] = None
+    limit: int = 50
+    since: Optional[datetime] = None
+    until: Optional[datetime] = None
+    fields: Optional[str] = None
+
+
+@dataclass
+class Page:
+    items: List[Dict[str, Any]]
+    next_cursor: Optional[str] = None
+
+
+def encode_cursor(timestamp: Optional[datetime], id: int) -> str:
+    raw = json.dumps([timestamp.isoformat() if timestamp else None, id])
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[Optional[datetime], int]:
+    """Обратное к encode_cursor; ValueError — курсор повреждён"""
+    try:
+        timestamp, id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return (datetime.fromisoformat(timestamp) if timestamp else None), int(id)
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+def select_fields(fields: Optional[str], available: Dict[str, Any],
+                  default: Sequence[str]) -> List[str]:
+    """Список полей из параметра fields=a,b,c; ValueError — неизвестное поле"""
+    if not fields:
+        return list(default)
+    names = [name.strip() for name in fields.split(",") if name.strip()]
+    unknown = [name for name in names if name not in available]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    return names
+
+
+async def fetch_page_async(session, columns: Dict[str, Any], fields: Sequence[str],
+                           id_col, timestamp_col=None, where: Sequence[Any] = (),
+                           params: PageParams = PageParams()) -> Page:
+    """
+    Страница записей по убыванию (timestamp, id): в SELECT только запрошенные поля,
+    продолжение — строго после последней строки предыдущей страницы (keyset, без OFFSET).
+    Без timestamp_col ключом служит только id.
+    """
+    stmt = select(id_col.label("_id"),
+                  *([timestamp_col.label("_ts")] if timestamp_col is not None else []),
+                  *[columns[name].label(name) for name in fields])
+    stmt = stmt.where(*where)
+
+    if timestamp_col is not None:
+        if params.since is not None:
+            stmt = stmt.where(timestamp_col >= params.since)
+        if params.until is not None:
+            stmt = stmt.where(timestamp_col < params.until)
+
+    if params.cursor:
+        timestamp, last_id = decode_cursor(params.cursor)
+        if timestamp_col is not None and timestamp is not None:
+            stmt = stmt.where(or_(timestamp_col < timestamp,
+                                  and_(timestamp_col == timestamp, id_col < last_id)))
+        else:
+            stmt = stmt.where(id_col < last_id)
+
+    order = ([timestamp_col.desc()] if timestamp_col is not None else []) + [id_col.desc()]
+    stmt = stmt.order_by(*order).limit(params.limit + 1)
+    rows = (await session.execute(stmt)).mappings().all()
+
+    next_cursor = None
+    if len(rows) > params.limit:
+        rows = rows[:params.limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(last.get("_ts"), last["_id"])
+    items = [{name: row[name] for name in fields} for row in rows]
+    return Page(items=items, next_cursor=next_cursor)
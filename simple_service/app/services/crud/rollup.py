@@ -0,0 +1,115 @@
+import argparse
+import logging
+from datetime import date, datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from models.prediction import Predictions
+from models.usage_rollup import DailyUsage
+
+
+# Измерения статистики: имя в API -> колонка агрегата
+DIMENSIONS = {
+    "day": DailyUsage.day,
+    "model": DailyUsage.model_id,
+    "damage_type": DailyUsage.damage_type,
+    "user": DailyUsage.user_id,
+}
+
+
+def _upsert(session):
+    return pg_insert if session.get_bind().dialect.name == "postgresql" else sqlite_insert
+
+
+def record_usage(prediction: Predictions, charged: bool, session) -> None:
+    """
+    Прибавляет предсказание к дневному агрегату одним UPSERT.
+    Не коммитит: вызывается внутри транзакции финализации задачи.
+    """
+    timestamp = prediction.timestamp or datetime.now(timezone.utc)
+    values = dict(
+        day=timestamp.date(),
+        user_id=prediction.user_id,
+        model_id=prediction.model_id or 0,
+        damage_type=str((prediction.prediction_result or {}).get("damage", "unknown")),
+        predictions=1,
+        credits=prediction.cost if charged else 0.0,
+    )
+    stmt = _upsert(session)(DailyUsage).values(**values)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["day", "user_id", "model_id", "damage_type"],
+        set_={"predictions": DailyUsage.predictions + stmt.excluded.predictions,
+              "credits": DailyUsage.credits + stmt.excluded.credits},
+    )
+    session.execute(stmt)
+
+
+def rebuild_usage(session, since: Optional[date] = None) -> None:
+    """
+    Пересчитывает агрегаты из predictions (начиная с since) — для уже накопленных данных.
+    Стоимость считается списанной для всех предсказаний.
+    """
+    day = func.date(Predictions.timestamp)
+    damage = func.coalesce(Predictions.prediction_result["damage"].as_string(), "unknown")
+    source = (
+        select(day, Predictions.user_id, func.coalesce(Predictions.model_id, 0), damage,
+               func.count(), func.sum(Predictions.cost))
+        .group_by(day, Predictions.user_id, func.coalesce(Predictions.model_id, 0), damage)
+    )
+    cleanup = delete(DailyUsage)
+    if since is not None:
+        source = source.where(Predictions.timestamp >= since)
+        cleanup = cleanup.where(DailyUsage.day >= since)
+    session.execute(cleanup)
+    session.execute(insert(DailyUsage).from_select(
+        ["day", "user_id", "model_id", "damage_type", "predictions", "credits"], source))
+    session.commit()
+
+
+def usage_stats(dimension: str, since: Optional[date] = None, until: Optional[date] = None,
+                limit: int = 100) -> Any:
+    """Запрос статистики по измерению: число предсказаний и потраченные кредиты"""
+    key = DIMENSIONS[dimension]
+    stmt = select(key.label("key"),
+                  func.sum(DailyUsage.predictions).label("predictions"),
+                  func.sum(DailyUsage.credits).label("credits"))
+    if since is not None:
+        stmt = stmt.where(DailyUsage.day >= since)
+    if until is not None:
+        stmt = stmt.where(DailyUsage.day < until)
+    stmt = stmt.group_by(key)
+    if dimension != "day":
+        return stmt.order_by(func.sum(DailyUsage.credits).desc()).limit(limit)
+    # Последние limit дней, в ответе — по возрастанию даты
+    recent = stmt.order_by(key.desc()).limit(limit).subquery()
+    return select(recent).order_by(recent.c.key)
+
+
+async def get_usage_stats_async(dimension: str, session, since: Optional[date] = None,
+                                until: Optional[date] = None, limit: int = 100) -> List[Dict[str, Any]]:
+    result = await session.execute(usage_stats(dimension, since, until, limit))
+    return [dict(row) for row in result.mappings().all()]
+
+
+def main(argv=None):
+    """python -m services.crud.rollup rebuild [--since YYYY-MM-DD]"""
+    parser = argparse.ArgumentParser(description="Usage rollups for admin statistics")
+    sub = parser.add_subparsers(dest="command", required=True)
+    rebuild_cmd = sub.add_parser("rebuild", help="recompute rollups from predictions")
+    rebuild_cmd.add_argument("--since", type=date.fromisoformat)
+    args = parser.parse_args(argv)
+
+    from sqlmodel import Session
+    from database.database import engine
+
+    with Session(engine) as session:
+        rebuild_usage(session, since=args.since)
+    logging.info("Usage rollups rebuilt")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,8 +1,19 @@
-from typing import List, Optional
+from typing import Any, Dict, List, Optional, Tuple
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import select
 from models.model import Models, ModelArtifactRead
 from models.user import Users
 from models.prediction import Predictions, PredictionRequest
 from models.ml_task import MLTasks, MLTasksUpdate
+from models.recommendation import Recommendation
+from models.user_images import UserImages
+from models.inference_cache import InferenceCache
+from services.crud.user import charge_balance
+from services.crud.credit_hold import capture_hold, get_hold, reinstate_hold
+from services.crud.rollup import record_usage
+
+
+RECOMMENDATION_NOT_FOUND = "Рекомендации не найдены для данного сочетания"
 
 
 def create_model(new_model: Models, session) -> None:
@@ -97,3 +108,174 @@ def update_task(task_id: int, new_data: MLTasksUpdate, session) -> MLTasks:
     session.commit()
     session.refresh(task)
     return task
+
+
+def finalize_task(task_id: int, prediction: Predictions,
+                  session) -> Tuple[int, Optional[bool]]:
+    """
+    Завершает задачу одной транзакцией: предсказание, статус задачи, закрытие резерва,
+    списание prediction.cost, запись в журнале и дневной агрегат — один commit.
+    Строка задачи блокируется (SELECT ... FOR UPDATE): повторная доставка того же
+    сообщения не создаёт второе предсказание и не списывает кредиты ещё раз.
+    Возвращает (prediction_id, списаны ли кредиты); None — задача уже была завершена.
+    """
+    task = session.execute(
+        select(MLTasks).where(MLTasks.task_id == task_id)
+        .with_for_update()
+        .execution_options(populate_existing=True)
+    ).scalars().one()
+    if task.task_status == "complete" and task.prediction_id is not None:
+        session.rollback()
+        return task.prediction_id, None
+
+    session.add(prediction)
+    session.flush()
+    prediction_id = prediction.prediction_id
+
+    task.prediction_id = prediction_id
+    task.task_status = "complete"
+    task.prediction_result = prediction.prediction_result
+    session.add(task)
+
+    # Резерв гарантирует, что списание пройдёт. Списываем, только если резерв
+    # захвачен сейчас или задача ставилась без него: снятый резерв означает,
+    # что задача уже была отклонена, и платить за неё пользователь не должен
+    captured = capture_hold(task_id, session) is not None
+    charged = False
+    if captured or get_hold(task_id, session) is None:
+        charged = charge_balance(prediction.user_id, prediction.cost, session) is not None
+    # Статистика для админки обновляется в той же транзакции
+    record_usage(prediction, charged, session)
+    session.commit()
+    return prediction_id, charged
+
+
+def reopen_task(task_id: int, session) -> bool:
+    """
+    Готовит задачу из очереди недоставленных к повтору: статус created и снова
+    зарезервированные кредиты. False — задачи нет, она выполнена или резерв не вернуть.
+    """
+    task = session.get(MLTasks, task_id)
+    if task is None or task.task_status == "complete":
+        return False
+    if not reinstate_hold(task_id, session):
+        session.rollback()
+        return False
+    task.task_status = "created"
+    task.failure_reason = None
+    session.add(task)
+    session.commit()
+    return True
+
+
+def get_recommendation(damage_type: str, growth_stage: str, severity: str,
+                       session) -> Tuple[str, Optional[str]]:
+    """Возвращает текст рекомендации и источник для сочетания повреждения, стадии роста и тяжести"""
+    rec_obj = session.exec(
+        select(Recommendation)
+        .where(
+            Recommendation.damage_type == damage_type,
+            Recommendation.growth_stage == growth_stage,
+            Recommendation.severity == severity
+        )
+    ).one_or_none()
+    if rec_obj:
+        return rec_obj.recommendation, rec_obj.source
+    return RECOMMENDATION_NOT_FOUND, None
+
+
+def get_image_by_digest(content_digest: str, session) -> Optional[UserImages]:
+    """Находит ранее загруженное изображение с тем же содержимым"""
+    return session.exec(
+        select(UserImages)
+        .where(UserImages.content_digest == content_digest)
+        .order_by(UserImages.image_id)
+        .limit(1)
+    ).first()
+
+
+def get_cached_inference(content_digest: str, artifact_digest: Optional[str], backend: str,
+                         session) -> Optional[Dict[str, Any]]:
+    """
+    Результат классификации этого изображения этой версией модели, если он уже есть.
+    Без дайджеста артефакта версия модели неизвестна — кэш не используется.
+    """
+    if not artifact_digest:
+        return None
+    cached = session.exec(
+        select(InferenceCache).where(
+            InferenceCache.content_digest == content_digest,
+            InferenceCache.artifact_digest == artifact_digest,
+            InferenceCache.backend == backend,
+        )
+    ).first()
+    if cached:
+        return dict(cached.prediction_result)
+
+
+def save_inference_result(content_digest: str, artifact_digest: Optional[str], backend: str,
+                          prediction_result: Dict[str, Any], session) -> None:
+    """Запоминает результат классификации для пары (изображение, версия модели)"""
+    if not artifact_digest:
+        return
+    session.add(InferenceCache(content_digest=content_digest,
+                               artifact_digest=artifact_digest,
+                               backend=backend,
+                               prediction_result=dict(prediction_result)))
+    try:
+        session.commit()
+    except IntegrityError:
+        # Тот же результат уже записал параллельный воркер
+        session.rollback()
+
+
+# Асинхронные версии для маршрутов FastAPI (AsyncSession)
+
+async def get_all_models_async(session) -> List[ModelArtifactRead]:
+    """Получает модели, доступные пользователям (активные варианты)"""
+    result = await session.exec(select(Models).where(Models.active))
+    return result.all()
+
+
+async def get_predictions_by_user_async(user_id: int, session) -> List[Predictions]:
+    """Получает предсказания для пользователя из БД"""
+    result = await session.exec(select(Predictions).where(Predictions.user_id == user_id))
+    return result.all()
+
+
+async def get_prediction_by_id_async(prediction_id: int, user_id: int,
+                                     session) -> Optional[Predictions]:
+    """Получает предсказание пользователя по id; чужие предсказания не отдаются"""
+    result = await session.exec(select(Predictions).where(Predictions.prediction_id == prediction_id,
+                                                          Predictions.user_id == user_id))
+    return result.first()
+
+
+async def get_all_predictions_async(user: Users, session) -> List[Predictions]:
+    """Получает все предсказания из БД"""
+    if user.is_admin:
+        result = await session.exec(select(Predictions))
+        return result.all()
+
+
+async def get_task_by_id_async(task_id: int, session) -> Optional[MLTasks]:
+    """Получает запись о таске RabbitMQ в БД"""
+    return await session.get(MLTasks, task_id)
+
+
+async def get_all_tasks_async(user: Users, session) -> List[MLTasks]:
+    """Получает все таски RabbitMQ из БД"""
+    if user.is_admin:
+        result = await session.exec(select(MLTasks))
+        return result.all()
+
+
+async def get_image_by_digest_async(content_digest: str, session) -> Optional[UserImages]:
+    """Находит ранее загруженное изображение с тем же содержимым"""
+    result = await session.exec(
+        select(UserImages)
+        .where(UserImages.content_digest == content_digest)
+        .order_by(UserImages.image_id)
+        .limit(1)
+    )
+    return result.first()
@@ -1,17 +1,20 @@
 from models.transaction import Transactions
 from typing import List
+from sqlmodel import select
 from models.user import Users
 
 
 def create_transaction(session, user_id: int, amount: float,
-                       transaction_type: str) -> None:
+                       transaction_type: str, commit: bool = True) -> None:
+    """Запись в журнале операций; commit=False — в составе внешней транзакции"""
     transaction = Transactions(user_id=user_id,
                                amount=amount,
                                transaction_type=transaction_type
                                )
     session.add(transaction)
-    session.commit()
-    session.refresh(transaction)
+    if commit:
+        session.commit()
+        session.refresh(transaction)
 
 
 def get_transactions_by_user(user_id: int, session) -> List[Transactions]:
@@ -25,3 +28,23 @@ def view_all_transactions(user: Users, session) -> List[Transactions]:
         return session.query(Transactions).all()
     else:
         return print('Sorry, you are not the admin')
+
+
+# Асинхронные версии для маршрутов FastAPI (AsyncSession)
+
+async def create_transaction_async(session, user_id: int, amount: float,
+                                   transaction_type: str) -> None:
+    create_transaction(session, user_id, amount, transaction_type, commit=False)
+    await session.commit()
+
+
+async def get_transactions_by_user_async(user_id: int, session) -> List[Transactions]:
+    result = await session.exec(select(Transactions).where(Transactions.user_id == user_id))
+    return result.all()
+
+
+async def view_all_transactions_async(user: Users, session) -> List[Transactions]:
+    if user.is_admin:
+        result = await session.exec(select(Transactions))
+        return result.all()
+    return []
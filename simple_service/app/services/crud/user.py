@@ -1,4 +1,6 @@
 from typing import List, Optional
+from sqlalchemy import update
+from sqlmodel import select
 from models.user import Users
 from services.crud.transaction import create_transaction
 
@@ -57,17 +59,34 @@ def add_balance(user_id: int, amount: float, session) -> None:
         raise ValueError("User does not exist")
 
 
-def deduct_balance(user_id: int, amount: float, session) -> None:
-    user = session.get(Users, user_id)
-    if user and amount > 0 and user.balance >= amount:
-        user.balance -= amount
-        create_transaction(session, user_id, amount, "deduct")
-        print(f"{amount} deducted from your balance")
-        session.add(user)
-        session.commit()
-        session.refresh(user)
-        return True
-    return False
+def charge_balance(user_id: int, amount: float, session) -> Optional[float]:
+    """
+    Списывает amount одним условным UPDATE ... RETURNING и пишет запись в журнал.
+    Не коммитит: вызывающий код завершает транзакцию. Возвращает новый баланс
+    или None, если средств недостаточно (параллельные списания не теряются).
+    """
+    if amount <= 0:
+        return None
+    balance = session.execute(
+        update(Users)
+        .where(Users.user_id == user_id, Users.balance >= amount)
+        .values(balance=Users.balance - amount)
+        .returning(Users.balance)
+        .execution_options(synchronize_session=False)
+    ).scalar_one_or_none()
+    if balance is None:
+        return None
+    create_transaction(session, user_id, amount, "deduct", commit=False)
+    return balance
+
+
+def deduct_balance(user_id: int, amount: float, session) -> bool:
+    balance = charge_balance(user_id, amount, session)
+    if balance is None:
+        return False
+    session.commit()
+    print(f"{amount} deducted from your balance")
+    return True
 
 
 def check_balance(user_id: int, session) -> float:
@@ -92,3 +111,68 @@ def get_admin(session) -> Optional[Users]:
         return admin
     else:
         raise ValueError("Admin does not exist")
+
+
+# Асинхронные версии для маршрутов FastAPI (AsyncSession)
+
+async def create_user_async(new_user: Users, session) -> None:
+    session.add(new_user)
+    await session.commit()
+    await session.refresh(new_user)
+
+
+async def get_user_by_id_async(id: int, session) -> Optional[Users]:
+    user = await session.get(Users, id)
+    if user:
+        return user
+    else:
+        raise ValueError("User does not exist")
+
+
+async def get_user_by_email_async(email: str, session) -> Optional[Users]:
+    result = await session.exec(select(Users).where(Users.email == email))
+    return result.first()
+
+
+async def authenticate_async(email: str, password: str, session) -> Optional[Users]:
+    # Пароль проверяется по хешу в маршруте
+    return await get_user_by_email_async(email, session)
+
+
+async def get_all_users_async(user: Users, session) -> List[Users]:
+    if user.is_admin:
+        result = await session.exec(select(Users))
+        return result.all()
+    return []
+
+
+async def add_balance_async(user_id: int, amount: float, session) -> None:
+    if amount <= 0:
+        raise ValueError("Not enough credits")
+    updated = await session.execute(
+        update(Users)
+        .where(Users.user_id == user_id)
+        .values(balance=Users.balance + amount)
+        .returning(Users.balance)
+        .execution_options(synchronize_session=False)
+    )
+    if updated.scalar_one_or_none() is None:
+        raise ValueError("User does not exist")
+    create_transaction(session, user_id, amount, "deposit", commit=False)
+    await session.commit()
+
+
+async def check_balance_async(user_id: int, session) -> float:
+    user = await session.get(Users, user_id)
+    if user:
+        return user.balance
+    else:
+        raise ValueError("User does not exist")
+
+
+async def add_balance_to_user_async(user: Users, user_to_add_id: int,
+                                    amount, session) -> None:
+    if not user.is_admin:
+        raise ValueError("Admin acсess required")
+
+    await add_balance_async(user_to_add_id, amount, session)
@@ -0,0 +1,191 @@
+import argparse
+import csv
+import importlib.util
+import io
+import json
+import logging
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Iterable, Iterator, List, Optional, Sequence
+
+from sqlalchemy import select
+from sqlmodel import Session
+
+from models.prediction import Predictions
+from services.crud.nearby import area_filter
+from services.geo import BBox, parse_bbox
+
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+CHUNK_SIZE = 5000
+
+# Колонки выгрузки в порядке вывода
+EXPORT_COLUMNS = [
+    Predictions.prediction_id,
+    Predictions.timestamp,
+    Predictions.user_id,
+    Predictions.model_id,
+    Predictions.input_latitude,
+    Predictions.input_longitude,
+    Predictions.prediction_result,
+    Predictions.severity,
+    Predictions.recommendation,
+    Predictions.source,
+    Predictions.cost,
+]
+EXPORT_FIELDS = [column.key for column in EXPORT_COLUMNS]
+
+FORMATS = {"csv": "text/csv", "parquet": "application/vnd.apache.parquet"}
+
+
+@dataclass
+class ExportFilter:
+    since: Optional[datetime] = None
+    until: Optional[datetime] = None
+    model_id: Optional[int] = None
+    bbox: Optional[BBox] = None
+
+
+def export_query(flt: ExportFilter):
+    stmt = select(*EXPORT_COLUMNS)
+    if flt.since is not None:
+        stmt = stmt.where(Predictions.timestamp >= flt.since)
+    if flt.until is not None:
+        stmt = stmt.where(Predictions.timestamp < flt.until)
+    if flt.model_id is not None:
+        stmt = stmt.where(Predictions.model_id == flt.model_id)
+    if flt.bbox is not None:
+        stmt = stmt.where(*area_filter(flt.bbox))
+    return stmt.order_by(Predictions.timestamp, Predictions.prediction_id)
+
+
+def iter_chunks(engine, flt: ExportFilter, chunk_size: int = CHUNK_SIZE) -> Iterator[List[Sequence[Any]]]:
+    """
+    Строки выгрузки пачками по chunk_size. yield_per читает через серверный курсор,
+    поэтому в памяти одновременно находится только одна пачка.
+    """
+    with Session(engine) as session:
+        result = session.execute(export_query(flt).execution_options(yield_per=chunk_size))
+        for partition in result.partitions():
+            yield partition
+
+
+def csv_stream(chunks: Iterable[List[Sequence[Any]]]) -> Iterator[bytes]:
+    """CSV с заголовком; JSON-результат классификации — строкой"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_FIELDS)
+    for chunk in chunks:
+        for row in chunk:
+            writer.writerow([json.dumps(v, ensure_ascii=False) if isinstance(v, dict) else v
+                             for v in row])
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+class _ChunkSink(io.RawIOBase):
+    """Файловый объект без seek: ParquetWriter пишет сюда, данные забираются после каждой группы строк"""
+
+    def __init__(self):
+        self.parts: List[bytes] = []
+        self.position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self.parts.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def drain(self) -> bytes:
+        data = b"".join(self.parts)
+        self.parts.clear()
+        return data
+
+
+def check_format(fmt: str) -> None:
+    """Проверяет формат до начала выгрузки; pyarrow — необязательная зависимость"""
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown export format: {fmt}")
+    if fmt == "parquet":
+        if importlib.util.find_spec("pyarrow") is None:
+            raise RuntimeError("Parquet export requires pyarrow")
+
+
+def parquet_stream(chunks: Iterable[List[Sequence[Any]]]) -> Iterator[bytes]:
+    """Parquet по группе строк на пачку"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([
+        ("prediction_id", pa.int64()),
+        ("timestamp", pa.timestamp("us")),
+        ("user_id", pa.int64()),
+        ("model_id", pa.int64()),
+        ("input_latitude", pa.float64()),
+        ("input_longitude", pa.float64()),
+        ("prediction_result", pa.string()),
+        ("severity", pa.string()),
+        ("recommendation", pa.string()),
+        ("source", pa.string()),
+        ("cost", pa.float64()),
+    ])
+    sink = _ChunkSink()
+    with pq.ParquetWriter(sink, schema) as writer:
+        for chunk in chunks:
+            columns = [list(values) for values in zip(*chunk)]
+            columns[EXPORT_FIELDS.index("prediction_result")] = [
+                json.dumps(v, ensure_ascii=False) if v is not None else None
+                for v in columns[EXPORT_FIELDS.index("prediction_result")]]
+            writer.write_table(pa.Table.from_arrays(columns, schema=schema))
+            yield sink.drain()
+    yield sink.drain()
+
+
+def export_stream(engine, fmt: str, flt: ExportFilter,
+                  chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    check_format(fmt)
+    chunks = iter_chunks(engine, flt, chunk_size)
+    if fmt == "parquet":
+        return parquet_stream(chunks)
+    return csv_stream(chunks)
+
+
+def main(argv=None):
+    """
+    python -m services.export --format parquet --out predictions.parquet
+        [--since 2025-05-01] [--until 2025-06-01] [--model-id 1]
+        [--bbox min_lon,min_lat,max_lon,max_lat]
+    """
+    parser = argparse.ArgumentParser(description="Export predictions to CSV or Parquet")
+    parser.add_argument("--format", choices=sorted(FORMATS), default="csv")
+    parser.add_argument("--out", required=True)
+    parser.add_argument("--since", type=datetime.fromisoformat)
+    parser.add_argument("--until", type=datetime.fromisoformat)
+    parser.add_argument("--model-id", type=int)
+    parser.add_argument("--bbox", type=parse_bbox)
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    args = parser.parse_args(argv)
+
+    from database.database import engine
+
+    flt = ExportFilter(since=args.since, until=args.until, model_id=args.model_id, bbox=args.bbox)
+    written = 0
+    with open(args.out, "wb") as out:
+        for data in export_stream(engine, args.format, flt, args.chunk_size):
+            out.write(data)
+            written += len(data)
+    logging.info(f"Exported predictions to {args.out} ({written} bytes)")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,112 @@
+import math
+from typing import List, Optional, Tuple
+
+# Точность geohash в predictions.geohash: 7 символов — ячейка ~150 x 150 м
+PRECISION = 7
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE = 111.32
+
+BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+BBox = Tuple[float, float, float, float]
+
+
+def parse_bbox(raw: str) -> BBox:
+    """'min_lon,min_lat,max_lon,max_lat' (порядок GeoJSON); ValueError — неверный формат"""
+    try:
+        min_lon, min_lat, max_lon, max_lat = (float(v) for v in raw.split(","))
+    except ValueError:
+        raise ValueError(f"Invalid bbox: {raw}, expected min_lon,min_lat,max_lon,max_lat")
+    if min_lon > max_lon or min_lat > max_lat:
+        raise ValueError(f"Invalid bbox: {raw}, minimum is greater than maximum")
+    return min_lon, min_lat, max_lon, max_lat
+
+
+def encode(lat: float, lon: float, precision: int = PRECISION) -> str:
+    """Geohash точки: чередующиеся биты долготы и широты, по 5 бит на символ"""
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, bits, value, even = [], 0, 0, True
+    while len(chars) < precision:
+        rng, coord = (lon_range, lon) if even else (lat_range, lat)
+        mid = (rng[0] + rng[1]) / 2
+        if coord >= mid:
+            value = value * 2 + 1
+            rng[0] = mid
+        else:
+            value *= 2
+            rng[1] = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(BASE32[value])
+            bits, value = 0, 0
+    return "".join(chars)
+
+
+def decode_bbox(geohash: str) -> BBox:
+    """Границы ячейки geohash (min_lon, min_lat, max_lon, max_lat)"""
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    even = True
+    for char in geohash:
+        value = BASE32.index(char)
+        for shift in range(4, -1, -1):
+            rng = lon_range if even else lat_range
+            mid = (rng[0] + rng[1]) / 2
+            if value >> shift & 1:
+                rng[0] = mid
+            else:
+                rng[1] = mid
+            even = not even
+    return lon_range[0], lat_range[0], lon_range[1], lat_range[1]
+
+
+def cell_center(geohash: str) -> Tuple[float, float]:
+    """Центр ячейки (lat, lon)"""
+    min_lon, min_lat, max_lon, max_lat = decode_bbox(geohash)
+    return (min_lat + max_lat) / 2, (min_lon + max_lon) / 2
+
+
+def cell_size(precision: int) -> Tuple[float, float]:
+    """Размер ячейки в градусах (по широте, по долготе)"""
+    lon_bits = (5 * precision + 1) // 2
+    lat_bits = 5 * precision // 2
+    return 180.0 / 2 ** lat_bits, 360.0 / 2 ** lon_bits
+
+
+def _grid(bbox: BBox, precision: int) -> Tuple[range, range]:
+    min_lon, min_lat, max_lon, max_lat = bbox
+    height, width = cell_size(precision)
+    rows = range(int((min_lat + 90) // height), int((min(max_lat, 90 - 1e-9) + 90) // height) + 1)
+    cols = range(int((min_lon + 180) // width), int((min(max_lon, 180 - 1e-9) + 180) // width) + 1)
+    return rows, cols
+
+
+def cover(bbox: BBox, max_cells: int = 16, max_precision: int = PRECISION) -> Optional[List[str]]:
+    """
+    Наименьший набор префиксов geohash самой мелкой точности, которым bbox покрывается
+    не более чем max_cells ячейками. По префиксам идёт поиск по индексу (LIKE 'prefix%'),
+    точная граница проверяется отдельно. None — область слишком велика для префиксного фильтра.
+    """
+    for precision in range(max_precision, 0, -1):
+        rows, cols = _grid(bbox, precision)
+        if len(rows) * len(cols) > max_cells:
+            continue
+        height, width = cell_size(precision)
+        return sorted({encode(-90 + (row + 0.5) * height, -180 + (col + 0.5) * width, precision)
+                       for row in rows for col in cols})
+    return None
+
+
+def radius_bbox(lat: float, lon: float, radius_km: float) -> BBox:
+    """Описанный вокруг круга прямоугольник (без перехода через антимеридиан)"""
+    dlat = radius_km / KM_PER_DEGREE
+    dlon = radius_km / (KM_PER_DEGREE * max(math.cos(math.radians(lat)), 1e-6))
+    return (max(lon - dlon, -180.0), max(lat - dlat, -90.0),
+            min(lon + dlon, 180.0), min(lat + dlat, 90.0))
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi, dlmb = phi2 - phi1, math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlmb / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
@@ -0,0 +1,109 @@
+import hashlib
+import io
+from typing import BinaryIO, Tuple
+
+import numpy as np
+from minio import Minio
+from PIL import Image
+
+
+# Минимальный размер части multipart-загрузки в S3/MinIO
+MIN_PART_SIZE = 5 * 1024 * 1024
+
+# Должен совпадать с image_size в workers/inference.py
+DERIVATIVE_SIZE = (256, 256)
+
+
+class UploadTooLarge(ValueError):
+    """Загружаемый файл превышает допустимый размер"""
+
+
+class HashingReader:
+    """
+    Файловый объект-обёртка для потоковой загрузки: считает sha256 и размер
+    по мере чтения и прерывает загрузку при превышении max_bytes.
+    """
+
+    def __init__(self, raw: BinaryIO, max_bytes: int):
+        self.raw = raw
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._sha256 = hashlib.sha256()
+
+    def read(self, size: int = -1) -> bytes:
+        chunk = self.raw.read(size)
+        self.size += len(chunk)
+        if self.size > self.max_bytes:
+            raise UploadTooLarge(f"File exceeds the limit of {self.max_bytes} bytes")
+        self._sha256.update(chunk)
+        return chunk
+
+    @property
+    def sha256(self) -> str:
+        return self._sha256.hexdigest()
+
+
+def hash_stream(raw: BinaryIO, max_bytes: int,
+                chunk_size: int = MIN_PART_SIZE) -> Tuple[int, str]:
+    """
+    Размер и sha256 уже принятого файла (SpooledTemporaryFile) без загрузки в хранилище:
+    дубликат распознаётся до отправки в MinIO. Блокирующая функция — вызывать вне event loop.
+    """
+    reader = HashingReader(raw, max_bytes)
+    while reader.read(chunk_size):
+        pass
+    raw.seek(0)
+    return reader.size, reader.sha256
+
+
+def put_stream(client: Minio, bucket_name: str, object_name: str, raw: BinaryIO,
+               content_type: str, max_bytes: int,
+               part_size: int = MIN_PART_SIZE) -> Tuple[int, str]:
+    """
+    Загружает поток в MinIO частями (multipart), не читая файл в память целиком.
+    Блокирующая функция — вызывать вне event loop. Возвращает (размер, sha256).
+    """
+    reader = HashingReader(raw, max_bytes)
+    client.put_object(
+        bucket_name=bucket_name,
+        object_name=object_name,
+        data=reader,
+        length=-1,
+        part_size=max(part_size, MIN_PART_SIZE),
+        content_type=content_type or "application/octet-stream",
+    )
+    return reader.size, reader.sha256
+
+
+def derivative_name(object_name: str) -> str:
+    """Имя объекта с уменьшенной копией изображения"""
+    return f"{object_name.rsplit('.', 1)[0]}_{DERIVATIVE_SIZE[0]}.npy"
+
+
+def make_derivative(raw: BinaryIO) -> bytes:
+    """
+    Уменьшенная до DERIVATIVE_SIZE копия изображения в виде массива uint8 (H, W, 3) в формате .npy.
+    Ресайз тот же, что у T.Resize в воркере, поэтому тензор на входе модели не меняется,
+    а воркер не скачивает и не декодирует исходное фото.
+    """
+    raw.seek(0)
+    img = Image.open(raw).convert("RGB")
+    # T.Resize принимает размер как (h, w), PIL — как (w, h)
+    img = img.resize(DERIVATIVE_SIZE[::-1], Image.BILINEAR)
+    buffer = io.BytesIO()
+    np.save(buffer, np.asarray(img, dtype=np.uint8), allow_pickle=False)
+    return buffer.getvalue()
+
+
+def put_derivative(client: Minio, bucket_name: str, object_name: str, raw: BinaryIO) -> str:
+    """Создаёт и загружает уменьшенную копию; возвращает имя её объекта"""
+    data = make_derivative(raw)
+    name = derivative_name(object_name)
+    client.put_object(
+        bucket_name=bucket_name,
+        object_name=name,
+        data=io.BytesIO(data),
+        length=len(data),
+        content_type="application/octet-stream",
+    )
+    return name
@@ -3,8 +3,10 @@ import pytest
 from fastapi.testclient import TestClient
 from api import app
 from sqlmodel import SQLModel, Session, create_engine
-from database.database import get_session
-from sqlalchemy.pool import StaticPool
+from sqlmodel.ext.asyncio.session import AsyncSession
+from database.database import get_session, get_async_session
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import NullPool, StaticPool
 from services.crud.user import get_user_by_email
 
 
@@ -25,7 +27,15 @@ def client_fixture(session: Session):
     def get_session_override():
         return session
 
+    # Асинхронные маршруты работают с тем же файлом БД через aiosqlite
+    async_engine = create_async_engine("sqlite+aiosqlite:///testing.db", poolclass=NullPool)
+
+    async def get_async_session_override():
+        async with AsyncSession(async_engine, expire_on_commit=False) as async_session:
+            yield async_session
+
     app.dependency_overrides[get_session] = get_session_override
+    app.dependency_overrides[get_async_session] = get_async_session_override
 
     client = TestClient(app)
     yield client
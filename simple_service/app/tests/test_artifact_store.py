@@ -0,0 +1,78 @@
+import json
+import shutil
+
+import pytest
+
+torch = pytest.importorskip("torch")
+
+from workers.artifact_store import ArtifactStore, DirectorySource, label_map_version  # noqa: E402
+from workers.model_registry import load_model  # noqa: E402
+
+
+REF = "a-gapeeva/eotg-multilabel/resnet18_bsl_cpu:latest"
+LABEL_MAPS = {"damage": {"0": "DR", "1": "G"}, "extent": {"0": "10", "1": "50"}}
+
+
+class Heads(torch.nn.Module):
+    def forward(self, x):
+        return {"damage": x[:, :2], "extent": x[:, 2:4]}
+
+
+def publish(source_dir, ref, alias_dir="latest", payload=b"kmeans"):
+    """Кладёт артефакт в каталог, подменяющий WandB"""
+    name = ref.split(":")[0]
+    path = source_dir / name / alias_dir
+    path.mkdir(parents=True, exist_ok=True)
+    torch.jit.save(torch.jit.script(Heads()), str(path / "resnet18_scripted.pt"))
+    (path / "extra.joblib").write_bytes(payload)
+    (path / "metadata.json").write_text(json.dumps({"inverse_label_maps": LABEL_MAPS}))
+    return path
+
+
+def test_store_resolves_offline_after_pin(tmp_path):
+    source_dir = tmp_path / "wandb"
+    publish(source_dir, REF)
+    store = ArtifactStore(str(tmp_path / "store"), source=DirectorySource(str(source_dir)))
+
+    pinned = store.resolve(REF)
+    assert store.is_pinned(REF)
+    assert pinned.metadata["inverse_label_maps"] == LABEL_MAPS
+
+    # Источник пропал — модель всё равно грузится с диска
+    shutil.rmtree(source_dir)
+    offline = ArtifactStore(str(tmp_path / "store"))
+    assert offline.resolve(REF).digest == pinned.digest
+
+    model, label_maps = load_model(REF, artifact_store=offline)
+    out = model(torch.tensor([[0.0, 1.0, 1.0, 0.0]]))
+    assert label_maps["damage"][int(out["damage"].argmax(dim=1))] == "G"
+    assert label_maps["extent"][int(out["extent"].argmax(dim=1))] == "10"
+
+
+def test_refresh_repins_moved_alias(tmp_path):
+    source_dir = tmp_path / "wandb"
+    path = publish(source_dir, REF)
+    store = ArtifactStore(str(tmp_path / "store"), source=DirectorySource(str(source_dir)))
+    first = store.resolve(REF)
+
+    (path / "extra.joblib").write_bytes(b"retrained")
+    assert store.resolve(REF).digest == first.digest
+
+    second = store.refresh(REF)
+    assert second.digest != first.digest
+    assert store.resolve(REF).digest == second.digest
+    # Неизменившиеся файлы хранятся в одном экземпляре
+    assert first.files["resnet18_scripted.pt"] == second.files["resnet18_scripted.pt"]
+    assert store.get(first.digest).files == first.files
+
+
+def test_model_loads_by_pinned_digest(tmp_path):
+    source_dir = tmp_path / "wandb"
+    publish(source_dir, REF)
+    store = ArtifactStore(str(tmp_path / "store"), source=DirectorySource(str(source_dir)))
+    digest = store.resolve(REF).digest
+
+    assert store.has(digest)
+    _, label_maps = load_model(digest, artifact_store=store)
+    # Версия меток не зависит от того, строковые ключи классов или целые
+    assert label_map_version(label_maps) == store.get(digest).label_map_version
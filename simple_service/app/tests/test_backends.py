@@ -0,0 +1,73 @@
+import json
+
+import pytest
+
+torch = pytest.importorskip("torch")
+
+from workers.artifact_store import ArtifactStore, DirectorySource  # noqa: E402
+from workers.backends import backend_file, load_images, model_ref, parity  # noqa: E402
+from workers.model_registry import load_model, model_size_bytes  # noqa: E402
+
+
+REF = "a-gapeeva/eotg-multilabel/tiny_cpu:latest"
+LABEL_MAPS = {"damage": {"0": "DR", "1": "G", "2": "WD"}, "extent": {"0": "10", "1": "50"}}
+
+
+class TinyNet(torch.nn.Module):
+    def __init__(self):
+        super().__init__()
+        self.features = torch.nn.Sequential(
+            torch.nn.Conv2d(3, 8, 3, stride=4), torch.nn.BatchNorm2d(8), torch.nn.ReLU(),
+            torch.nn.AdaptiveAvgPool2d(1), torch.nn.Flatten())
+        self.damage = torch.nn.Linear(8, 3)
+        self.extent = torch.nn.Linear(8, 2)
+
+    def forward(self, x):
+        f = self.features(x)
+        return {"damage": self.damage(f), "extent": self.extent(f)}
+
+
+def publish(source_dir, onnx=False):
+    torch.manual_seed(0)
+    model = TinyNet().eval()
+    path = source_dir / REF.split(":")[0] / "latest"
+    path.mkdir(parents=True)
+    torch.jit.save(torch.jit.script(model), str(path / "tiny_scripted.pt"))
+    quantized = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    torch.jit.save(torch.jit.script(quantized), str(path / "tiny_int8_scripted.pt"))
+    if onnx:
+        torch.onnx.export(model, torch.randn(1, 3, 256, 256), str(path / "tiny.onnx"),
+                          input_names=["image"], output_names=["damage", "extent"],
+                          dynamic_axes={"image": {0: "batch"}, "damage": {0: "batch"},
+                                        "extent": {0: "batch"}})
+    (path / "metadata.json").write_text(json.dumps({"inverse_label_maps": LABEL_MAPS}))
+
+
+def test_backend_file_keeps_fp32_and_int8_apart():
+    files = ["tiny_int8_scripted.pt", "tiny_scripted.pt", "tiny.onnx"]
+
+    assert backend_file(files, "torchscript") == "tiny_scripted.pt"
+    assert backend_file(files, "frozen") == "tiny_scripted.pt"
+    assert backend_file(files, "int8") == "tiny_int8_scripted.pt"
+    assert backend_file(files, "onnx") == "tiny.onnx"
+    assert model_ref("digest", "torchscript") == "digest"
+
+
+def test_variants_match_reference(tmp_path):
+    pytest.importorskip("onnx")
+    pytest.importorskip("onnxruntime")
+    publish(tmp_path / "wandb", onnx=True)
+    store = ArtifactStore(str(tmp_path / "store"), source=DirectorySource(str(tmp_path / "wandb")))
+
+    reference, label_maps = load_model(REF, artifact_store=store)
+    variants = {backend: load_model(model_ref(REF, backend), artifact_store=store)
+                for backend in ("frozen", "int8", "onnx")}
+
+    assert label_maps["damage"][0] == "DR"
+    assert all(model_size_bytes(entry) > 0 for entry in variants.values())
+    report = parity(reference, {b: entry[0] for b, entry in variants.items()},
+                    load_images(None, count=4), batch_size=2)
+    assert report["frozen"]["agreement"] == 1.0
+    assert report["onnx"]["heads"]["damage"]["max_abs_diff"] < 1e-3
+    assert report["int8"]["agreement"] >= 0.75
+    assert report["reference"]["ms_per_image"] > 0
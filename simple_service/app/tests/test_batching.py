@@ -0,0 +1,78 @@
+import io
+
+import numpy as np
+import pytest
+from PIL import Image
+
+torch = pytest.importorskip("torch")
+
+from services.storage import make_derivative  # noqa: E402
+from workers.batching import collect_batches, group_by  # noqa: E402
+from workers.inference import (decode_outputs, forward_batch, preprocess,  # noqa: E402
+                               preprocess_derivative)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_collect_batches_flushes_on_size_and_idle():
+    idle = (None, None, None)
+    events = [("m1", None, b"1"), ("m2", None, b"2"), ("m3", None, b"3"),
+              idle, ("m4", None, b"4")]
+
+    batches = list(collect_batches(events, batch_size=2, max_wait=10, clock=FakeClock()))
+
+    assert [[m for m, _, _ in b] for b in batches] == [["m1", "m2"], ["m3"], ["m4"]]
+
+
+def test_collect_batches_flushes_on_deadline():
+    clock = FakeClock()
+
+    def events():
+        yield ("m1", None, b"1")
+        clock.now = 0.5
+        yield ("m2", None, b"2")
+        yield ("m3", None, b"3")
+
+    batches = list(collect_batches(events(), batch_size=10, max_wait=0.1, clock=clock))
+
+    assert [[m for m, _, _ in b] for b in batches] == [["m1", "m2"], ["m3"]]
+
+
+def test_group_by_keeps_arrival_order():
+    groups = group_by(["a1", "b1", "a2"], key=lambda s: s[0])
+
+    assert list(groups) == ["a", "b"]
+    assert groups["a"] == ["a1", "a2"]
+
+
+def test_batched_forward_matches_single_images():
+    class TwoHeads(torch.nn.Module):
+        def forward(self, x):
+            flat = x.flatten(1)
+            return {"damage": flat[:, :3], "extent": flat[:, 3:5]}
+
+    model = torch.jit.script(TwoHeads())
+    tensors = [torch.randn(3, 4, 4) for _ in range(3)]
+
+    batched = decode_outputs(forward_batch(model, tensors), len(tensors))
+    single = [decode_outputs(forward_batch(model, [t]), 1)[0] for t in tensors]
+
+    assert batched == single
+
+
+def test_upload_derivative_gives_same_tensor_as_original():
+    rng = np.random.default_rng(0)
+    img = Image.fromarray(rng.integers(0, 255, (600, 800, 3), dtype=np.uint8))
+    raw = io.BytesIO()
+    img.save(raw, format="PNG")
+
+    derivative = np.load(io.BytesIO(make_derivative(raw)), allow_pickle=False)
+
+    assert derivative.shape == (256, 256, 3)
+    assert torch.allclose(preprocess_derivative(derivative), preprocess(img), atol=1e-6)
@@ -0,0 +1,95 @@
+import pytest
+from sqlmodel import Session
+
+pytest.importorskip("ee")
+
+from models.ml_task import MLTasks  # noqa: E402
+from models.prediction import Predictions  # noqa: E402
+from models.recommendation import Recommendation  # noqa: E402
+from models.user import Users  # noqa: E402
+from workers import enrichment_worker  # noqa: E402
+from workers.recommendations import RecommendationIndex  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def fresh_recommendations(monkeypatch):
+    monkeypatch.setattr(enrichment_worker, "recommendation_index", RecommendationIndex(300))
+
+
+class StubLookup:
+    def __init__(self, stage):
+        self.stage = stage
+
+    def lookup(self, latitude, longitude):
+        return -12.0, self.stage
+
+
+def seed_prediction(session: Session) -> Predictions:
+    session.add(Users(email="farmer@example.com", username="farmer", password="x"))
+    session.add_all([
+        Recommendation(damage_type="DR", growth_stage="V", severity="low",
+                       recommendation="vegetative advice"),
+        Recommendation(damage_type="DR", growth_stage="F", severity="low",
+                       recommendation="flowering advice", source="src"),
+    ])
+    readable = {"damage": "DR", "growth_stage": "V", "extent": "20"}
+    pred = Predictions(user_id=1, model_id=None, input_photo_url="u", input_data="d",
+                       input_latitude=55.75, input_longitude=37.61,
+                       prediction_result=readable, severity="low", cost=8,
+                       recommendation="vegetative advice", enrichment_status="pending")
+    session.add(pred)
+    session.commit()
+    session.add(MLTasks(user_id=1, model_id=1, input_data="1", task_status="complete",
+                        prediction_id=pred.prediction_id, prediction_result=readable))
+    session.commit()
+    return pred
+
+
+def test_enrichment_updates_growth_stage_and_recommendation(session: Session, monkeypatch):
+    pred = seed_prediction(session)
+    monkeypatch.setattr(enrichment_worker, "growth_lookup", StubLookup("F"))
+
+    enrichment_worker.enrich_prediction(
+        {"prediction_id": pred.prediction_id, "task_id": 1,
+         "latitude": 55.75, "longitude": 37.61}, session)
+
+    session.refresh(pred)
+    assert pred.prediction_result["growth_stage"] == "F"
+    assert pred.recommendation == "flowering advice"
+    assert pred.source == "src"
+    assert pred.enrichment_status == "done"
+    assert session.get(MLTasks, 1).prediction_result["growth_stage"] == "F"
+
+
+def test_enrichment_keeps_result_without_satellite_data(session: Session, monkeypatch):
+    pred = seed_prediction(session)
+    monkeypatch.setattr(enrichment_worker, "growth_lookup", StubLookup("unknown"))
+
+    enrichment_worker.enrich_prediction(
+        {"prediction_id": pred.prediction_id, "task_id": 1,
+         "latitude": 55.75, "longitude": 37.61}, session)
+
+    session.refresh(pred)
+    assert pred.prediction_result["growth_stage"] == "V"
+    assert pred.recommendation == "vegetative advice"
+    assert pred.enrichment_status == "done"
+
+
+def test_enrichment_nacks_when_retry_cannot_be_published():
+    class Method:
+        delivery_tag = 7
+
+    class ClosedChannel:
+        def __init__(self):
+            self.nacked = []
+
+        def basic_publish(self, **kwargs):
+            raise ConnectionError("channel closed")
+
+        def basic_nack(self, delivery_tag, requeue=True):
+            self.nacked.append(delivery_tag)
+
+    channel = ClosedChannel()
+    enrichment_worker.enrichment_task(channel, Method(), None, b"not json")
+
+    assert channel.nacked == [7]
@@ -0,0 +1,58 @@
+import csv
+import io
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlmodel import Session
+
+from models.model import Models
+from models.prediction import Predictions
+from models.user import Users
+from services.export import ExportFilter, export_stream, parse_bbox
+
+
+def seed(session: Session) -> None:
+    session.add(Users(email="admin@example.com", username="admin", password="x", is_admin=True))
+    session.add(Users(email="farmer@example.com", username="farmer", password="x"))
+    session.add(Models(name="m", description="d", artifact_path="a/b/c:v1", cost=10))
+    session.commit()
+    for i in range(5):
+        session.add(Predictions(user_id=2, model_id=1, input_photo_url="u", input_data="img",
+                                input_latitude=55.0 + i, input_longitude=37.0 + i,
+                                prediction_result={"damage": "DR"}, cost=10,
+                                severity="low", recommendation="r"))
+    session.commit()
+
+
+def test_csv_export_streams_in_chunks_with_filters(session: Session):
+    seed(session)
+
+    chunks = list(export_stream(session.get_bind(), "csv", ExportFilter(), chunk_size=2))
+    rows = list(csv.DictReader(io.StringIO(b"".join(chunks).decode())))
+
+    assert len(chunks) == 3
+    assert [int(r["prediction_id"]) for r in rows] == [1, 2, 3, 4, 5]
+    assert rows[0]["prediction_result"] == '{"damage": "DR"}'
+
+    flt = ExportFilter(bbox=parse_bbox("37.5,55.5,39.5,57.5"))
+    data = b"".join(export_stream(session.get_bind(), "csv", flt)).decode()
+    assert [int(r["prediction_id"]) for r in csv.DictReader(io.StringIO(data))] == [2, 3]
+
+
+def test_parquet_export_round_trips(client: TestClient, session: Session):
+    pq = pytest.importorskip("pyarrow.parquet")
+    seed(session)
+
+    response = client.get("/admins/export/predictions?email=admin@example.com&format=parquet")
+
+    assert response.status_code == 200
+    table = pq.read_table(io.BytesIO(response.content))
+    assert table.num_rows == 5
+    assert table.column("input_latitude").to_pylist() == [55.0, 56.0, 57.0, 58.0, 59.0]
+
+
+def test_export_requires_admin_and_valid_bbox(client: TestClient, session: Session):
+    seed(session)
+
+    assert client.get("/admins/export/predictions?email=farmer@example.com").status_code == 403
+    assert client.get("/admins/export/predictions?email=admin@example.com&bbox=1,2").status_code == 400
@@ -0,0 +1,79 @@
+import json
+
+import pytest
+
+torch = pytest.importorskip("torch")
+pytest.importorskip("torchvision")
+
+from PIL import Image  # noqa: E402
+from sqlmodel import select  # noqa: E402
+
+from models.model import Models  # noqa: E402
+from workers.architectures import build_model  # noqa: E402
+from workers.artifact_store import ArtifactStore, DirectorySource  # noqa: E402
+from workers.backends import load_images  # noqa: E402
+from workers.export_model import (benchmark, choose_variant, export_variants,  # noqa: E402
+                                  read_labeled_set, register_variants)
+
+
+REF = "a-gapeeva/eotg-multilabel/rn18_export_cpu:latest"
+LABEL_MAPS = {"damage": {0: "DR", 1: "G"}, "extent": {0: "10", 1: "50", 2: "90"}}
+
+
+def test_choose_variant_prefers_fastest_acceptable():
+    results = {
+        "torchscript": {"latency_ms": 80.0, "agreement": 1.0, "accuracy": 0.9},
+        "frozen": {"latency_ms": 60.0, "agreement": 1.0, "accuracy": 0.9},
+        "int8": {"latency_ms": 20.0, "agreement": 0.97, "accuracy": 0.89},
+        "onnx": {"latency_ms": 40.0, "agreement": 1.0, "accuracy": 0.9},
+    }
+
+    assert choose_variant(results, min_agreement=0.99) == "onnx"
+    assert choose_variant(results, min_agreement=0.95) == "int8"
+    assert choose_variant(results, min_agreement=0.95, max_accuracy_drop=0.005) == "onnx"
+
+
+def test_export_benchmark_and_register(tmp_path, session):
+    torch.manual_seed(0)
+    model = build_model("rn18", {head: len(m) for head, m in LABEL_MAPS.items()}).eval()
+
+    image_dir = tmp_path / "images"
+    image_dir.mkdir()
+    rows = ["filename,damage,extent"]
+    for i, array in enumerate(load_images(None, count=4).mul(60).add(128).clamp(0, 255).byte()):
+        Image.fromarray(array.permute(1, 2, 0).numpy()).save(image_dir / f"{i}.png")
+        rows.append(f"{i}.png,{LABEL_MAPS['damage'][i % 2]},{LABEL_MAPS['extent'][i % 3]}")
+    (tmp_path / "test.csv").write_text("\n".join(rows))
+    images, labels = read_labeled_set(str(tmp_path / "test.csv"), str(image_dir), LABEL_MAPS)
+    assert labels["extent"].tolist() == [0, 1, 2, 0]
+
+    artifact_dir = tmp_path / "wandb" / REF.split(":")[0] / "latest"
+    files = export_variants(model, "rn18_export_cpu", list(LABEL_MAPS), artifact_dir, images)
+    assert files["torchscript"] == "rn18_export_cpu_scripted.pt"
+    assert files["int8"] == "rn18_export_cpu_int8_scripted.pt"
+
+    results = benchmark(artifact_dir, files, images, labels, batch_size=2)
+    assert results["frozen"]["agreement"] == 1.0
+    assert all(r["latency_ms"] > 0 and 0 <= r["accuracy"] <= 1 for r in results.values())
+    chosen = choose_variant(results, min_agreement=0.0, max_accuracy_drop=1.0)
+    assert results[chosen]["latency_ms"] == min(r["latency_ms"] for r in results.values())
+
+    (artifact_dir / "metadata.json").write_text(json.dumps({"inverse_label_maps": LABEL_MAPS}))
+    store = ArtifactStore(str(tmp_path / "store"), source=DirectorySource(str(tmp_path / "wandb")))
+    manifest = store.refresh(REF)
+    register_variants(session, REF, "rn18_export", "test", 5, results, chosen,
+                      manifest.digest, manifest.label_map_version)
+    # Повторный экспорт обновляет строки, а не плодит новые
+    register_variants(session, REF, "rn18_export", "test", 5, results, "torchscript",
+                      manifest.digest, manifest.label_map_version)
+
+    registered = session.exec(select(Models).where(Models.artifact_path == REF)).all()
+    assert {m.backend for m in registered} == set(results)
+    assert [m.backend for m in registered if m.active] == ["torchscript"]
+    assert all(m.latency_ms and m.artifact_digest == manifest.digest for m in registered)
+
+
+def test_benchmark_requires_reference_variant(tmp_path):
+    images = torch.zeros(2, 3, 224, 224)
+    with pytest.raises(RuntimeError, match="Reference torchscript variant"):
+        benchmark(tmp_path, {"torchscript": "missing_scripted.pt"}, images)
@@ -0,0 +1,63 @@
+import pytest
+
+pytest.importorskip("torch")
+
+from workers.model_registry import ModelRegistry  # noqa: E402
+
+
+def make_registry(max_bytes, sizes):
+    loaded = []
+
+    def loader(artifact_path):
+        loaded.append(artifact_path)
+        return f"model:{artifact_path}", {"damage": {0: "G"}}
+
+    def sizer(entry):
+        return sizes[entry[0].split(":", 1)[1]]
+
+    return ModelRegistry(max_bytes, loader=loader, sizer=sizer), loaded
+
+
+def test_registry_loads_model_once():
+    registry, loaded = make_registry(100, {"a": 10})
+
+    first = registry.get("a")
+    second = registry.get("a")
+
+    assert first is second
+    assert loaded == ["a"]
+    stats = registry.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["load_seconds"] >= 0
+
+
+def test_registry_evicts_least_recently_used():
+    registry, loaded = make_registry(100, {"a": 40, "b": 40, "c": 40})
+
+    registry.get("a")
+    registry.get("b")
+    registry.get("a")  # "b" теперь самая старая
+    registry.get("c")
+
+    assert "a" in registry
+    assert "b" not in registry
+    assert "c" in registry
+    assert registry.stats()["evictions"] == 1
+    assert registry.used_bytes <= 100
+
+    registry.get("b")
+    assert loaded == ["a", "b", "c", "b"]
+
+
+def test_pinned_models_are_not_evicted_or_budgeted():
+    registry, loaded = make_registry(50, {"shared": 200, "a": 30, "b": 30})
+
+    registry.pin("shared")
+    registry.get("a")
+    registry.get("b")  # вытесняет "a", закреплённая модель остаётся
+    registry.get("shared")
+
+    assert "shared" in registry and "a" not in registry
+    assert loaded == ["shared", "a", "b"]
+    assert (registry.used_bytes, registry.pinned_bytes) == (30, 200)
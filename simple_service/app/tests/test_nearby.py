@@ -0,0 +1,88 @@
+from fastapi.testclient import TestClient
+from sqlmodel import Session
+
+from models.model import Models
+from models.prediction import Predictions
+from services import geo
+from services.crud.nearby import backfill_geohash
+
+# Точки вокруг (55.75, 37.62): ~1 км, ~3 км, ~30 км и без координат
+POINTS = [(55.759, 37.62, "DR"), (55.75, 37.667, "WD"), (56.02, 37.62, "DR"), (None, None, "DR")]
+
+
+def seed(session: Session) -> None:
+    session.add(Models(name="m", description="d", artifact_path="a/b/c:v1", cost=10))
+    session.commit()
+    for lat, lon, damage in POINTS:
+        session.add(Predictions(user_id=1, model_id=1, input_photo_url="u", input_data="img",
+                                input_latitude=lat, input_longitude=lon,
+                                prediction_result={"damage": damage}, cost=10,
+                                severity="low", recommendation="r"))
+    session.commit()
+
+
+def test_geohash_encode_and_cover():
+    assert geo.encode(57.64911, 10.40744, 11) == "u4pruydqqvj"
+    lat, lon = geo.cell_center("u4pruydqqvj")
+    assert abs(lat - 57.64911) < 1e-5 and abs(lon - 10.40744) < 1e-5
+
+    prefixes = geo.cover(geo.radius_bbox(55.75, 37.62, 5))
+    assert 0 < len(prefixes) <= 16
+    assert any(geo.encode(55.759, 37.62).startswith(p) for p in prefixes)
+    assert geo.cover((-180, -90, 180, 90)) is None
+
+
+def test_geohash_is_set_on_insert_and_backfilled(session: Session):
+    seed(session)
+    rows = session.query(Predictions).order_by(Predictions.prediction_id).all()
+    assert rows[0].geohash == geo.encode(55.759, 37.62)
+    assert rows[3].geohash is None
+
+    rows[0].geohash = None
+    session.commit()
+    assert backfill_geohash(session) == 1
+    session.refresh(rows[0])
+    assert rows[0].geohash == geo.encode(55.759, 37.62)
+
+
+def test_nearby_by_radius_and_cells(client: TestClient, session: Session, test_user):
+    seed(session)
+    headers = {"Authorization": f"Bearer {test_user['token']}"}
+
+    nearby = client.get("/service/predictions/nearby?lat=55.75&lon=37.62&radius_km=5",
+                        headers=headers).json()
+    assert sorted(p["damage"] for p in nearby) == ["DR", "WD"]
+    assert all(p["distance_km"] <= 5 for p in nearby)
+    assert "user_id" not in nearby[0]
+
+    cells = client.get("/service/predictions/cells?bbox=37,55,38,57&precision=3",
+                       headers=headers).json()
+    assert {(c["damage"], c["predictions"]) for c in cells} == {("DR", 2), ("WD", 1)}
+
+    assert client.get("/service/predictions/nearby?lat=55.75",
+                      headers=headers).status_code == 400
+
+
+def test_nearby_hides_exact_coordinates_of_other_users(client: TestClient, session: Session, test_user):
+    from models.user import Users
+    from services.crud.nearby import PUBLIC_PRECISION
+
+    seed(session)
+    session.add(Users(email="neighbour@example.com", username="neighbour", password="x"))
+    session.commit()
+    neighbour = session.query(Users).filter(Users.email == "neighbour@example.com").one()
+    session.add(Predictions(user_id=neighbour.user_id, model_id=1, input_photo_url="u", input_data="img",
+                            input_latitude=55.7512, input_longitude=37.6178,
+                            prediction_result={"damage": "WD"}, cost=10,
+                            severity="low", recommendation="r"))
+    session.commit()
+    headers = {"Authorization": f"Bearer {test_user['token']}"}
+
+    for query in ("lat=55.75&lon=37.62&radius_km=5", "bbox=37,55,38,57"):
+        nearby = client.get(f"/service/predictions/nearby?{query}", headers=headers).json()
+        points = {(p["latitude"], p["longitude"]) for p in nearby}
+        # Свои точки — как есть, чужая — только центр ячейки geohash
+        assert (55.759, 37.62) in points
+        assert (55.7512, 37.6178) not in points
+        assert geo.cell_center(geo.encode(55.7512, 37.6178, PUBLIC_PRECISION)) in points
+        assert all("user_id" not in p for p in nearby)
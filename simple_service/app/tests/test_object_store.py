@@ -0,0 +1,34 @@
+import io
+import uuid
+
+from routes.service import minio_client, bucket_name
+from workers.object_store import ObjectStore, make_minio_client
+
+
+def put(data: bytes) -> str:
+    name = f"{uuid.uuid4()}.bin"
+    minio_client.put_object(bucket_name, name, io.BytesIO(data), length=len(data))
+    return name
+
+
+def test_get_and_range_read_through_pooled_client():
+    store = ObjectStore(make_minio_client(pool_size=2, timeout=5, retries=1), bucket_name)
+    name = put(b"0123456789")
+
+    assert store.get(name) == b"0123456789"
+    assert store.get_range(name, offset=2, length=3) == b"234"
+    assert b"".join(store.stream(name, chunk_size=4)) == b"0123456789"
+
+
+def test_disk_cache_serves_recent_objects_and_evicts_old(tmp_path):
+    store = ObjectStore(make_minio_client(pool_size=2, timeout=5, retries=1), bucket_name,
+                        cache_dir=str(tmp_path), cache_max_bytes=15)
+    first, second = put(b"a" * 10), put(b"b" * 10)
+
+    assert store.get(first) == b"a" * 10
+    minio_client.remove_object(bucket_name, first)
+    assert store.get(first) == b"a" * 10
+    assert (store.hits, store.misses) == (1, 1)
+
+    store.get(second)
+    assert [p.name for p in tmp_path.iterdir()] == [second]
@@ -0,0 +1,52 @@
+import time
+from datetime import date
+
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.schema import CreateTable
+from sqlmodel import Session
+
+from database.partitioning import (default_partition_ddl, month_partitions, partition_ddl,
+                                   start_partition_maintenance)
+from models.transaction import Transactions
+from models.prediction import Predictions
+from models.ml_task import MLTasks
+
+
+def test_partitioned_tables_include_timestamp_in_primary_key():
+    for model, pk in ((Predictions, "prediction_id"), (MLTasks, "task_id")):
+        ddl = str(CreateTable(model.__table__).compile(dialect=postgresql.dialect()))
+
+        assert f"PRIMARY KEY ({pk}, timestamp)" in ddl
+        assert 'PARTITION BY RANGE ("timestamp")' in ddl
+        assert "REFERENCES predictions" not in ddl
+
+
+def test_month_partitions_cross_year_boundary():
+    partitions = month_partitions("predictions", date(2025, 12, 15), behind=1, ahead=1)
+
+    assert [name for name, _, _ in partitions] == [
+        "predictions_y2025m11", "predictions_y2025m12", "predictions_y2026m01"]
+    assert partitions[-1][1:] == (date(2026, 1, 1), date(2026, 2, 1))
+    assert partition_ddl("predictions", *partitions[0]) == (
+        'CREATE TABLE IF NOT EXISTS "predictions_y2025m11" PARTITION OF "predictions" '
+        "FOR VALUES FROM ('2025-11-01') TO ('2025-12-01')")
+
+
+def test_rows_get_their_own_timestamps(session: Session, test_user):
+    first = Transactions(user_id=test_user["user"].user_id, transaction_type="deposit", amount=1)
+    time.sleep(0.01)
+    second = Transactions(user_id=test_user["user"].user_id, transaction_type="deposit", amount=2)
+    session.add_all([first, second])
+    session.commit()
+
+    assert first.timestamp < second.timestamp
+
+
+def test_default_partition_and_maintenance_thread(session: Session):
+    assert default_partition_ddl("mltasks") == (
+        'CREATE TABLE IF NOT EXISTS "mltasks_default" PARTITION OF "mltasks" DEFAULT')
+
+    # Вне Postgres поток работает вхолостую и останавливается по событию
+    stop = start_partition_maintenance(session.get_bind(), interval_seconds=0.01)
+    time.sleep(0.05)
+    stop.set()
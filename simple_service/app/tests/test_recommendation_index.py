@@ -0,0 +1,64 @@
+from sqlmodel import Session
+
+from models.recommendation import Recommendation
+from services.crud.service import RECOMMENDATION_NOT_FOUND
+from workers.recommendations import RecommendationIndex
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_lookup_is_served_from_memory_until_refresh(session: Session):
+    session.add(Recommendation(damage_type="DR", growth_stage="V", severity="low",
+                               recommendation="water", source="src"))
+    session.commit()
+    clock = FakeClock()
+    index = RecommendationIndex(refresh_seconds=60, clock=clock)
+
+    assert index.lookup("DR", "V", "low", session) == ("water", "src")
+    assert len(index) == 1
+
+    rec = session.query(Recommendation).one()
+    rec.recommendation = "irrigate"
+    session.add(rec)
+    session.commit()
+    assert index.lookup("DR", "V", "low", session) == ("water", "src")
+
+    clock.now = 61
+    assert index.lookup("DR", "V", "low", session) == ("irrigate", "src")
+
+
+def test_unknown_combinations_are_reported_as_not_found(session: Session):
+    index = RecommendationIndex(refresh_seconds=60)
+
+    assert index.lookup("DR", "F", "high", session) == (RECOMMENDATION_NOT_FOUND, None)
+    assert index.lookup("unknown", "F", "high", session) == (RECOMMENDATION_NOT_FOUND, None)
+
+
+def test_refresh_reloads_only_when_table_changes(session: Session):
+    session.add(Recommendation(damage_type="DR", growth_stage="V", severity="low",
+                               recommendation="water", source="src"))
+    session.commit()
+    clock = FakeClock()
+    index = RecommendationIndex(refresh_seconds=60, clock=clock)
+    index.lookup("DR", "V", "low", session)
+
+    loads = []
+    original_load = index.load
+    index.load = lambda s: (loads.append(1), original_load(s))
+
+    clock.now = 61
+    assert index.lookup("DR", "V", "low", session) == ("water", "src")
+    assert loads == []
+
+    session.add(Recommendation(damage_type="DR", growth_stage="F", severity="low",
+                               recommendation="mulch"))
+    session.commit()
+    clock.now = 122
+    assert index.lookup("DR", "F", "low", session) == ("mulch", None)
+    assert loads == [1]
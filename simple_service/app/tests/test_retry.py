@@ -0,0 +1,121 @@
+import json
+
+import pika
+from sqlmodel import Session
+
+from models.credit_hold import CreditHolds
+from models.ml_task import MLTasks
+from models.model import Models
+from models.user import Users
+from services.crud import credit_hold as CreditService
+from workers.retry import (ATTEMPTS_HEADER, LAST_ERROR_HEADER, PermanentError,
+                           RetryPolicy, replay)
+
+
+class Method:
+    def __init__(self, delivery_tag):
+        self.delivery_tag = delivery_tag
+
+
+class FakeChannel:
+    """Канал, который записывает объявления, публикации и подтверждения"""
+
+    def __init__(self, queued=()):
+        self.declared = {}
+        self.published = []
+        self.acked = []
+        self.nacked = []
+        self.queued = list(queued)
+
+    def queue_declare(self, queue, durable=False, arguments=None):
+        self.declared[queue] = arguments
+
+    def basic_publish(self, exchange, routing_key, body, properties):
+        self.published.append((routing_key, body, properties.headers))
+
+    def basic_ack(self, delivery_tag):
+        self.acked.append(delivery_tag)
+
+    def basic_nack(self, delivery_tag, requeue=True):
+        self.nacked.append(delivery_tag)
+
+    def basic_get(self, queue, auto_ack=False):
+        if not self.queued:
+            return None, None, None
+        tag, headers, body = self.queued.pop(0)
+        return Method(tag), pika.BasicProperties(headers=headers), body
+
+
+def test_declares_delay_queues_that_return_to_source():
+    channel = FakeChannel()
+    RetryPolicy("tasks", max_attempts=3, base_delay_ms=100).declare(channel)
+
+    assert channel.declared["tasks.retry.1"]["x-message-ttl"] == 100
+    assert channel.declared["tasks.retry.2"]["x-message-ttl"] == 200
+    assert channel.declared["tasks.retry.2"]["x-dead-letter-routing-key"] == "tasks"
+    assert "tasks.dlq" in channel.declared and "tasks.retry.3" not in channel.declared
+
+
+def test_failures_back_off_then_dead_letter():
+    policy = RetryPolicy("tasks", max_attempts=3, base_delay_ms=100)
+    channel = FakeChannel()
+    properties = pika.BasicProperties()
+
+    for tag in (1, 2, 3):
+        dead = policy.fail(channel, Method(tag), properties, b"{}", RuntimeError("boom"))
+        properties = pika.BasicProperties(headers=channel.published[-1][2])
+
+    assert dead
+    assert [target for target, _, _ in channel.published] == ["tasks.retry.1", "tasks.retry.2", "tasks.dlq"]
+    assert channel.published[-1][2][ATTEMPTS_HEADER] == 3
+    assert channel.published[-1][2][LAST_ERROR_HEADER] == "RuntimeError: boom"
+    assert channel.acked == [1, 2, 3]
+
+
+def test_permanent_errors_skip_retries():
+    channel = FakeChannel()
+    policy = RetryPolicy("tasks", max_attempts=5, base_delay_ms=100)
+
+    assert policy.fail(channel, Method(1), pika.BasicProperties(), b"{}", PermanentError("no image"))
+    assert channel.published[0][0] == "tasks.dlq"
+
+
+def test_unpublishable_retry_is_nacked():
+    class ClosedChannel(FakeChannel):
+        def basic_publish(self, exchange, routing_key, body, properties):
+            raise pika.exceptions.ChannelClosed(406, "closed")
+
+    channel = ClosedChannel()
+    policy = RetryPolicy("enrichment", max_attempts=3, base_delay_ms=100)
+
+    assert not policy.fail_or_nack(channel, Method(7), pika.BasicProperties(), b"{}", RuntimeError("boom"))
+    assert (channel.acked, channel.nacked) == ([], [7])
+
+
+def test_replay_resets_attempts_and_keeps_rejected_in_dlq():
+    policy = RetryPolicy("tasks", max_attempts=3, base_delay_ms=100)
+    channel = FakeChannel(queued=[(1, {ATTEMPTS_HEADER: 3}, b'{"task_id": 1}'),
+                                  (2, {ATTEMPTS_HEADER: 3}, b'{"task_id": 2}')])
+
+    replayed = replay(channel, policy, accept=lambda body: json.loads(body)["task_id"] == 1)
+
+    assert replayed == 1
+    assert channel.published == [("tasks", b'{"task_id": 1}', {"x-replayed": 1})]
+    assert (channel.acked, channel.nacked) == ([1], [2])
+
+
+def test_reopen_task_reinstates_released_hold(session: Session):
+    from services.crud.service import reopen_task
+
+    session.add(Users(email="farmer@example.com", username="farmer", password="x", balance=10))
+    session.add(Models(name="m", description="d", artifact_path="a/b/c:v1", cost=10))
+    session.add(MLTasks(user_id=1, model_id=1, input_data="img", task_status="failed",
+                        failure_reason="boom"))
+    session.add(CreditHolds(user_id=1, task_id=1, amount=10, status=CreditService.RELEASED))
+    session.commit()
+
+    assert reopen_task(1, session)
+    task = session.get(MLTasks, 1)
+    assert (task.task_status, task.failure_reason) == ("created", None)
+    assert CreditService.get_hold(1, session).status == CreditService.HELD
+    assert CreditService.available_balance(1, session) == 0
@@ -0,0 +1,70 @@
+from datetime import date, timedelta
+
+from fastapi.testclient import TestClient
+from sqlmodel import Session
+
+from models.ml_task import MLTasks
+from models.model import Models
+from models.prediction import Predictions
+from models.usage_rollup import DailyUsage
+from models.user import Users
+from services.crud.rollup import rebuild_usage
+from services.crud.service import finalize_task
+
+
+def finalize(session: Session, task_id: int, damage: str, cost: float) -> None:
+    session.add(MLTasks(user_id=2, model_id=1, input_data="img", task_status="created"))
+    session.commit()
+    pred = Predictions(user_id=2, model_id=1, input_photo_url="u", input_data="img",
+                       prediction_result={"damage": damage}, cost=cost, severity="low",
+                       recommendation="r")
+    finalize_task(task_id, pred, session)
+
+
+def seed(session: Session) -> None:
+    session.add(Users(email="admin@example.com", username="admin", password="x", is_admin=True))
+    session.add(Users(email="farmer@example.com", username="farmer", password="x", balance=100))
+    session.add(Models(name="m", description="d", artifact_path="a/b/c:v1", cost=10))
+    session.commit()
+    finalize(session, 1, "DR", 10)
+    finalize(session, 2, "DR", 10)
+    finalize(session, 3, "WD", 5)
+
+
+def rollup_rows(session: Session):
+    return sorted((r.damage_type, r.predictions, r.credits)
+                  for r in session.query(DailyUsage).all())
+
+
+def test_finalization_updates_rollups_incrementally(client: TestClient, session: Session):
+    seed(session)
+
+    assert rollup_rows(session) == [("DR", 2, 20.0), ("WD", 1, 5.0)]
+
+    by_damage = client.get("/admins/stats/damage_type?email=admin@example.com").json()
+    by_user = client.get("/admins/stats/user?email=admin@example.com").json()
+    assert by_damage == [{"key": "DR", "predictions": 2, "credits": 20.0},
+                         {"key": "WD", "predictions": 1, "credits": 5.0}]
+    assert by_user == [{"key": 2, "predictions": 3, "credits": 25.0}]
+    assert client.get("/admins/stats/user?email=farmer@example.com").status_code == 403
+
+
+def test_rebuild_matches_incremental_rollups(session: Session):
+    seed(session)
+    incremental = rollup_rows(session)
+
+    rebuild_usage(session)
+
+    assert rollup_rows(session) == incremental
+
+
+def test_day_stats_with_limit_return_most_recent_days(client: TestClient, session: Session):
+    session.add(Users(email="admin@example.com", username="admin", password="x", is_admin=True))
+    session.add_all([DailyUsage(day=date(2025, 1, 1) + timedelta(days=i), user_id=2, model_id=1,
+                                damage_type="DR", predictions=1, credits=10)
+                     for i in range(5)])
+    session.commit()
+
+    stats = client.get("/admins/stats/day?email=admin@example.com&limit=3").json()
+
+    assert [row["key"] for row in stats] == ["2025-01-03", "2025-01-04", "2025-01-05"]
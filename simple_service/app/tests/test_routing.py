@@ -0,0 +1,96 @@
+from workers.routing import (consume_many, declare_model_queue, model_queue, model_slug,
+                             routing_key, selected_models, settings)
+
+
+PATHS = ["a-gapeeva/eotg-multilabel/resnet18_bsl_cpu:latest",
+         "a-gapeeva/eotg-multilabel/effb0_bsl_cpu:v3"]
+
+
+class FakeChannel:
+    def __init__(self):
+        self.calls = []
+        self.callbacks = {}
+
+    def exchange_declare(self, exchange, exchange_type, durable):
+        self.calls.append(("exchange", exchange, exchange_type))
+
+    def queue_declare(self, queue, durable, arguments=None):
+        self.calls.append(("queue", queue, arguments))
+
+    def queue_bind(self, queue, exchange, routing_key):
+        self.calls.append(("bind", queue, routing_key))
+
+    def basic_consume(self, queue, on_message_callback, auto_ack):
+        self.callbacks[queue] = on_message_callback
+        return f"ctag-{queue}"
+
+    def basic_publish(self, exchange, routing_key, body, properties, mandatory):
+        self.calls.append(("publish", exchange, routing_key))
+
+
+def test_routing_key_follows_model_name():
+    assert model_slug(PATHS[0]) == "resnet18_bsl_cpu"
+    assert routing_key(PATHS[1]) == "task.effb0_bsl_cpu"
+
+
+def test_worker_models_selection():
+    assert selected_models(PATHS, None) == ["effb0_bsl_cpu", "resnet18_bsl_cpu"]
+    assert selected_models(PATHS, "*") == ["effb0_bsl_cpu", "resnet18_bsl_cpu"]
+    assert selected_models(PATHS, " resnet18_bsl_cpu ") == ["resnet18_bsl_cpu"]
+
+
+def test_model_queue_is_bound_with_priorities():
+    channel = FakeChannel()
+
+    queue = declare_model_queue(channel, "resnet18_bsl_cpu")
+
+    assert queue == model_queue("resnet18_bsl_cpu")
+    assert channel.calls == [
+        ("exchange", settings.RMQ_TASK_EXCHANGE, "topic"),
+        ("queue", queue, {"x-max-priority": settings.RMQ_MAX_PRIORITY}),
+        ("bind", queue, "task.resnet18_bsl_cpu"),
+    ]
+
+
+def test_consume_many_interleaves_queues_and_reports_idle():
+    channel = FakeChannel()
+    pending = [("q1", b"1"), ("q2", b"2")]
+
+    class Connection:
+        def process_data_events(self, time_limit):
+            if pending:
+                queue, body = pending.pop(0)
+                channel.callbacks[queue](channel, queue, None, body)
+
+    tags, events = consume_many(Connection(), channel, ["q1", "q2"], inactivity_timeout=0.01)
+
+    assert tags == {"ctag-q1": "q1", "ctag-q2": "q2"}
+    assert [next(events)[2] for _ in range(3)] == [b"1", b"2", None]
+
+
+def test_publisher_declares_at_start_and_publishes_on_one_checkout():
+    from workers.publisher import RabbitPublisher
+
+    class Pooled:
+        def __init__(self):
+            self.channel = FakeChannel()
+            self.checkouts = 0
+
+        def probe(self):
+            self.checkouts += 1
+            return True
+
+    pooled = Pooled()
+    publisher = RabbitPublisher(size=0)
+    publisher._pool.put(pooled)
+
+    publisher.start(model_slugs=["resnet18_bsl_cpu"])
+    assert ("bind", model_queue("resnet18_bsl_cpu"), "task.resnet18_bsl_cpu") in pooled.channel.calls
+    assert not any(call[:2] == ("queue", settings.RMQ_QUEUE) for call in pooled.channel.calls)
+
+    pooled.channel.calls.clear()
+    publisher.publish_task(PATHS[1], {"task_id": 1})
+
+    assert pooled.checkouts == 2
+    assert [call[0] for call in pooled.channel.calls] == ["exchange", "queue", "bind", "publish"]
+    assert pooled.channel.calls[-1] == ("publish", settings.RMQ_TASK_EXCHANGE, "task.effb0_bsl_cpu")
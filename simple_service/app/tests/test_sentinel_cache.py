@@ -0,0 +1,106 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlmodel import Session
+
+pytest.importorskip("ee")
+
+from workers.sentinel import GrowthStageLookup, quantize_cell  # noqa: E402
+
+
+class StubBackend:
+    def __init__(self, vh):
+        self.vh = vh
+        self.calls = []
+
+    def fetch_vh(self, latitude, longitude, start_date, end_date):
+        self.calls.append((latitude, longitude, start_date, end_date))
+        return self.vh
+
+
+class StubKMeans:
+    def predict(self, features):
+        return [1 if features[0][0] > -20 else 0]
+
+
+def make_lookup(session, backend, ttl_hours=24):
+    return GrowthStageLookup(
+        backend=backend,
+        classifier_loader=StubKMeans,
+        session_factory=lambda: Session(session.bind),
+        ttl=timedelta(hours=ttl_hours),
+    )
+
+
+def test_quantize_cell_groups_nearby_points():
+    assert quantize_cell(55.751231, 37.617812, 4) == quantize_cell(55.751249, 37.617789, 4)
+    assert quantize_cell(55.7512, 37.6178, 4) != quantize_cell(55.7522, 37.6178, 4)
+
+
+def test_repeat_lookup_skips_backend(session: Session):
+    backend = StubBackend(vh=-15.0)
+    lookup = make_lookup(session, backend)
+    now = datetime(2025, 7, 1, 9, tzinfo=timezone.utc)
+
+    assert lookup.lookup(55.751231, 37.617812, now=now) == (-15.0, "V")
+    # Тот же участок в тот же день — из кэша, даже другим экземпляром воркера
+    other_worker = make_lookup(session, backend)
+    assert other_worker.lookup(55.751249, 37.617789, now=now + timedelta(hours=3)) == (-15.0, "V")
+
+    assert len(backend.calls) == 1
+    assert backend.calls[0][2:] == ("2025-06-21", "2025-07-01")
+    assert other_worker.hits == 1
+
+
+def test_expired_and_new_window_refetch(session: Session):
+    backend = StubBackend(vh=None)
+    lookup = make_lookup(session, backend, ttl_hours=1)
+    now = datetime(2025, 7, 1, 9, tzinfo=timezone.utc)
+
+    assert lookup.lookup(55.75, 37.61, now=now) == (None, "unknown")
+    backend.vh = -25.0
+    assert lookup.lookup(55.75, 37.61, now=now + timedelta(hours=2)) == (-25.0, "S")
+    assert lookup.lookup(55.75, 37.61, now=now + timedelta(days=1)) == (-25.0, "S")
+
+    assert len(backend.calls) == 3
+
+
+def test_miss_is_retried_after_short_ttl(session: Session):
+    backend = StubBackend(vh=None)
+    lookup = make_lookup(session, backend)
+    now = datetime(2025, 7, 1, 9, tzinfo=timezone.utc)
+
+    assert lookup.lookup(55.75, 37.61, now=now) == (None, "unknown")
+    assert lookup.lookup(55.75, 37.61, now=now + timedelta(minutes=10)) == (None, "unknown")
+    backend.vh = -25.0
+    assert lookup.lookup(55.75, 37.61, now=now + timedelta(minutes=40)) == (-25.0, "S")
+
+    assert len(backend.calls) == 2
+
+
+def test_backend_is_called_without_open_session(session: Session):
+    opened = []
+
+    class TrackedSession(Session):
+        def __enter__(self):
+            opened.append(self)
+            return super().__enter__()
+
+        def __exit__(self, *exc):
+            opened.remove(self)
+            return super().__exit__(*exc)
+
+    class CheckingBackend(StubBackend):
+        def fetch_vh(self, *args):
+            assert not opened, "Earth Engine is called inside a DB session"
+            return super().fetch_vh(*args)
+
+    backend = CheckingBackend(vh=-15.0)
+    lookup = GrowthStageLookup(
+        backend=backend,
+        classifier_loader=StubKMeans,
+        session_factory=lambda: TrackedSession(session.bind),
+    )
+
+    assert lookup.lookup(55.75, 37.61) == (-15.0, "V")
+    assert len(backend.calls) == 1
@@ -1,6 +1,9 @@
 import io
+import hashlib
+import os
 from fastapi.testclient import TestClient
 from PIL import Image
+from routes.service import settings, minio_client, bucket_name
 from models.user_images import UserImages
 from services.crud.service import create_model, get_model_by_id
 from models.model import Models
@@ -42,6 +45,58 @@ def test_upload_image(client: TestClient, session, test_user):
     assert img_record.input_data.endswith(".jpg")
 
 
+def test_upload_large_file_in_parts(client: TestClient, session, test_user):
+    data = os.urandom(6 * 1024 * 1024)  # больше одной части multipart
+
+    response = client.post(
+        "/service/upload",
+        files={"file": ("big.jpg", io.BytesIO(data), "image/jpeg")},
+        headers={"Authorization": f"Bearer {test_user['token']}"}
+    )
+
+    assert response.status_code == 201
+    img_record = session.get(UserImages, response.json()[0]["image_id"])
+    stored = minio_client.get_object(bucket_name, img_record.input_data).read()
+    assert hashlib.sha256(stored).digest() == hashlib.sha256(data).digest()
+
+
+def test_upload_deduplicates_identical_content(client: TestClient, session, test_user, monkeypatch):
+    import routes.service as service_routes
+
+    headers = {"Authorization": f"Bearer {test_user['token']}"}
+    data = create_test_image_bytes().getvalue()
+    uploads = []
+    put_stream = service_routes.put_stream
+    monkeypatch.setattr(service_routes, "put_stream",
+                        lambda *args: uploads.append(args[2]) or put_stream(*args))
+
+    first = client.post("/service/upload", headers=headers,
+                        files={"file": ("a.jpg", io.BytesIO(data), "image/jpeg")})
+    second = client.post("/service/upload", headers=headers,
+                         files={"file": ("b.jpg", io.BytesIO(data), "image/jpeg")})
+
+    assert first.status_code == second.status_code == 201
+    first_img = session.get(UserImages, first.json()[0]["image_id"])
+    second_img = session.get(UserImages, second.json()[0]["image_id"])
+    assert first_img.image_id != second_img.image_id
+    assert first_img.input_data == second_img.input_data
+    assert first_img.content_digest == hashlib.sha256(data).hexdigest()
+    # Дубликат распознан до загрузки: в MinIO отправлен только первый файл
+    assert uploads == [first_img.input_data]
+
+
+def test_upload_rejects_too_large_file(client: TestClient, test_user, monkeypatch):
+    monkeypatch.setattr(settings, "UPLOAD_MAX_BYTES", 1024)
+
+    response = client.post(
+        "/service/upload",
+        files={"file": ("big.jpg", io.BytesIO(b"x" * 2048), "image/jpeg")},
+        headers={"Authorization": f"Bearer {test_user['token']}"}
+    )
+
+    assert response.status_code == 413
+
+
 def test_get_predictions(client: TestClient, test_user):
     token = test_user["token"]
 
@@ -52,3 +107,75 @@ def test_get_predictions(client: TestClient, test_user):
 
     assert response.status_code == 200
     assert response.json() == []
+
+
+def test_get_prediction_by_id(client: TestClient, session, test_user):
+    from models.prediction import Predictions
+
+    headers = {"Authorization": f"Bearer {test_user['token']}"}
+    user_id = test_user["user"].user_id
+    own = Predictions(user_id=user_id, model_id=1, input_photo_url="u1", input_data="img",
+                      prediction_result={}, cost=10, severity="low", recommendation="r1")
+    other = Predictions(user_id=user_id + 1, model_id=1, input_photo_url="u2", input_data="img",
+                        prediction_result={}, cost=10, severity="low", recommendation="r2")
+    session.add_all([own, other])
+    session.commit()
+
+    response = client.get(f"/user/predictions/{own.prediction_id}", headers=headers)
+    assert response.status_code == 200
+    assert response.json()["input_photo_url"] == "u1"
+    assert response.json()["prediction_result"] == "r1"
+    # Чужое предсказание не отдаётся
+    assert client.get(f"/user/predictions/{other.prediction_id}", headers=headers).status_code == 404
+
+
+class FakePublisher:
+    def __init__(self):
+        self.sent = []
+
+    def publish_task(self, artifact_path, payload, priority=None):
+        self.sent.append((artifact_path, payload))
+
+
+def test_prediction_reserves_model_cost(client: TestClient, session, test_user):
+    from api import app
+    from workers.publisher import get_publisher
+    from models.credit_hold import CreditHolds
+
+    fake = FakePublisher()
+    app.dependency_overrides[get_publisher] = lambda: fake
+    create_model(Models(name="m", description="d", artifact_path="a/b/c:v1", cost=30), session)
+    headers = {"Authorization": f"Bearer {test_user['token']}"}
+    image_id = client.post("/service/upload", headers=headers,
+                           files={"file": ("a.jpg", create_test_image_bytes(), "image/jpeg")}
+                           ).json()[0]["image_id"]
+
+    first = client.post("/service/prediction", headers=headers,
+                        json={"model_id": 1, "image_id": image_id})
+    second = client.post("/service/prediction", headers=headers,
+                         json={"model_id": 1, "image_id": image_id})
+
+    assert first.status_code == 202
+    assert second.status_code == 403
+    assert len(fake.sent) == 1
+    _, payload = fake.sent[0]
+    assert payload["version"] == 2
+    assert (payload["cost"], payload["object_key"]) == (30, session.get(UserImages, image_id).input_data)
+    hold = session.query(CreditHolds).one()
+    assert (hold.task_id, hold.amount, hold.status) == (first.json()["task_id"], 30, "held")
+    balance = client.get("/user/balance", headers=headers).json()
+    assert (float(balance["balance"]), float(balance["available"])) == (50, 20)
+
+
+def test_inference_cache_is_keyed_by_artifact_version(session):
+    from services.crud.service import get_cached_inference, save_inference_result
+
+    result = {"damage": "DR"}
+    save_inference_result("img", "digest-v1", "torchscript", result, session)
+    save_inference_result("img", None, "torchscript", result, session)
+
+    assert get_cached_inference("img", "digest-v1", "torchscript", session) == result
+    # Алиас переведён на новую версию или другой бэкенд — старый результат не годится
+    assert get_cached_inference("img", "digest-v2", "torchscript", session) is None
+    assert get_cached_inference("img", "digest-v1", "int8", session) is None
+    assert get_cached_inference("img", None, "torchscript", session) is None
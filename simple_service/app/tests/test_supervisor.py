@@ -0,0 +1,58 @@
+import os
+import time
+
+import pytest
+
+torch = pytest.importorskip("torch")
+
+from workers.supervisor import (Supervisor, available_cores, cgroup_cpu_limit,  # noqa: E402
+                                model_budget, split_cores)
+
+
+def test_split_cores_into_contiguous_sets():
+    assert split_cores([0, 1, 2, 3, 4, 5, 6, 7], 4) == [[0, 1], [2, 3], [4, 5], [6, 7]]
+    assert split_cores([0, 1, 2, 3, 4], 2) == [[0, 1, 2], [3, 4]]
+    assert split_cores([2, 3], 3) == [[2], [3], [2]]
+
+
+def test_model_budget_is_split_between_processes():
+    mb = 2**20
+    assert model_budget(512 * mb, 112 * mb, 4) == 100 * mb
+    assert model_budget(512 * mb, 600 * mb, 4) == 0
+
+
+def test_cgroup_cpu_limit(tmp_path):
+    cpu_max = tmp_path / "cpu.max"
+    cpu_max.write_text("250000 100000\n")
+    assert cgroup_cpu_limit(str(cpu_max)) == 2.5
+    cpu_max.write_text("max 100000\n")
+    assert cgroup_cpu_limit(str(cpu_max)) is None
+    assert cgroup_cpu_limit(str(tmp_path / "missing")) is None
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="fork is not available")
+def test_crashed_children_are_restarted_pinned(tmp_path):
+    log = tmp_path / "children.log"
+    cores = available_cores()[:1]
+
+    def target(index, child_cores):
+        affinity = sorted(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else child_cores
+        with open(log, "a") as f:
+            f.write(f"{index} {affinity} {torch.get_num_threads()}\n")
+        raise RuntimeError("boom")
+
+    supervisor = Supervisor(target, [cores, cores], restart_delay=0.01, max_restart_delay=0.05)
+    supervisor.start()
+    try:
+        deadline = time.monotonic() + 20
+        while supervisor.restarts < 4 and time.monotonic() < deadline:
+            supervisor.poll()
+            time.sleep(0.02)
+    finally:
+        supervisor.shutdown(timeout=5)
+
+    lines = log.read_text().splitlines()
+    assert supervisor.restarts >= 4
+    assert {line.split()[0] for line in lines} == {"0", "1"}
+    assert all(line.endswith(f"{cores} 1") for line in lines)
+    assert all(child.pid is None and child.failures >= 1 for child in supervisor.children)
@@ -0,0 +1,97 @@
+import io
+import json
+
+import numpy as np
+import pytest
+
+pytest.importorskip("torch")
+
+from models.task_message import TaskMessage, parse_task_message  # noqa: E402
+from workers import worker  # noqa: E402
+
+
+class Method:
+    delivery_tag = 7
+
+
+class FakeObjectStore:
+    def __init__(self, objects):
+        self.objects = objects
+
+    def get(self, object_name):
+        return self.objects[object_name]
+
+
+def message(**overrides):
+    fields = dict(task_id=1, user_id=2, model_id=3, cost=8.0, artifact_path="a/b/c:v1",
+                  image_id=4, object_key="img.jpg", derivative_key="img_256.npy",
+                  image_url="http://localhost:9000/images/img.jpg", latitude=55.7)
+    fields.update(overrides)
+    return TaskMessage(**fields)
+
+
+def test_parse_accepts_v1_and_v2_messages():
+    v1 = {"task_id": 1, "user_id": 2, "model_id": 3, "artifact_path": "a/b/c:v1", "image_id": 4}
+
+    assert parse_task_message(v1) is v1
+    assert parse_task_message(message().model_dump()) == message()
+
+
+def test_v2_message_is_prepared_without_database(monkeypatch):
+    def no_db(*args, **kwargs):
+        raise AssertionError("database must not be used before finalization")
+
+    buffer = io.BytesIO()
+    np.save(buffer, np.zeros((256, 256, 3), dtype=np.uint8))
+    monkeypatch.setattr(worker, "Session", no_db)
+    monkeypatch.setattr(worker, "object_store", FakeObjectStore({"img_256.npy": buffer.getvalue()}))
+
+    prepared = worker.prepare_task(Method(), json.dumps(message().model_dump()).encode())
+
+    assert (prepared.task_id, prepared.cost, prepared.latitude) == (1, 8.0, 55.7)
+    assert prepared.tensor.shape == (3, 256, 256)
+
+
+def test_cached_result_skips_download(monkeypatch):
+    monkeypatch.setattr(worker, "object_store", FakeObjectStore({}))
+    body = json.dumps(message(cached_result={"damage": "DR"}).model_dump()).encode()
+
+    prepared = worker.prepare_task(Method(), body)
+
+    assert prepared.cached_result == {"damage": "DR"}
+    assert prepared.tensor is None
+
+
+def test_missing_image_is_dead_lettered_and_task_failed(monkeypatch):
+    from tests.test_retry import FakeChannel
+
+    def missing_image(method, body):
+        raise worker.PermanentError("Image with id=4 not found in UserImages")
+
+    rejected = []
+    monkeypatch.setattr(worker, "prepare_task", missing_image)
+    monkeypatch.setattr(worker, "reject_task", lambda task_id, reason: rejected.append((task_id, reason)))
+    channel = FakeChannel()
+
+    worker.process_batch(channel, [(Method(), None, json.dumps({"task_id": 1}).encode())])
+
+    assert channel.published[0][0] == worker.retry_policy.dead_letter_queue
+    assert channel.acked == [7]
+    assert rejected == [(1, "PermanentError: Image with id=4 not found in UserImages")]
+
+
+def test_failure_is_retried_through_the_consumed_queue(monkeypatch):
+    from tests.test_retry import FakeChannel
+    from workers.retry import RetryPolicy
+
+    class ModelMethod(Method):
+        consumer_tag = "ctag-1"
+
+    monkeypatch.setitem(worker.consumer_queues, "ctag-1", "tasks.resnet18")
+    monkeypatch.setitem(worker.retry_policies, "tasks.resnet18",
+                        RetryPolicy("tasks.resnet18", max_attempts=3, base_delay_ms=100))
+    channel = FakeChannel()
+
+    worker.fail_delivery(channel, (ModelMethod(), None, b'{"task_id": 1}'), RuntimeError("boom"))
+
+    assert channel.published[0][0] == "tasks.resnet18.retry.1"
@@ -1,5 +1,11 @@
 from fastapi.testclient import TestClient
-from services.crud.transaction import create_transaction
+from services.crud.transaction import create_transaction, get_transactions_by_user
+from services.crud.service import finalize_task
+from services.crud.user import charge_balance
+from models.ml_task import MLTasks
+from models.model import Models
+from models.prediction import Predictions
+from models.user import Users
 from sqlmodel import Session
 
 
@@ -50,3 +56,150 @@ def test_get_transactions(client: TestClient, test_user, session: Session):
     first_transaction = transactions[0]
     assert first_transaction["type"] == "deposit"
     assert first_transaction["amount"] == 10
+
+
+def test_charge_balance_is_conditional(session: Session):
+    session.add(Users(email="farmer@example.com", username="farmer", password="x", balance=15))
+    session.commit()
+
+    assert charge_balance(1, 10, session) == 5
+    assert charge_balance(1, 10, session) is None
+    session.commit()
+
+    assert session.get(Users, 1).balance == 5
+    assert [t.transaction_type for t in get_transactions_by_user(1, session)] == ["deduct"]
+
+
+def test_finalize_task_commits_prediction_task_and_charge_together(session: Session):
+    session.add(Users(email="farmer@example.com", username="farmer", password="x", balance=15))
+    session.add(Models(name="m", description="d", artifact_path="a/b/c:v1", cost=10))
+    session.add(MLTasks(user_id=1, model_id=1, input_data="img", task_status="pending"))
+    session.commit()
+
+    readable = {"damage": "DR", "growth_stage": "V", "extent": "20"}
+    pred = Predictions(user_id=1, model_id=1, input_photo_url="u", input_data="img",
+                       prediction_result=readable, cost=10, severity="low",
+                       recommendation="r")
+    prediction_id, charged = finalize_task(1, pred, session)
+
+    assert charged
+    task = session.get(MLTasks, 1)
+    assert (task.task_status, task.prediction_id) == ("complete", prediction_id)
+    assert session.get(Users, 1).balance == 5
+    assert len(get_transactions_by_user(1, session)) == 1
+
+
+def test_finalize_task_twice_charges_once(session: Session):
+    session.add(Users(email="farmer@example.com", username="farmer", password="x", balance=100))
+    session.add(Models(name="m", description="d", artifact_path="a/b/c:v1", cost=10))
+    session.add(MLTasks(user_id=1, model_id=1, input_data="img", task_status="pending"))
+    session.commit()
+
+    def prediction():
+        return Predictions(user_id=1, model_id=1, input_photo_url="u", input_data="img",
+                           prediction_result={"damage": "DR"}, cost=10, severity="low",
+                           recommendation="r")
+
+    first_id, charged = finalize_task(1, prediction(), session)
+    # Повторная доставка после commit
+    second_id, charged_again = finalize_task(1, prediction(), session)
+
+    assert charged and charged_again is None
+    assert second_id == first_id
+    assert len(session.query(Predictions).all()) == 1
+    assert session.get(Users, 1).balance == 90
+    assert len(get_transactions_by_user(1, session)) == 1
+
+
+def test_finalize_task_does_not_charge_released_hold(session: Session):
+    from services.crud.credit_hold import place_hold, release_hold
+
+    session.add(Users(email="farmer@example.com", username="farmer", password="x", balance=15))
+    session.add(Models(name="m", description="d", artifact_path="a/b/c:v1", cost=10))
+    session.add(MLTasks(user_id=1, model_id=1, input_data="img", task_status="created"))
+    session.commit()
+    assert place_hold(1, 1, 10, session)
+    release_hold(1, session)
+    session.commit()
+
+    pred = Predictions(user_id=1, model_id=1, input_photo_url="u", input_data="img",
+                       prediction_result={"damage": "DR"}, cost=10, severity="low",
+                       recommendation="r")
+    _, charged = finalize_task(1, pred, session)
+
+    assert not charged
+    assert session.get(Users, 1).balance == 15
+
+
+def test_finalize_task_captures_hold_and_release_frees_it(session: Session):
+    from services.crud.credit_hold import available_balance, get_hold, place_hold, release_hold
+
+    session.add(Users(email="farmer@example.com", username="farmer", password="x", balance=15))
+    session.add(Models(name="m", description="d", artifact_path="a/b/c:v1", cost=10))
+    session.add_all([MLTasks(user_id=1, model_id=1, input_data="img", task_status="created")
+                     for _ in range(2)])
+    session.commit()
+
+    assert place_hold(1, 1, 10, session)
+    assert not place_hold(1, 2, 10, session)
+    session.commit()
+    assert available_balance(1, session) == 5
+
+    pred = Predictions(user_id=1, model_id=1, input_photo_url="u", input_data="img",
+                       prediction_result={"damage": "DR"}, cost=10, severity="low",
+                       recommendation="r")
+    finalize_task(1, pred, session)
+    assert get_hold(1, session).status == "captured"
+    assert available_balance(1, session) == 5
+
+    assert place_hold(1, 2, 5, session)
+    release_hold(2, session)
+    session.commit()
+    assert get_hold(2, session).status == "released"
+    assert available_balance(1, session) == 5
+
+
+def test_transactions_are_paginated_by_cursor(client: TestClient, test_user, session: Session):
+    user_id = test_user["user"].user_id
+    for amount in range(1, 6):
+        create_transaction(session, user_id, amount, "deposit")
+    headers = {"Authorization": f"Bearer {test_user['token']}"}
+
+    amounts, cursor = [], None
+    while True:
+        url = "/user/transactions?limit=2&fields=amount" + (f"&cursor={cursor}" if cursor else "")
+        response = client.get(url, headers=headers)
+        assert response.status_code == 200
+        page = response.json()
+        assert all(list(item) == ["amount"] for item in page)
+        amounts += [item["amount"] for item in page]
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            break
+
+    assert amounts == [5, 4, 3, 2, 1]
+
+
+def test_pagination_rejects_unknown_fields_and_bad_cursor(client: TestClient, test_user):
+    headers = {"Authorization": f"Bearer {test_user['token']}"}
+
+    assert client.get("/user/transactions?fields=password", headers=headers).status_code == 400
+    assert client.get("/user/transactions?cursor=garbage", headers=headers).status_code == 400
+
+
+def test_admin_predictions_skip_result_json_by_default(client: TestClient, session: Session):
+    session.add(Users(email="admin@example.com", username="admin", password="x", is_admin=True))
+    session.commit()
+    session.add(Predictions(user_id=1, model_id=None, input_photo_url="u", input_data="img",
+                            prediction_result={"damage": "DR"}, cost=10, severity="low",
+                            recommendation="r"))
+    session.commit()
+
+    default = client.get("/admins/predictions?email=admin@example.com").json()
+    explicit = client.get("/admins/predictions?email=admin@example.com"
+                          "&fields=prediction_id,prediction_result").json()
+
+    assert "prediction_result" not in default[0]
+    assert explicit == [{"prediction_id": 1, "prediction_result": {"damage": "DR"}}]
+    users = client.get("/admins/users?email=admin@example.com").json()
+    assert "password" not in users[0]
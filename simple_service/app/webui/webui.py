@@ -13,6 +13,8 @@ logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(
 
 # Основной адрес API
 API_URL = "http://app:8080"
+# Последние записи истории; API отдаёт их постранично, новые первыми
+HISTORY_PAGE_SIZE = 50
 
 load_dotenv()
 
@@ -338,28 +340,29 @@ def dashboard_page():
             task_id = post.json().get("task_id")
 
         # Ожидание завершения
+        prediction_id = None
         with st.spinner("Обработка изображения, подождите..."):
             for _ in range(30):
                 time.sleep(1)
                 status = api_request("GET", f"/service/tasks/{task_id}")
                 if status and status.status_code == 200:
                     items = status.json()
-                    if any(item.get("status") == "complete" for item in items):
+                    done = next((item for item in items if item.get("status") == "complete"), None)
+                    if done:
+                        prediction_id = done.get("prediction_id")
                         break
             else:
                 st.error("Превышено время ожидания обработки")
                 st.stop()
 
-        # Получение предсказания
-        get_preds = api_request("GET", "/user/predictions")
-        if not get_preds or get_preds.status_code != 200:
+        # Получение предсказания именно этой задачи: последнее в истории может
+        # оказаться результатом другой задачи, завершившейся позже
+        get_pred = api_request("GET", f"/user/predictions/{prediction_id}") if prediction_id else None
+        if not get_pred or get_pred.status_code != 200:
             st.error("Не удалось получить результаты предсказания")
             st.stop()
 
-        preds = get_preds.json()
-        rec = next((p for p in reversed(preds) if p.get("prediction_id") == task_id), None)
-        if not rec and preds:
-            rec = preds[-1]
+        rec = get_pred.json()
 
         if rec:
             st.session_state["last_result"] = {
@@ -390,7 +393,7 @@ def dashboard_page():
     st.subheader("История запросов")
 
     if st.button("Показать историю запросов"):
-        response = api_request("GET", "/user/predictions")
+        response = api_request("GET", f"/user/predictions?limit={HISTORY_PAGE_SIZE}")
 
         if response and response.status_code == 200:
             history = response.json()
@@ -413,7 +416,7 @@ def dashboard_page():
     # История транзакций
     st.subheader("История транзакций")
     if st.button("Показать историю транзакций"):
-        response = api_request("GET", "/user/transactions")
+        response = api_request("GET", f"/user/transactions?limit={HISTORY_PAGE_SIZE}")
         if response and response.status_code == 200:
             history = response.json()
             if history:
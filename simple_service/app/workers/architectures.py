@@ -0,0 +1,94 @@
+from typing import Dict
+
+import torch.nn as nn
+from torchvision.models import efficientnet_b0, resnet18
+
+
+# Архитектуры из исследовательского ноутбука (notebooks/AgriSpectraResearch_Improvements_of_the_baseline.ipynb).
+# Веса берутся из чекпоинта, поэтому предобученные веса ImageNet не скачиваются.
+
+
+class MultiHeadClassifierRN18(nn.Module):
+    """Базовая модель на ResNet18: по линейной голове на каждую метку"""
+
+    def __init__(self, num_classes_dict: Dict[str, int]):
+        super().__init__()
+        base_model = resnet18(weights=None)
+        self.backbone = nn.Sequential(*list(base_model.children())[:-1])  # без FC
+        self.flatten = nn.Flatten()
+        self.heads = nn.ModuleDict({
+            name: nn.Linear(base_model.fc.in_features, num_classes)
+            for name, num_classes in num_classes_dict.items()
+        })
+
+    def forward(self, x):
+        x = self.backbone(x)
+        x = self.flatten(x)
+        return {name: head(x) for name, head in self.heads.items()}
+
+
+class MultiHeadClassifierEffB0(nn.Module):
+    """Базовая модель на EfficientNet-B0"""
+
+    def __init__(self, num_classes_dict: Dict[str, int]):
+        super().__init__()
+        base_model = efficientnet_b0(weights=None)
+        self.backbone = base_model.features
+        self.pool = base_model.avgpool
+        self.flatten = nn.Flatten()
+        in_features = base_model.classifier[1].in_features
+        self.heads = nn.ModuleDict({
+            name: nn.Linear(in_features, num_classes)
+            for name, num_classes in num_classes_dict.items()
+        })
+
+    def forward(self, x):
+        x = self.backbone(x)
+        x = self.pool(x)
+        x = self.flatten(x)
+        return {name: head(x) for name, head in self.heads.items()}
+
+
+class MultiHeadClassifierRN18Enhanced(nn.Module):
+    """ResNet18 с общим скрытым слоем и двухслойными головами"""
+
+    def __init__(self, num_classes_dict: Dict[str, int], dropout_p: float = 0.3, hidden_dim: int = 512):
+        super().__init__()
+        base = resnet18(weights=None)
+        self.backbone = nn.Sequential(*list(base.children())[:-1])
+        self.flatten = nn.Flatten()
+        self.shared_fc = nn.Sequential(
+            nn.Linear(base.fc.in_features, hidden_dim),
+            nn.BatchNorm1d(hidden_dim),
+            nn.ReLU(inplace=True),
+            nn.Dropout(dropout_p),
+        )
+        self.heads = nn.ModuleDict({
+            name: nn.Sequential(
+                nn.Linear(hidden_dim, hidden_dim // 2),
+                nn.BatchNorm1d(hidden_dim // 2),
+                nn.ReLU(inplace=True),
+                nn.Dropout(dropout_p),
+                nn.Linear(hidden_dim // 2, num_classes)
+            )
+            for name, num_classes in num_classes_dict.items()
+        })
+
+    def forward(self, x):
+        x = self.backbone(x)
+        x = self.flatten(x)
+        x = self.shared_fc(x)
+        return {name: head(x) for name, head in self.heads.items()}
+
+
+ARCHITECTURES = {
+    "rn18": MultiHeadClassifierRN18,
+    "effb0": MultiHeadClassifierEffB0,
+    "rn18_enhanced": MultiHeadClassifierRN18Enhanced,
+}
+
+
+def build_model(arch: str, num_classes: Dict[str, int]) -> nn.Module:
+    if arch not in ARCHITECTURES:
+        raise ValueError(f"Unknown architecture: {arch}, expected one of {', '.join(ARCHITECTURES)}")
+    return ARCHITECTURES[arch](num_classes)
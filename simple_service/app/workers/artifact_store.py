@@ -0,0 +1,284 @@
+import argparse
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import wandb
+from sqlmodel import Session, select
+
+from database.config import get_settings
+from database.database import engine
+from models.model import Models
+
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+settings = get_settings()
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def sha256_file(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def split_ref(ref: str) -> Tuple[str, str]:
+    """'entity/project/name:alias' -> ('entity/project/name', 'alias')"""
+    name, _, alias = ref.partition(":")
+    return name, alias or "latest"
+
+
+def is_digest(ref: str) -> bool:
+    """Дайджест манифеста (64 hex-символа), а не ссылка 'entity/project/name:alias'"""
+    return len(ref) == 64 and all(c in "0123456789abcdef" for c in ref)
+
+
+def label_map_version(inverse_label_maps: Dict[str, Dict[Any, str]]) -> str:
+    """Короткий хеш inverse_label_maps; ключи классов приводятся к строкам"""
+    canonical = {head: {str(k): v for k, v in mapping.items()}
+                 for head, mapping in inverse_label_maps.items()}
+    return hashlib.sha256(json.dumps(canonical, sort_keys=True).encode()).hexdigest()[:12]
+
+
+@dataclass
+class ArtifactManifest:
+    """Зафиксированная версия артефакта: файлы по sha256 и metadata"""
+    ref: str
+    digest: str
+    files: Dict[str, str]
+    metadata: Dict[str, Any] = field(default_factory=dict)
+    pinned_at: Optional[str] = None
+
+    def find(self, *suffixes: str) -> Optional[str]:
+        """Имя первого файла артефакта с одним из суффиксов"""
+        return next((name for name in sorted(self.files) if name.endswith(suffixes)), None)
+
+    @property
+    def label_map_version(self) -> Optional[str]:
+        raw = self.metadata.get("inverse_label_maps")
+        return label_map_version(raw) if raw else None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"ref": self.ref, "digest": self.digest, "files": self.files,
+                "metadata": self.metadata, "pinned_at": self.pinned_at}
+
+
+class WandbSource:
+    """Источник артефактов — WandB (сетевой вызов)"""
+
+    def fetch(self, ref: str, dest: Path) -> Dict[str, Any]:
+        logging.info(f"Downloading artifact from WandB: {ref}")
+        artifact = wandb.Api().artifact(ref, type="model")
+        artifact.download(root=str(dest))
+        return dict(artifact.metadata or {})
+
+
+class DirectorySource:
+    """
+    Источник артефактов — локальный каталог вида
+    <root>/<entity>/<project>/<name>/<alias>/ с файлами и metadata.json
+    """
+
+    def __init__(self, root: str):
+        self.root = Path(root)
+
+    def fetch(self, ref: str, dest: Path) -> Dict[str, Any]:
+        name, alias = split_ref(ref)
+        src = self.root / name / alias
+        if not src.is_dir():
+            raise FileNotFoundError(f"Artifact {ref} not found in {self.root}")
+        metadata = {}
+        for path in src.iterdir():
+            if path.name == "metadata.json":
+                metadata = json.loads(path.read_text())
+            elif path.is_file():
+                shutil.copy2(path, dest / path.name)
+        return metadata
+
+
+class ArtifactStore:
+    """
+    Локальное контентно-адресуемое хранилище артефактов моделей.
+    Ссылка 'entity/project/name:alias' один раз фиксируется на дайджест,
+    дальше файлы и metadata читаются с диска без сетевых вызовов.
+
+    Раскладка на диске:
+        objects/<sha[:2]>/<sha>        — содержимое файлов
+        manifests/<digest>.json        — состав версии артефакта
+        refs/<entity>/<project>/<name>/<alias>.json — pin ссылки на дайджест
+    """
+
+    def __init__(self, root: str, source=None):
+        self.root = Path(root)
+        self.source = source
+
+    def _object_path(self, sha: str) -> Path:
+        return self.root / "objects" / sha[:2] / sha
+
+    def _manifest_path(self, digest: str) -> Path:
+        return self.root / "manifests" / f"{digest}.json"
+
+    def _ref_path(self, ref: str) -> Path:
+        name, alias = split_ref(ref)
+        return self.root / "refs" / name / f"{alias}.json"
+
+    @staticmethod
+    def _write_json(path: Path, data: Dict[str, Any]) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(data, ensure_ascii=False, indent=2))
+        os.replace(tmp, path)
+
+    def has(self, digest: str) -> bool:
+        return self._manifest_path(digest).exists()
+
+    def is_pinned(self, ref: str) -> bool:
+        return self._ref_path(ref).exists()
+
+    def get(self, digest: str) -> ArtifactManifest:
+        """Манифест по дайджесту, без сети"""
+        path = self._manifest_path(digest)
+        if not path.exists():
+            raise FileNotFoundError(f"Artifact digest {digest} is not in the store")
+        return ArtifactManifest(**json.loads(path.read_text()))
+
+    def resolve(self, ref: str) -> ArtifactManifest:
+        """Манифест по ссылке: из pin, а при его отсутствии — скачивается один раз"""
+        if is_digest(ref):
+            return self.get(ref)
+        path = self._ref_path(ref)
+        if path.exists():
+            return self.get(json.loads(path.read_text())["digest"])
+        logging.info(f"Artifact {ref} is not pinned yet, fetching")
+        return self.refresh(ref)
+
+    def refresh(self, ref: str) -> ArtifactManifest:
+        """Заново скачивает артефакт из источника и переписывает pin"""
+        if self.source is None:
+            raise RuntimeError(f"No artifact source configured to fetch {ref}")
+
+        self.root.mkdir(parents=True, exist_ok=True)
+        with tempfile.TemporaryDirectory(dir=self.root) as tmp:
+            tmp_dir = Path(tmp)
+            metadata = self.source.fetch(ref, tmp_dir)
+            files = {}
+            for path in sorted(p for p in tmp_dir.rglob("*") if p.is_file()):
+                sha = sha256_file(path)
+                obj = self._object_path(sha)
+                if not obj.exists():
+                    obj.parent.mkdir(parents=True, exist_ok=True)
+                    os.replace(path, obj)
+                files[path.relative_to(tmp_dir).as_posix()] = sha
+
+        digest = hashlib.sha256(
+            json.dumps({"files": files, "metadata": metadata}, sort_keys=True).encode()
+        ).hexdigest()
+        manifest = ArtifactManifest(ref=ref, digest=digest, files=files, metadata=metadata,
+                                    pinned_at=datetime.now(timezone.utc).isoformat())
+        self._write_json(self._manifest_path(digest), manifest.to_dict())
+        self._write_json(self._ref_path(ref), {"ref": ref, "digest": digest,
+                                               "pinned_at": manifest.pinned_at})
+        logging.info(f"Pinned {ref} -> {digest[:12]} ({len(files)} files)")
+        return manifest
+
+    def path(self, manifest: ArtifactManifest, name: str) -> Path:
+        """Локальный путь к файлу артефакта"""
+        return self._object_path(manifest.files[name])
+
+
+def default_source():
+    if settings.ARTIFACT_SOURCE_DIR:
+        return DirectorySource(settings.ARTIFACT_SOURCE_DIR)
+    return WandbSource()
+
+
+store = ArtifactStore(settings.ARTIFACT_STORE_DIR, source=default_source())
+
+
+def model_refs() -> List[str]:
+    """Все ссылки на артефакты, которые нужны воркеру"""
+    with Session(engine) as session:
+        refs = list(session.exec(select(Models.artifact_path)).all())
+    return refs + [settings.GROWTH_KMEANS_ARTIFACT]
+
+
+def prewarm(refs: Iterable[str], refresh: bool = False) -> int:
+    """Разрешает и скачивает артефакты заранее; возвращает число ошибок"""
+    failed = 0
+    for ref in refs:
+        try:
+            manifest = store.refresh(ref) if refresh else store.resolve(ref)
+            logging.info(f"Ready: {ref} -> {manifest.digest[:12]}")
+        except Exception as e:
+            failed += 1
+            logging.error(f"Failed to prewarm {ref}: {e}")
+    return failed
+
+
+def sync_model_digests() -> int:
+    """
+    Записывает в Models дайджест и версию label maps зафиксированных артефактов:
+    API вкладывает их в сообщение задачи, и воркер загружает ровно эту версию.
+    """
+    updated = 0
+    with Session(engine) as session:
+        for model in session.exec(select(Models)).all():
+            if not store.is_pinned(model.artifact_path):
+                continue
+            manifest = store.resolve(model.artifact_path)
+            if (model.artifact_digest, model.label_map_version) != (manifest.digest, manifest.label_map_version):
+                model.artifact_digest = manifest.digest
+                model.label_map_version = manifest.label_map_version
+                session.add(model)
+                updated += 1
+        session.commit()
+    logging.info(f"Updated artifact digests of {updated} models")
+    return updated
+
+
+def main(argv=None):
+    """
+    python -m workers.artifact_store refresh <ref> [<ref> ...]
+    python -m workers.artifact_store prewarm [--refresh]
+    """
+    parser = argparse.ArgumentParser(description="AgriSpectra model artifact store")
+    sub = parser.add_subparsers(dest="command", required=True)
+    refresh_cmd = sub.add_parser("refresh", help="re-resolve aliases and re-pin artifacts")
+    refresh_cmd.add_argument("refs", nargs="+")
+    prewarm_cmd = sub.add_parser("prewarm", help="fetch every model artifact used by the worker")
+    prewarm_cmd.add_argument("--refresh", action="store_true")
+    args = parser.parse_args(argv)
+
+    if args.command == "refresh":
+        failed = prewarm(args.refs, refresh=True)
+        sync_model_digests()
+        return failed
+
+    try:
+        refs = model_refs()
+    except Exception as e:
+        # БД ещё недоступна — прогреваем хотя бы KMeans, модели подтянутся при первом запросе
+        logging.warning(f"Cannot read models from database: {e}")
+        refs = [settings.GROWTH_KMEANS_ARTIFACT]
+    prewarm(refs, refresh=args.refresh)
+    try:
+        sync_model_digests()
+    except Exception as e:
+        logging.warning(f"Cannot record artifact digests: {e}")
+    # Прогрев не должен мешать старту воркера
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
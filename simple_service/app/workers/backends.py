@@ -0,0 +1,250 @@
+import argparse
+import json
+import logging
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Sequence, Tuple
+
+import numpy as np
+import torch
+
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+# Бэкенды инференса (колонка Models.backend) и файл артефакта, из которого грузится каждый
+TORCHSCRIPT = "torchscript"
+FROZEN = "frozen"
+INT8 = "int8"
+ONNX = "onnx"
+DEFAULT_BACKEND = TORCHSCRIPT
+
+BACKEND_FILES = {
+    TORCHSCRIPT: "_scripted.pt",
+    FROZEN: "_scripted.pt",
+    INT8: "_int8_scripted.pt",
+    ONNX: ".onnx",
+}
+
+# Разделитель бэкенда в ключе реестра моделей: '<artifact_path или дайджест>#<backend>'
+REF_SEPARATOR = "#"
+
+
+def model_ref(key: str, backend: Optional[str]) -> str:
+    """Ключ реестра: для бэкенда по умолчанию совпадает с путём артефакта"""
+    if not backend or backend == DEFAULT_BACKEND:
+        return key
+    return f"{key}{REF_SEPARATOR}{backend}"
+
+
+def split_model_ref(ref: str) -> Tuple[str, str]:
+    """Обратное к model_ref: '<key>#<backend>' -> ('<key>', '<backend>')"""
+    key, _, backend = ref.partition(REF_SEPARATOR)
+    return key, backend or DEFAULT_BACKEND
+
+
+def backend_file(files, backend: str) -> Optional[str]:
+    """Файл артефакта для бэкенда; у fp32 TorchScript исключается int8-вариант"""
+    suffix = BACKEND_FILES[backend]
+    names = sorted(name for name in files if name.endswith(suffix))
+    if suffix != BACKEND_FILES[INT8]:
+        names = [name for name in names if not name.endswith(BACKEND_FILES[INT8])]
+    return names[0] if names else None
+
+
+class InferenceModel:
+    """
+    Модель любого бэкенда с интерфейсом TorchScript-модели: model(x) -> {голова: логиты (N, C)}.
+    Размер хранится явно: у замороженных и ORT-моделей нет state_dict с весами.
+    """
+
+    def __init__(self, fn: Callable[[torch.Tensor], Any], backend: str, size_bytes: int):
+        self.fn = fn
+        self.backend = backend
+        self.size_bytes = size_bytes
+
+    def __call__(self, x: torch.Tensor) -> Any:
+        return self.fn(x)
+
+
+def _weights_bytes(module) -> int:
+    return sum(t.numel() * t.element_size() for t in module.state_dict().values())
+
+
+def select_quantized_engine() -> None:
+    """Ядра int8: x86/fbgemm на серверных CPU, qnnpack на ARM"""
+    for engine in ("x86", "fbgemm", "qnnpack"):
+        if engine in torch.backends.quantized.supported_engines:
+            torch.backends.quantized.engine = engine
+            return
+
+
+def load_torchscript(path: Path) -> InferenceModel:
+    model = torch.jit.load(str(path), map_location="cpu")
+    model.eval()
+    return InferenceModel(model, TORCHSCRIPT, _weights_bytes(model))
+
+
+def load_frozen(path: Path) -> InferenceModel:
+    """TorchScript с весами-константами и слитыми conv+bn (optimize_for_inference)"""
+    model = torch.jit.load(str(path), map_location="cpu")
+    model.eval()
+    size = _weights_bytes(model)
+    return InferenceModel(torch.jit.optimize_for_inference(torch.jit.freeze(model)), FROZEN, size)
+
+
+def load_int8(path: Path) -> InferenceModel:
+    """Заранее квантованная (динамически или статически) TorchScript-модель"""
+    select_quantized_engine()
+    model = torch.jit.load(str(path), map_location="cpu")
+    model.eval()
+    return InferenceModel(torch.jit.freeze(model), INT8, path.stat().st_size)
+
+
+def load_onnx(path: Path) -> InferenceModel:
+    """Сессия ONNX Runtime; onnxruntime — необязательная зависимость воркера"""
+    try:
+        import onnxruntime as ort
+    except ImportError:
+        raise RuntimeError("ONNX backend requires onnxruntime")
+
+    options = ort.SessionOptions()
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    options.intra_op_num_threads = torch.get_num_threads()
+    session = ort.InferenceSession(str(path), sess_options=options,
+                                   providers=["CPUExecutionProvider"])
+    input_name = session.get_inputs()[0].name
+    output_names = [output.name for output in session.get_outputs()]
+
+    def run(x: torch.Tensor) -> Dict[str, torch.Tensor]:
+        outputs = session.run(output_names, {input_name: x.numpy()})
+        return {name: torch.from_numpy(value) for name, value in zip(output_names, outputs)}
+
+    return InferenceModel(run, ONNX, path.stat().st_size)
+
+
+LOADERS: Dict[str, Callable[[Path], InferenceModel]] = {
+    TORCHSCRIPT: load_torchscript,
+    FROZEN: load_frozen,
+    INT8: load_int8,
+    ONNX: load_onnx,
+}
+
+
+def check_backend(backend: str) -> None:
+    if backend not in LOADERS:
+        raise ValueError(f"Unknown inference backend: {backend}")
+
+
+def load_backend(backend: str, path: Path) -> InferenceModel:
+    check_backend(backend)
+    return LOADERS[backend](path)
+
+
+def load_images(images_dir: Optional[str], count: int = 16, seed: int = 0) -> torch.Tensor:
+    """
+    Фиксированный набор входов для сверки: изображения каталога (сортировка по имени)
+    или, без каталога, детерминированный шум
+    """
+    from PIL import Image
+    from workers.inference import preprocess
+
+    if images_dir:
+        paths = sorted(p for p in Path(images_dir).iterdir()
+                       if p.suffix.lower() in (".jpg", ".jpeg", ".png"))[:count]
+        if not paths:
+            raise FileNotFoundError(f"No images in {images_dir}")
+        return torch.stack([preprocess(Image.open(p).convert("RGB")) for p in paths])
+    rng = np.random.default_rng(seed)
+    arrays = rng.integers(0, 255, (count, 256, 256, 3), dtype=np.uint8)
+    return torch.stack([preprocess(Image.fromarray(a)) for a in arrays])
+
+
+def _heads(out: Any) -> Dict[str, torch.Tensor]:
+    return out if isinstance(out, dict) else {"default": out}
+
+
+def time_per_image_ms(model: Callable, images: torch.Tensor, batch_size: int = 1,
+                      warmup: int = 2, repeats: int = 3) -> float:
+    """Медианное время прямого прохода в пересчёте на одно изображение"""
+    batches = [images[i:i + batch_size] for i in range(0, len(images), batch_size)]
+    with torch.no_grad():
+        for batch in batches[:warmup]:
+            model(batch)
+        runs = []
+        for _ in range(repeats):
+            t0 = time.perf_counter()
+            for batch in batches:
+                model(batch)
+            runs.append((time.perf_counter() - t0) / len(images))
+    return round(float(np.median(runs)) * 1000, 3)
+
+
+def parity(reference: Callable, variants: Dict[str, Callable], images: torch.Tensor,
+           batch_size: int = 1) -> Dict[str, Dict[str, Any]]:
+    """
+    Сверяет варианты с эталонной моделью на одном наборе изображений:
+    доля совпавших классов по каждой голове, максимальное расхождение логитов
+    и время на изображение
+    """
+    with torch.no_grad():
+        expected = _heads(reference(images))
+    report = {"reference": {"ms_per_image": time_per_image_ms(reference, images, batch_size)}}
+    for name, model in variants.items():
+        with torch.no_grad():
+            actual = _heads(model(images))
+        heads = {}
+        for head, logits in expected.items():
+            got = actual[head].float()
+            heads[head] = {
+                "agreement": float((got.argmax(dim=1) == logits.argmax(dim=1)).float().mean()),
+                "max_abs_diff": float((got - logits.float()).abs().max()),
+            }
+        report[name] = {
+            "heads": heads,
+            "agreement": min(h["agreement"] for h in heads.values()),
+            "ms_per_image": time_per_image_ms(model, images, batch_size),
+        }
+    return report
+
+
+def load_variants(artifact_path: str, backends: Sequence[str],
+                  artifact_store=None) -> Tuple[InferenceModel, Dict[str, InferenceModel]]:
+    """Эталон (TorchScript) и варианты артефакта из локального хранилища"""
+    from workers.model_registry import load_model
+
+    reference, _ = load_model(artifact_path, artifact_store=artifact_store)
+    variants = {backend: load_model(model_ref(artifact_path, backend), artifact_store=artifact_store)[0]
+                for backend in backends if backend != TORCHSCRIPT}
+    return reference, variants
+
+
+def main(argv=None):
+    """
+    python -m workers.backends parity <artifact_path> [--backends frozen,int8,onnx]
+        [--images DIR] [--batch-size N] [--min-agreement 0.99]
+    """
+    parser = argparse.ArgumentParser(description="Inference backends of the worker")
+    sub = parser.add_subparsers(dest="command", required=True)
+    parity_cmd = sub.add_parser("parity", help="compare backend variants with the reference model")
+    parity_cmd.add_argument("artifact_path")
+    parity_cmd.add_argument("--backends", default=",".join(b for b in LOADERS if b != TORCHSCRIPT))
+    parity_cmd.add_argument("--images", help="directory with the fixed image set")
+    parity_cmd.add_argument("--batch-size", type=int, default=1)
+    parity_cmd.add_argument("--min-agreement", type=float, default=0.99)
+    args = parser.parse_args(argv)
+
+    backends = [b.strip() for b in args.backends.split(",") if b.strip()]
+    reference, variants = load_variants(args.artifact_path, backends)
+    report = parity(reference, variants, load_images(args.images), args.batch_size)
+    print(json.dumps(report, indent=2))
+
+    failed = [name for name, result in report.items()
+              if name != "reference" and result["agreement"] < args.min_agreement]
+    if failed:
+        logging.error(f"Backends below {args.min_agreement} agreement: {', '.join(failed)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,38 @@
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Tuple
+
+
+Delivery = Tuple[Any, Any, bytes]  # (method, properties, body)
+
+
+def collect_batches(events: Iterable[Delivery], batch_size: int,
+                    max_wait: float,
+                    clock: Callable[[], float] = time.monotonic) -> Iterator[List[Delivery]]:
+    """
+    Собирает сообщения из channel.consume(..., inactivity_timeout=...) в пачки:
+    не больше batch_size штук и не дольше max_wait секунд с первого сообщения.
+    Событие (None, None, None) означает, что очередь простаивает.
+    """
+    batch: List[Delivery] = []
+    deadline = 0.0
+    for method, properties, body in events:
+        if method is not None:
+            if not batch:
+                deadline = clock() + max_wait
+            batch.append((method, properties, body))
+
+        if batch and (len(batch) >= batch_size or clock() >= deadline or method is None):
+            yield batch
+            batch = []
+
+    if batch:
+        yield batch
+
+
+def group_by(items: Iterable[Any], key: Callable[[Any], str]) -> Dict[str, List[Any]]:
+    """Группирует элементы по ключу с сохранением порядка поступления"""
+    groups: Dict[str, List[Any]] = OrderedDict()
+    for item in items:
+        groups.setdefault(key(item), []).append(item)
+    return groups
@@ -0,0 +1,107 @@
+import json
+import logging
+from typing import Any, Dict
+
+from sqlmodel import Session
+
+from database.database import engine
+from database.config import get_settings
+from models.ml_task import MLTasks
+from models.prediction import Predictions
+from workers.connect import connect_to_rabbitmq
+from workers.recommendations import recommendation_index
+from workers.retry import make_policy
+from workers.sentinel import growth_lookup
+
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+settings = get_settings()
+
+retry_policy = make_policy(settings.RMQ_ENRICH_QUEUE)
+
+
+def enrich_prediction(msg: Dict[str, Any], session: Session) -> None:
+    """Уточняет стадию роста по Sentinel-1 и обновляет предсказание, задачу и рекомендацию"""
+    pred = session.get(Predictions, msg["prediction_id"])
+    if pred is None:
+        raise RuntimeError(f"Prediction with id={msg['prediction_id']} not found")
+
+    latitude, longitude = msg["latitude"], msg["longitude"]
+    logging.info(f'Processing valid coordinates - latitude: {latitude}, longitude: {longitude}')
+    # Стадия роста по Sentinel-1, повторные запросы по участку берутся из кэша
+    _, predicted_growth_stage = growth_lookup.lookup(latitude, longitude)
+
+    # Проверяем, если предсказанная стадия роста отличается от исходной
+    readable = dict(pred.prediction_result)
+    original_growth_stage = readable.get("growth_stage", "unknown")
+    if predicted_growth_stage != "unknown" and predicted_growth_stage != original_growth_stage:
+        logging.info(f"Updating growth stage from {original_growth_stage} to {predicted_growth_stage}")
+        readable["growth_stage"] = predicted_growth_stage
+
+        pred.recommendation, pred.source = recommendation_index.lookup(
+            readable["damage"], readable["growth_stage"], pred.severity, session)
+        pred.prediction_result = readable
+
+        task = session.get(MLTasks, msg["task_id"])
+        if task is not None:
+            task.prediction_result = readable
+            session.add(task)
+
+    pred.enrichment_status = "done"
+    session.add(pred)
+    session.commit()
+
+
+def enrichment_task(ch, method, properties, body):
+    try:
+        msg = json.loads(body)
+        with Session(engine) as session:
+            enrich_prediction(msg, session)
+        ch.basic_ack(method.delivery_tag)
+    except Exception as e:
+        logging.error(f"Enrichment error: {e}", exc_info=True)
+        if retry_policy.fail_or_nack(ch, method, properties, body, e):
+            mark_enrichment_failed(body)
+
+
+def mark_enrichment_failed(body: bytes) -> None:
+    """Предсказание остаётся с исходной стадией роста; повтор — через replay из DLQ"""
+    try:
+        with Session(engine) as session:
+            pred = session.get(Predictions, json.loads(body)["prediction_id"])
+            if pred is not None:
+                pred.enrichment_status = "failed"
+                session.add(pred)
+                session.commit()
+    except Exception as e:
+        logging.error(f"Failed to mark enrichment as failed: {e}", exc_info=True)
+
+
+def main():
+    # Матрица рекомендаций загружается один раз на старте, дальше — из памяти
+    with Session(engine) as session:
+        recommendation_index.load(session)
+
+    connection = connect_to_rabbitmq()
+    channel = connection.channel()
+
+    channel.queue_declare(queue=settings.RMQ_ENRICH_QUEUE, durable=True)
+    retry_policy.declare(channel)
+    channel.basic_qos(prefetch_count=1)
+    channel.basic_consume(queue=settings.RMQ_ENRICH_QUEUE,
+                          on_message_callback=enrichment_task,
+                          auto_ack=False
+                          )
+
+    try:
+        logging.info(f"Waiting for enrichment messages on '{settings.RMQ_ENRICH_QUEUE}'")
+        channel.start_consuming()
+    except KeyboardInterrupt:
+        logging.info(" [INFO] Остановка по Ctrl+C")
+    except Exception as e:
+        logging.info(f"[ERROR] Consumer crashed: {e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,314 @@
+import argparse
+import copy
+import json
+import logging
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import torch
+
+from database.config import get_settings
+from workers import backends
+from workers.architectures import ARCHITECTURES, build_model
+
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+settings = get_settings()
+
+CALIBRATION_IMAGES = 32
+
+
+def read_label_maps(path: str) -> Dict[str, Dict[int, str]]:
+    """
+    inverse_label_maps обучения ({голова: {индекс: метка}}); принимается и metadata.json
+    артефакта целиком. Порядок голов задаёт порядок выходов ONNX.
+    """
+    raw = json.loads(Path(path).read_text())
+    raw = raw.get("inverse_label_maps", raw)
+    return {head: {int(k): str(v) for k, v in mapping.items()} for head, mapping in raw.items()}
+
+
+def load_checkpoint(arch: str, checkpoint: str, label_maps: Dict[str, Dict[int, str]]) -> torch.nn.Module:
+    """Модель ноутбука с весами из state_dict (torch.save(model.state_dict(), ...))"""
+    model = build_model(arch, {head: len(mapping) for head, mapping in label_maps.items()})
+    state = torch.load(checkpoint, map_location="cpu", weights_only=True)
+    model.load_state_dict(state.get("state_dict", state))
+    return model.eval()
+
+
+def read_labeled_set(csv_path: str, image_dir: str, label_maps: Dict[str, Dict[int, str]],
+                     limit: Optional[int] = None) -> Tuple[torch.Tensor, Dict[str, torch.Tensor]]:
+    """
+    Размеченная выборка в формате ноутбука: CSV с колонкой filename и колонкой на каждую
+    голову. Метки переводятся в индексы через inverse_label_maps.
+    """
+    import pandas as pd
+    from PIL import Image
+    from workers.inference import preprocess
+
+    df = pd.read_csv(csv_path)
+    if limit:
+        df = df.head(limit)
+    missing = [head for head in label_maps if head not in df.columns]
+    if missing:
+        raise ValueError(f"Columns {', '.join(missing)} are missing in {csv_path}")
+    images = torch.stack([preprocess(Image.open(Path(image_dir) / name).convert("RGB"))
+                          for name in df["filename"]])
+    labels = {}
+    for head, mapping in label_maps.items():
+        index = {label: i for i, label in mapping.items()}
+        labels[head] = torch.tensor([index[str(value)] for value in df[head]])
+    return images, labels
+
+
+def quantize(model: torch.nn.Module, calibration: torch.Tensor) -> torch.nn.Module:
+    """
+    Статическое int8-квантование (FX) с калибровкой на изображениях: квантуются и свёртки.
+    Если граф не трассируется — динамическое квантование линейных слоёв.
+    """
+    from torch.ao.quantization import get_default_qconfig_mapping
+    from torch.ao.quantization.quantize_fx import convert_fx, prepare_fx
+
+    backends.select_quantized_engine()
+    try:
+        prepared = prepare_fx(copy.deepcopy(model).eval(),
+                              get_default_qconfig_mapping(torch.backends.quantized.engine),
+                              example_inputs=(calibration[:1],))
+        with torch.no_grad():
+            for batch in calibration.split(8):
+                prepared(batch)
+        return convert_fx(prepared)
+    except Exception as e:
+        logging.warning(f"Static quantization failed, falling back to dynamic: {e}")
+        return torch.ao.quantization.quantize_dynamic(copy.deepcopy(model).eval(),
+                                                      {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def export_variants(model: torch.nn.Module, name: str, heads: List[str], out_dir: Path,
+                    calibration: torch.Tensor) -> Dict[str, str]:
+    """
+    Файлы вариантов в каталоге артефакта: <name>_scripted.pt, <name>_int8_scripted.pt,
+    <name>.onnx. Вариант, который не удалось экспортировать, пропускается.
+    Возвращает {бэкенд: файл}; frozen собирается воркером из fp32 TorchScript.
+    """
+    out_dir.mkdir(parents=True, exist_ok=True)
+    files = {}
+
+    scripted = f"{name}{backends.BACKEND_FILES[backends.TORCHSCRIPT]}"
+    torch.jit.save(torch.jit.script(model), str(out_dir / scripted))
+    files[backends.TORCHSCRIPT] = files[backends.FROZEN] = scripted
+
+    int8 = f"{name}{backends.BACKEND_FILES[backends.INT8]}"
+    try:
+        torch.jit.save(torch.jit.script(quantize(model, calibration)), str(out_dir / int8))
+        files[backends.INT8] = int8
+    except Exception as e:
+        logging.warning(f"Skipping int8 variant: {e}")
+
+    onnx = f"{name}{backends.BACKEND_FILES[backends.ONNX]}"
+    try:
+        with torch.no_grad():
+            torch.onnx.export(model, calibration[:1], str(out_dir / onnx),
+                              input_names=["image"], output_names=heads,
+                              dynamic_axes={n: {0: "batch"} for n in ["image", *heads]},
+                              opset_version=17)
+        files[backends.ONNX] = onnx
+    except Exception as e:
+        logging.warning(f"Skipping onnx variant: {e}")
+    return files
+
+
+def accuracy(model, images: torch.Tensor, labels: Dict[str, torch.Tensor], batch_size: int = 8) -> float:
+    """Средняя по головам точность, как avg_acc в evaluate() ноутбука"""
+    correct = {head: 0 for head in labels}
+    with torch.no_grad():
+        for start in range(0, len(images), batch_size):
+            out = model(images[start:start + batch_size])
+            for head, target in labels.items():
+                predicted = out[head].argmax(dim=1)
+                correct[head] += int((predicted == target[start:start + batch_size]).sum())
+    return round(sum(correct.values()) / (len(labels) * len(images)), 4)
+
+
+def benchmark(out_dir: Path, files: Dict[str, str], images: torch.Tensor,
+              labels: Optional[Dict[str, torch.Tensor]] = None,
+              batch_size: int = 1) -> Dict[str, Dict[str, Any]]:
+    """
+    Загружает каждый вариант так же, как воркер (workers.backends), и меряет
+    время на изображение, совпадение классов с fp32 TorchScript и точность на разметке
+    """
+    models = {}
+    for backend, name in files.items():
+        try:
+            models[backend] = backends.load_backend(backend, out_dir / name)
+        except Exception as e:
+            logging.warning(f"Cannot load {backend} variant: {e}")
+    # Без fp32 TorchScript не с чем сравнивать остальные варианты
+    if backends.TORCHSCRIPT not in models:
+        raise RuntimeError(f"Reference {backends.TORCHSCRIPT} variant "
+                           f"{files.get(backends.TORCHSCRIPT)!r} failed to load from {out_dir}, "
+                           f"cannot benchmark the other variants")
+    reference = models.pop(backends.TORCHSCRIPT)
+    report = backends.parity(reference, models, images, batch_size)
+
+    results = {backends.TORCHSCRIPT: {"file": files[backends.TORCHSCRIPT], "agreement": 1.0,
+                                      "latency_ms": report["reference"]["ms_per_image"],
+                                      "size_bytes": reference.size_bytes}}
+    for backend, model in models.items():
+        results[backend] = {"file": files[backend], "agreement": report[backend]["agreement"],
+                            "latency_ms": report[backend]["ms_per_image"],
+                            "size_bytes": model.size_bytes}
+    if labels is not None:
+        results[backends.TORCHSCRIPT]["accuracy"] = accuracy(reference, images, labels)
+        for backend, model in models.items():
+            results[backend]["accuracy"] = accuracy(model, images, labels)
+    return results
+
+
+def choose_variant(results: Dict[str, Dict[str, Any]], min_agreement: float = 0.99,
+                   max_accuracy_drop: float = 0.01) -> str:
+    """
+    Самый быстрый приемлемый вариант: классы совпадают с fp32 не реже min_agreement,
+    точность (если мерилась) ниже эталонной не более чем на max_accuracy_drop.
+    Эталон приемлем всегда.
+    """
+    reference_accuracy = results[backends.TORCHSCRIPT].get("accuracy")
+
+    def acceptable(result: Dict[str, Any]) -> bool:
+        if result["agreement"] < min_agreement:
+            return False
+        if reference_accuracy is None or result.get("accuracy") is None:
+            return True
+        return round(reference_accuracy - result["accuracy"], 6) <= max_accuracy_drop
+
+    candidates = [backend for backend, result in results.items() if acceptable(result)]
+    return min(candidates, key=lambda backend: results[backend]["latency_ms"])
+
+
+def register_variants(session, ref: str, name: str, description: str, cost: float,
+                      results: Dict[str, Dict[str, Any]], chosen: str,
+                      digest: Optional[str] = None, label_map_version: Optional[str] = None) -> List[Any]:
+    """
+    Записывает варианты артефакта в Models (одна строка на бэкенд, повторный экспорт
+    обновляет её). Активен только выбранный вариант — его видят пользователи.
+    """
+    from sqlmodel import select
+    from models.model import Models
+
+    existing = {m.backend: m for m in session.exec(select(Models).where(Models.artifact_path == ref)).all()}
+    rows = []
+    for backend, result in results.items():
+        model = existing.pop(backend, None) or Models(name=name, description=description, cost=cost,
+                                                      artifact_path=ref, backend=backend)
+        model.name, model.description, model.cost = name, description, cost
+        model.latency_ms = result["latency_ms"]
+        model.accuracy = result.get("accuracy")
+        model.active = backend == chosen
+        model.artifact_digest = digest
+        model.label_map_version = label_map_version
+        session.add(model)
+        rows.append(model)
+    # Варианты прошлых экспортов, которых больше нет в артефакте
+    for model in existing.values():
+        model.active = False
+        session.add(model)
+    session.commit()
+    for model in rows:
+        session.refresh(model)
+    return rows
+
+
+def upload_to_wandb(ref: str, artifact_dir: Path, metadata: Dict[str, Any]) -> None:
+    """Публикует каталог артефакта в WandB под ссылкой entity/project/name:alias"""
+    import wandb
+    from workers.artifact_store import split_ref
+
+    path, alias = split_ref(ref)
+    entity, project, name = path.split("/")
+    run = wandb.init(entity=entity, project=project, job_type="export")
+    try:
+        artifact = wandb.Artifact(name, type="model", metadata=metadata)
+        for file in artifact_dir.iterdir():
+            if file.name != "metadata.json":
+                artifact.add_file(str(file))
+        run.log_artifact(artifact, aliases=[alias])
+    finally:
+        run.finish()
+
+
+def main(argv=None):
+    """
+    python -m workers.export_model --arch rn18 --checkpoint resnet18_enh.pth
+        --label-maps label_maps.json --ref entity/project/name:alias [--out DIR]
+        [--eval-csv test.csv --image-dir DIR] [--images DIR] [--register --cost N]
+        [--upload]
+    """
+    parser = argparse.ArgumentParser(description="Export a trained model into optimized inference variants")
+    parser.add_argument("--arch", required=True, choices=list(ARCHITECTURES))
+    parser.add_argument("--checkpoint", required=True, help="state_dict saved by the research notebook")
+    parser.add_argument("--label-maps", required=True, help="JSON with inverse_label_maps")
+    parser.add_argument("--ref", required=True, help="artifact reference entity/project/name:alias")
+    parser.add_argument("--out", default=settings.ARTIFACT_SOURCE_DIR,
+                        help="artifact source directory (defaults to ARTIFACT_SOURCE_DIR)")
+    parser.add_argument("--eval-csv", help="labeled evaluation set in the notebook format")
+    parser.add_argument("--image-dir", help="images of the evaluation set")
+    parser.add_argument("--eval-limit", type=int, default=256)
+    parser.add_argument("--images", help="unlabeled images for calibration and latency without --eval-csv")
+    parser.add_argument("--batch-size", type=int, default=1)
+    parser.add_argument("--min-agreement", type=float, default=0.99)
+    parser.add_argument("--max-accuracy-drop", type=float, default=0.01)
+    parser.add_argument("--register", action="store_true", help="register the variants in the models table")
+    parser.add_argument("--name", help="model name in the models table (defaults to the artifact name)")
+    parser.add_argument("--description", default="")
+    parser.add_argument("--cost", type=float, default=10)
+    parser.add_argument("--upload", action="store_true", help="also publish the artifact to WandB")
+    args = parser.parse_args(argv)
+
+    if not args.out:
+        parser.error("--out is required when ARTIFACT_SOURCE_DIR is not set")
+    if args.eval_csv and not args.image_dir:
+        parser.error("--eval-csv requires --image-dir")
+
+    from workers.artifact_store import ArtifactStore, DirectorySource, split_ref
+
+    label_maps = read_label_maps(args.label_maps)
+    model = load_checkpoint(args.arch, args.checkpoint, label_maps)
+    labels = None
+    if args.eval_csv:
+        images, labels = read_labeled_set(args.eval_csv, args.image_dir, label_maps, args.eval_limit)
+    else:
+        images = backends.load_images(args.images, count=CALIBRATION_IMAGES)
+
+    path, alias = split_ref(args.ref)
+    artifact_name = path.rsplit("/", 1)[-1]
+    artifact_dir = Path(args.out) / path / alias
+    files = export_variants(model, artifact_name, list(label_maps), artifact_dir,
+                            images[:CALIBRATION_IMAGES])
+    results = benchmark(artifact_dir, files, images, labels, args.batch_size)
+    chosen = choose_variant(results, args.min_agreement, args.max_accuracy_drop)
+
+    metadata = {"inverse_label_maps": label_maps, "architecture": args.arch,
+                "benchmark": results, "recommended_backend": chosen}
+    (artifact_dir / "metadata.json").write_text(json.dumps(metadata, ensure_ascii=False, indent=2))
+    print(json.dumps({"ref": args.ref, "recommended_backend": chosen, "variants": results}, indent=2))
+
+    if args.upload:
+        upload_to_wandb(args.ref, artifact_dir, metadata)
+
+    if args.register:
+        from sqlmodel import Session
+        from database.database import engine
+
+        # Фиксируем ровно эту версию в локальном хранилище, чтобы записать её дайджест
+        store = ArtifactStore(settings.ARTIFACT_STORE_DIR, source=DirectorySource(args.out))
+        manifest = store.refresh(args.ref)
+        with Session(engine) as session:
+            rows = register_variants(session, args.ref, args.name or artifact_name, args.description,
+                                     args.cost, results, chosen, manifest.digest, manifest.label_map_version)
+        logging.info(f"Registered {len(rows)} variants of {args.ref}, active: {chosen}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,70 @@
+from typing import Any, Dict, List, Sequence
+
+import numpy as np
+import torch
+import torchvision.transforms as T
+
+from workers.model_registry import LabelMaps
+
+
+device = torch.device("cpu")
+
+image_size = (256, 256)
+mean = (0.4536, 0.4510, 0.3253)
+std = (0.2462, 0.2511, 0.2887)
+
+preprocess = T.Compose([
+        T.Resize(image_size),
+        T.ToTensor(),
+        T.Normalize(mean=mean, std=std)
+    ])
+
+normalize = T.Normalize(mean=mean, std=std)
+
+
+def preprocess_derivative(array: np.ndarray) -> torch.Tensor:
+    """Тензор (3, 256, 256) из уменьшенной при загрузке копии (uint8, H×W×3)"""
+    if array.shape[:2] != image_size:
+        raise ValueError(f"Derivative of shape {array.shape} does not match {image_size}")
+    x = torch.from_numpy(np.ascontiguousarray(array)).permute(2, 0, 1).float().div(255)
+    return normalize(x)
+
+
+def forward_batch(model: torch.jit.ScriptModule,
+                  tensors: Sequence[torch.Tensor]) -> Any:
+    """Один прямой проход модели по пачке изображений (3, 256, 256)"""
+    x = torch.stack(list(tensors)).to(device)
+    with torch.no_grad():
+        return model(x)  # ожидаем dict: head_name -> logits Tensor (N, C)
+
+
+def decode_outputs(out: Any, batch_size: int) -> List[Dict[str, Any]]:
+    """Разбирает выход модели на предсказания по каждому изображению пачки"""
+    preds: List[Dict[str, Any]] = [{} for _ in range(batch_size)]
+    # Если out — не dict, приводим к единственной голове
+    heads = out if isinstance(out, dict) else {"default": out}
+    for head_name, logits in heads.items():
+        if torch.is_tensor(logits):
+            # для классификации: argmax
+            values = logits.argmax(dim=1).tolist()
+        else:
+            values = [float(logits)] * batch_size
+        for row, val in zip(preds, values):
+            row[head_name] = val
+    return preds
+
+
+def to_readable(preds: Dict[str, Any], label_maps: LabelMaps) -> Dict[str, str]:
+    """Переводит индексы классов в метки по inverse_label_maps"""
+    return {h: label_maps[h][v] for h, v in preds.items()}
+
+
+def severity_from_extent(extent: float) -> str:
+    """Степень тяжести по проценту повреждения (ключ 'extent')"""
+    if 10 <= extent < 40:
+        return "low"
+    elif 40 <= extent < 70:
+        return "medium"
+    elif 70 <= extent <= 100:
+        return "high"
+    return "low"
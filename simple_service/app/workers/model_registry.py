@@ -0,0 +1,160 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Set, Tuple
+
+
+from database.config import get_settings
+from workers.artifact_store import store
+from workers.backends import backend_file, check_backend, load_backend, split_model_ref
+
+
+settings = get_settings()
+
+LabelMaps = Dict[str, Dict[int, str]]
+ModelEntry = Tuple[Any, LabelMaps]
+
+
+def load_model(artifact_path: str, artifact_store=None) -> ModelEntry:
+    """
+    Загружает модель и inverse_label_maps из локального хранилища артефактов.
+    artifact_path — ссылка 'entity/project/name:alias' или дайджест зафиксированной версии,
+    с необязательным '#<backend>' (см. workers/backends.py); по умолчанию — TorchScript.
+    """
+    artifact_path, backend = split_model_ref(artifact_path)
+    check_backend(backend)
+    manifest = (artifact_store or store).resolve(artifact_path)
+
+    # Загружаем label maps из metadata
+    raw = manifest.metadata["inverse_label_maps"]
+    label_maps = {
+        head: {int(k): v for k, v in mapping.items()}
+        for head, mapping in raw.items()
+    }
+
+    # Ищем файл варианта модели: *_scripted.pt, *_int8_scripted.pt или *.onnx
+    model_file = backend_file(manifest.files, backend)
+    if not model_file:
+        raise FileNotFoundError(f"No file for backend '{backend}' found in artifact {artifact_path}")
+
+    model = load_backend(backend, (artifact_store or store).path(manifest, model_file))
+    return model, label_maps
+
+
+def model_size_bytes(entry: ModelEntry) -> int:
+    """Оценивает объём памяти, занимаемый весами и буферами модели"""
+    model, _ = entry
+    size = getattr(model, "size_bytes", None)
+    if size is not None:
+        return size
+    return sum(t.numel() * t.element_size() for t in model.state_dict().values())
+
+
+class ModelRegistry:
+    """
+    Процессный LRU-кэш моделей, ключ — Models.artifact_path или дайджест артефакта.
+    Каждая модель загружается один раз на процесс воркера,
+    суммарный размер весов ограничен max_bytes.
+    """
+
+    def __init__(self, max_bytes: int,
+                 loader: Callable[[str], Any] = load_model,
+                 sizer: Callable[[Any], int] = model_size_bytes):
+        self.max_bytes = max_bytes
+        self._loader = loader
+        self._sizer = sizer
+        self._entries: "OrderedDict[str, Tuple[Any, int]]" = OrderedDict()
+        # Модели, загруженные супервизором до fork: общие для процессов, не вытесняются
+        self._pinned: Set[str] = set()
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.load_seconds = 0.0
+
+    @property
+    def used_bytes(self) -> int:
+        """Объём вытесняемых моделей, ограниченный max_bytes"""
+        return sum(size for key, (_, size) in self._entries.items() if key not in self._pinned)
+
+    @property
+    def pinned_bytes(self) -> int:
+        return sum(size for key, (_, size) in self._entries.items() if key in self._pinned)
+
+    def pin(self, artifact_path: str) -> Any:
+        """
+        Загружает модель и закрепляет её: она не вытесняется и не занимает max_bytes.
+        Супервизор закрепляет модели до fork, и их страницы остаются общими для процессов.
+        """
+        with self._lock:
+            entry = self.get(artifact_path)
+            self._pinned.add(artifact_path)
+            return entry
+
+    def get(self, artifact_path: str) -> Any:
+        """Возвращает модель из кэша, загружая её при промахе"""
+        with self._lock:
+            if artifact_path in self._entries:
+                self.hits += 1
+                self._entries.move_to_end(artifact_path)
+                return self._entries[artifact_path][0]
+
+            self.misses += 1
+            t0 = time.perf_counter()
+            entry = self._loader(artifact_path)
+            elapsed = time.perf_counter() - t0
+            self.load_seconds += elapsed
+
+            size = self._sizer(entry)
+            self._evict_for(size)
+            self._entries[artifact_path] = (entry, size)
+            logging.info(f"Model {artifact_path} loaded in {elapsed:.2f}s "
+                         f"({size / 2**20:.1f} MB), registry: {self.stats()}")
+            return entry
+
+    def _evict_for(self, size: int) -> None:
+        """Вытесняет давно не использованные модели, пока новая не поместится"""
+        if size > self.max_bytes:
+            logging.warning(f"Model of {size / 2**20:.1f} MB exceeds registry "
+                            f"limit of {self.max_bytes / 2**20:.1f} MB")
+        while self.used_bytes + size > self.max_bytes:
+            evicted = next((key for key in self._entries if key not in self._pinned), None)
+            if evicted is None:
+                break
+            del self._entries[evicted]
+            self.evictions += 1
+            logging.info(f"Evicted model {evicted} from registry")
+
+    def evict(self, artifact_path: str) -> None:
+        with self._lock:
+            self._pinned.discard(artifact_path)
+            if self._entries.pop(artifact_path, None) is not None:
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._pinned.clear()
+
+    def __contains__(self, artifact_path: str) -> bool:
+        return artifact_path in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, Any]:
+        """Счётчики попаданий, промахов и времени загрузки"""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "load_seconds": round(self.load_seconds, 3),
+            "models": len(self._entries),
+            "used_mb": round(self.used_bytes / 2**20, 1),
+            "pinned_mb": round(self.pinned_bytes / 2**20, 1),
+        }
+
+
+# Один реестр на процесс воркера
+registry = ModelRegistry(max_bytes=settings.MODEL_CACHE_MAX_MB * 2**20)
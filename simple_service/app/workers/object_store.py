@@ -0,0 +1,123 @@
+import logging
+import os
+import tempfile
+from pathlib import Path
+from typing import Iterator, Optional
+
+import urllib3
+from minio import Minio
+
+from database.config import get_settings
+
+
+settings = get_settings()
+
+
+def make_minio_client(pool_size: int, timeout: float, retries: int) -> Minio:
+    """MinIO-клиент с пулом keep-alive соединений, таймаутами и ретраями"""
+    http_client = urllib3.PoolManager(
+        maxsize=pool_size,
+        block=False,
+        timeout=urllib3.Timeout(connect=min(timeout, 5), read=timeout),
+        retries=urllib3.Retry(
+            total=retries,
+            backoff_factor=0.2,
+            status_forcelist=[500, 502, 503, 504],
+        ),
+    )
+    return Minio(
+        endpoint=settings.MINIO_ENDPOINT,
+        access_key=settings.MINIO_ACCESS_KEY,
+        secret_key=settings.MINIO_SECRET_KEY,
+        secure=(settings.MINIO_SECURE or "false").lower() == "true",
+        http_client=http_client,
+    )
+
+
+class ObjectStore:
+    """
+    Чтение объектов бакета через общий MinIO-клиент (с учётными данными, без публичных URL).
+    При заданном cache_dir работает как read-through кэш на диске,
+    вытесняя давно не читавшиеся объекты сверх cache_max_bytes.
+    """
+
+    def __init__(self, client: Minio, bucket_name: str,
+                 cache_dir: Optional[str] = None, cache_max_bytes: int = 0):
+        self.client = client
+        self.bucket_name = bucket_name
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        self.cache_max_bytes = cache_max_bytes
+        self.hits = 0
+        self.misses = 0
+
+    def _cache_path(self, object_name: str) -> Path:
+        return self.cache_dir / object_name.replace("/", "__")
+
+    def get(self, object_name: str) -> bytes:
+        """Содержимое объекта целиком, через кэш на диске"""
+        if self.cache_dir is not None:
+            path = self._cache_path(object_name)
+            try:
+                data = path.read_bytes()
+                os.utime(path)
+                self.hits += 1
+                return data
+            except FileNotFoundError:
+                self.misses += 1
+
+        data = b"".join(self.stream(object_name))
+        if self.cache_dir is not None:
+            self._cache_put(object_name, data)
+        return data
+
+    def get_range(self, object_name: str, offset: int, length: int) -> bytes:
+        """Часть объекта (HTTP Range), мимо кэша"""
+        response = self.client.get_object(self.bucket_name, object_name,
+                                          offset=offset, length=length)
+        try:
+            return response.read()
+        finally:
+            response.close()
+            response.release_conn()
+
+    def stream(self, object_name: str, chunk_size: int = 256 * 1024) -> Iterator[bytes]:
+        """Потоковое чтение объекта; соединение возвращается в пул"""
+        response = self.client.get_object(self.bucket_name, object_name)
+        try:
+            yield from response.stream(chunk_size)
+        finally:
+            response.close()
+            response.release_conn()
+
+    def _cache_put(self, object_name: str, data: bytes) -> None:
+        if len(data) > self.cache_max_bytes:
+            return
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            with tempfile.NamedTemporaryFile(dir=self.cache_dir, delete=False, suffix=".tmp") as tmp:
+                tmp.write(data)
+            os.replace(tmp.name, self._cache_path(object_name))
+            self._evict()
+        except OSError as e:
+            logging.warning(f"Object cache write failed for {object_name}: {e}")
+
+    def _evict(self) -> None:
+        """Удаляет самые давно прочитанные объекты, пока кэш не уложится в лимит"""
+        entries = [(p.stat().st_mtime, p.stat().st_size, p)
+                   for p in self.cache_dir.iterdir() if p.suffix != ".tmp"]
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.cache_max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+
+
+object_store = ObjectStore(
+    client=make_minio_client(pool_size=settings.MINIO_POOL_SIZE,
+                             timeout=settings.MINIO_TIMEOUT_SECONDS,
+                             retries=settings.MINIO_RETRIES),
+    bucket_name=settings.MINIO_BUCKET_NAME,
+    cache_dir=settings.OBJECT_CACHE_DIR,
+    cache_max_bytes=settings.OBJECT_CACHE_MAX_MB * 2**20,
+)
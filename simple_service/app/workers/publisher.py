@@ -0,0 +1,170 @@
+import json
+import logging
+import queue
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import pika
+from pika.exceptions import AMQPError
+
+from database.config import get_settings
+from workers.connect import connect_to_rabbitmq
+from workers.routing import declare_model_queue, model_slug, routing_key as model_routing_key
+
+
+settings = get_settings()
+
+
+class _PooledChannel:
+    """Соединение с одним каналом в режиме publisher confirms"""
+
+    def __init__(self):
+        self.connection: Optional[pika.BlockingConnection] = None
+        self.channel = None
+
+    @property
+    def is_open(self) -> bool:
+        return (self.connection is not None and self.connection.is_open
+                and self.channel is not None and self.channel.is_open)
+
+    def open(self) -> None:
+        self.close()
+        self.connection = connect_to_rabbitmq()
+        self.channel = self.connection.channel()
+        self.channel.confirm_delivery()
+
+    def probe(self) -> bool:
+        """Обрабатывает heartbeat простаивающего соединения; False — соединение потеряно"""
+        if not self.is_open:
+            return False
+        try:
+            self.connection.process_data_events(time_limit=0)
+            return self.is_open
+        except AMQPError:
+            return False
+
+    def close(self) -> None:
+        try:
+            if self.connection is not None and self.connection.is_open:
+                self.connection.close()
+        except AMQPError:
+            pass
+        self.connection = None
+        self.channel = None
+
+
+class RabbitPublisher:
+    """
+    Долгоживущий публикатор для API: пул соединений с подтверждёнными каналами.
+    Exchange задач и очереди моделей объявляются при старте, потерянные соединения
+    переоткрываются при выдаче из пула. BlockingConnection не потокобезопасен,
+    поэтому каждый канал в пуле в каждый момент времени используется только одним потоком.
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self._pool: "queue.Queue[_PooledChannel]" = queue.Queue()
+        self._model_queues = set()
+        self._lock = threading.Lock()
+        self._started = False
+
+    def start(self, model_slugs: Iterable[str] = ()) -> None:
+        with self._lock:
+            if not self._started:
+                for _ in range(self.size):
+                    self._pool.put(_PooledChannel())
+                self._started = True
+                logging.info(f"RabbitMQ publisher pool started ({self.size} channels)")
+        slugs = [slug for slug in model_slugs if slug not in self._model_queues]
+        if not slugs:
+            return
+        try:
+            with self.channel() as ch:
+                for slug in slugs:
+                    self._declare_model(ch, slug)
+            logging.info(f"Declared task queues of models: {', '.join(slugs)}")
+        except AMQPError as e:
+            # Брокер недоступен — очереди объявятся при первой публикации
+            logging.warning(f"Failed to declare model queues at startup: {e!r}")
+
+    def close(self) -> None:
+        with self._lock:
+            while not self._pool.empty():
+                self._pool.get_nowait().close()
+            self._started = False
+
+    def _declare_model(self, channel, slug: str) -> None:
+        """
+        Очередь модели, добавленной после старта API, объявляется при первой публикации:
+        задачи копятся в ней, даже если воркеров этой модели ещё нет
+        """
+        if slug in self._model_queues:
+            return
+        declare_model_queue(channel, slug)
+        self._model_queues.add(slug)
+
+    @contextmanager
+    def channel(self) -> Iterator[Any]:
+        """Выдаёт живой канал из пула и возвращает его обратно"""
+        self.start()
+        pooled = self._pool.get()
+        try:
+            if not pooled.probe():
+                logging.info("Publisher channel is closed, reconnecting to RabbitMQ")
+                pooled.open()
+            yield pooled.channel
+        except AMQPError:
+            # Соединение сломалось во время публикации — переоткроем при следующей выдаче
+            pooled.close()
+            raise
+        finally:
+            self._pool.put(pooled)
+
+    def publish_batch(self, messages: List[Tuple[str, Dict[str, Any]]],
+                      retries: int = 1, exchange: str = "",
+                      priority: Optional[int] = None,
+                      prepare: Optional[Callable[[Any], None]] = None) -> None:
+        """
+        Публикует сообщения (routing_key, payload) через один канал из пула.
+        В режиме confirms basic_publish BlockingConnection ждёт подтверждения брокера
+        для каждого сообщения. prepare(channel) выполняется на том же канале перед
+        публикацией (например, объявление очереди).
+        """
+        properties = pika.BasicProperties(delivery_mode=2, content_type="application/json",
+                                          priority=priority)
+        sent = 0
+        for attempt in range(retries + 1):
+            try:
+                with self.channel() as ch:
+                    if prepare is not None:
+                        prepare(ch)
+                    for routing_key, payload in messages[sent:]:
+                        ch.basic_publish(exchange=exchange, routing_key=routing_key,
+                                         body=json.dumps(payload), properties=properties,
+                                         mandatory=True)
+                        sent += 1
+                return
+            except AMQPError as e:
+                if attempt == retries:
+                    raise
+                logging.warning(f"Publish failed ({e!r}), retrying on a fresh connection")
+
+    def publish(self, routing_key: str, payload: Dict[str, Any]) -> None:
+        self.publish_batch([(routing_key, payload)])
+
+    def publish_task(self, artifact_path: str, payload: Dict[str, Any],
+                     priority: Optional[int] = None) -> None:
+        """Публикует задачу в очередь её модели через topic exchange — одна выдача канала"""
+        slug = model_slug(artifact_path)
+        self.publish_batch([(model_routing_key(artifact_path), payload)],
+                           exchange=settings.RMQ_TASK_EXCHANGE, priority=priority,
+                           prepare=lambda ch: self._declare_model(ch, slug))
+
+
+publisher = RabbitPublisher(size=settings.RMQ_PUBLISHER_POOL_SIZE)
+
+
+def get_publisher() -> RabbitPublisher:
+    """Зависимость FastAPI для публикации задач"""
+    return publisher
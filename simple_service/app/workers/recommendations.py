@@ -0,0 +1,106 @@
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Set, Tuple
+
+from sqlmodel import Session, func, select
+
+from database.config import get_settings
+from models.recommendation import DamageType, GrowthStage, Recommendation, SeverityLevel
+from services.crud.service import RECOMMENDATION_NOT_FOUND
+
+
+settings = get_settings()
+
+RecommendationKey = Tuple[DamageType, GrowthStage, SeverityLevel]
+
+
+def recommendation_key(damage_type: str, growth_stage: str,
+                       severity: str) -> Optional[RecommendationKey]:
+    """Ключ матрицы рекомендаций; None — метка вне справочников"""
+    try:
+        return DamageType(damage_type), GrowthStage(growth_stage), SeverityLevel(severity)
+    except ValueError:
+        return None
+
+
+class RecommendationIndex:
+    """
+    Таблица recommendations целиком в памяти воркера.
+    Раз в refresh_seconds воркер сверяет дешёвую метку версии таблицы
+    (число строк, max(id), max(updated_at)) и перечитывает матрицу только
+    если метка изменилась; между проверками запросов в БД нет.
+    Правки в обход ORM должны сами обновлять updated_at.
+    """
+
+    def __init__(self, refresh_seconds: float,
+                 clock: Callable[[], float] = time.monotonic):
+        self.refresh_seconds = refresh_seconds
+        self.clock = clock
+        self._entries: Dict[RecommendationKey, Tuple[str, Optional[str]]] = {}
+        self._checked_at: Optional[float] = None
+        self._version: Optional[Tuple[Any, ...]] = None
+        self._missing: Set[Tuple[str, str, str]] = set()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def version(session: Session) -> Tuple[Any, ...]:
+        """Метка версии: меняется при вставке, удалении и правке строк через ORM"""
+        return tuple(session.exec(
+            select(func.count(Recommendation.id), func.max(Recommendation.id),
+                   func.max(Recommendation.updated_at))
+        ).one())
+
+    def load(self, session: Session) -> None:
+        version = self.version(session)
+        entries = {}
+        for rec in session.exec(select(Recommendation)).all():
+            key = recommendation_key(rec.damage_type, rec.growth_stage, rec.severity)
+            if key is not None:
+                entries[key] = (rec.recommendation, rec.source)
+        with self._lock:
+            self._entries = entries
+            self._version = version
+            self._checked_at = self.clock()
+            self._missing.clear()
+        logging.info(f"Loaded {len(entries)} recommendations")
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._checked_at = None
+            self._version = None
+
+    def refresh(self, session: Session) -> None:
+        """Перечитывает матрицу, если с прошлой проверки изменилась метка версии"""
+        if self._version is not None and self.version(session) == self._version:
+            with self._lock:
+                self._checked_at = self.clock()
+            return
+        self.load(session)
+
+    def _is_stale(self) -> bool:
+        return (self._checked_at is None
+                or self.clock() - self._checked_at >= self.refresh_seconds)
+
+    def lookup(self, damage_type: str, growth_stage: str, severity: str,
+               session: Session) -> Tuple[str, Optional[str]]:
+        """Текст рекомендации и источник; сессия нужна только для перечитывания таблицы"""
+        if self._is_stale():
+            self.refresh(session)
+        key = recommendation_key(damage_type, growth_stage, severity)
+        found = self._entries.get(key) if key is not None else None
+        if found is not None:
+            return found
+
+        combination = (damage_type, growth_stage, severity)
+        if combination not in self._missing:
+            self._missing.add(combination)
+            logging.warning(f"No recommendation for damage={damage_type}, "
+                            f"growth_stage={growth_stage}, severity={severity}")
+        return RECOMMENDATION_NOT_FOUND, None
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+recommendation_index = RecommendationIndex(settings.RECOMMENDATION_REFRESH_SECONDS)
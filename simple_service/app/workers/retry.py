@@ -0,0 +1,209 @@
+import argparse
+import json
+import logging
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Optional
+
+import pika
+from pydantic import ValidationError
+
+from database.config import get_settings
+
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+settings = get_settings()
+
+# Метаданные повторов в заголовках сообщения
+ATTEMPTS_HEADER = "x-attempts"
+LAST_ERROR_HEADER = "x-last-error"
+FIRST_FAILED_HEADER = "x-first-failed-at"
+SOURCE_QUEUE_HEADER = "x-source-queue"
+REPLAYED_HEADER = "x-replayed"
+
+MAX_ERROR_LENGTH = 500
+
+
+class PermanentError(Exception):
+    """Повтор не поможет (нет изображения, битое сообщение): сразу в очередь недоставленных"""
+
+
+# Ошибки, после которых сообщение не повторяется
+PERMANENT_ERRORS = (PermanentError, json.JSONDecodeError, ValidationError)
+
+
+class RetryPolicy:
+    """
+    Ограниченные повторы через очереди задержки. Неудачное сообщение переопубликуется
+    в <queue>.retry.<n> с TTL base_delay_ms * 2^(n-1); по истечении TTL брокер
+    возвращает его в исходную очередь (dead-letter на default exchange). Своя очередь
+    на каждую ступень задержки — у всех сообщений в ней одинаковый TTL, и короткие
+    задержки не ждут за длинными. После max_attempts попыток — в <queue>.dlq.
+    """
+
+    def __init__(self, queue: str, max_attempts: int, base_delay_ms: int):
+        self.queue = queue
+        self.max_attempts = max_attempts
+        self.base_delay_ms = base_delay_ms
+
+    @property
+    def dead_letter_queue(self) -> str:
+        return f"{self.queue}.dlq"
+
+    def retry_queue(self, attempt: int) -> str:
+        return f"{self.queue}.retry.{attempt}"
+
+    def delay_ms(self, attempt: int) -> int:
+        return self.base_delay_ms * 2 ** (attempt - 1)
+
+    def declare(self, channel) -> None:
+        """Объявляет очереди задержки и очередь недоставленных для исходной очереди"""
+        for attempt in range(1, self.max_attempts):
+            channel.queue_declare(queue=self.retry_queue(attempt), durable=True, arguments={
+                "x-message-ttl": self.delay_ms(attempt),
+                "x-dead-letter-exchange": "",
+                "x-dead-letter-routing-key": self.queue,
+            })
+        channel.queue_declare(queue=self.dead_letter_queue, durable=True)
+
+    def fail(self, channel, method, properties, body: bytes, error: Exception) -> bool:
+        """
+        Откладывает повтор сообщения или переносит его в очередь недоставленных,
+        после чего подтверждает исходную доставку. True — сообщение ушло в DLQ.
+        """
+        headers = dict((properties.headers if properties else None) or {})
+        attempts = int(headers.get(ATTEMPTS_HEADER, 0)) + 1
+        headers[ATTEMPTS_HEADER] = attempts
+        headers[LAST_ERROR_HEADER] = f"{type(error).__name__}: {error}"[:MAX_ERROR_LENGTH]
+        headers.setdefault(FIRST_FAILED_HEADER, datetime.now(timezone.utc).isoformat())
+        headers.setdefault(SOURCE_QUEUE_HEADER, self.queue)
+
+        dead = attempts >= self.max_attempts or isinstance(error, PERMANENT_ERRORS)
+        target = self.dead_letter_queue if dead else self.retry_queue(attempts)
+        channel.basic_publish(
+            exchange="",
+            routing_key=target,
+            body=body,
+            properties=pika.BasicProperties(
+                delivery_mode=2,
+                content_type=properties.content_type if properties else None,
+                priority=properties.priority if properties else None,
+                headers=headers,
+            ),
+        )
+        channel.basic_ack(method.delivery_tag)
+        if dead:
+            logging.error(f"Message from '{self.queue}' dead-lettered after {attempts} attempt(s): {error}")
+        else:
+            logging.warning(f"Message from '{self.queue}' failed (attempt {attempts}), "
+                            f"retry in {self.delay_ms(attempts)} ms: {error}")
+        return dead
+
+    def fail_or_nack(self, channel, method, properties, body: bytes, error: Exception) -> bool:
+        """
+        fail(), но если повтор не удалось опубликовать (канал закрыт, публикация
+        не маршрутизирована), доставка возвращается в очередь через basic_nack,
+        а не висит неподтверждённой до разрыва соединения
+        """
+        try:
+            return self.fail(channel, method, properties, body, error)
+        except Exception as e:
+            logging.error(f"Failed to schedule retry: {e}", exc_info=True)
+            channel.basic_nack(method.delivery_tag)
+            return False
+
+
+def replay(channel, policy: RetryPolicy, limit: Optional[int] = None,
+           accept: Optional[Callable[[bytes], bool]] = None) -> int:
+    """
+    Переносит сообщения из DLQ обратно в исходную очередь со сброшенным счётчиком попыток.
+    accept(body) готовит сообщение к повтору (например, возвращает задаче статус);
+    отклонённые им сообщения остаются в DLQ. Возвращает число перенесённых.
+    """
+    replayed, skipped = 0, []
+    while limit is None or replayed + len(skipped) < limit:
+        method, properties, body = channel.basic_get(queue=policy.dead_letter_queue, auto_ack=False)
+        if method is None:
+            break
+        if accept is not None and not accept(body):
+            skipped.append(method.delivery_tag)
+            continue
+        headers = dict(properties.headers or {})
+        for key in (ATTEMPTS_HEADER, LAST_ERROR_HEADER, FIRST_FAILED_HEADER):
+            headers.pop(key, None)
+        headers[REPLAYED_HEADER] = int(headers.get(REPLAYED_HEADER, 0)) + 1
+        channel.basic_publish(
+            exchange="",
+            routing_key=policy.queue,
+            body=body,
+            properties=pika.BasicProperties(delivery_mode=2, content_type=properties.content_type,
+                                            priority=properties.priority, headers=headers),
+        )
+        channel.basic_ack(method.delivery_tag)
+        replayed += 1
+    # Неподтверждённые сообщения возвращаются в DLQ только сейчас, чтобы не прочитать их повторно
+    for delivery_tag in skipped:
+        channel.basic_nack(delivery_tag, requeue=True)
+    if skipped:
+        logging.warning(f"{len(skipped)} message(s) left in '{policy.dead_letter_queue}'")
+    return replayed
+
+
+def make_policy(queue: str) -> RetryPolicy:
+    return RetryPolicy(queue, max_attempts=settings.RMQ_MAX_ATTEMPTS,
+                       base_delay_ms=settings.RMQ_RETRY_BASE_MS)
+
+
+def _reopen_task(body: bytes) -> bool:
+    from sqlmodel import Session
+    from database.database import engine
+    from services.crud import service as PredictService
+
+    msg: Dict[str, Any] = json.loads(body)
+    with Session(engine) as session:
+        return PredictService.reopen_task(msg["task_id"], session)
+
+
+def _reopen_enrichment(body: bytes) -> bool:
+    from sqlmodel import Session
+    from database.database import engine
+    from models.prediction import Predictions
+
+    msg: Dict[str, Any] = json.loads(body)
+    with Session(engine) as session:
+        pred = session.get(Predictions, msg["prediction_id"])
+        if pred is None:
+            return False
+        pred.enrichment_status = "pending"
+        session.add(pred)
+        session.commit()
+    return True
+
+
+def main(argv=None):
+    """python -m workers.retry replay [--queue NAME] [--limit N]"""
+    parser = argparse.ArgumentParser(description="Dead-letter queues of the workers")
+    sub = parser.add_subparsers(dest="command", required=True)
+    replay_cmd = sub.add_parser("replay", help="move dead-lettered messages back to their queue")
+    replay_cmd.add_argument("--queue", default=settings.RMQ_QUEUE,
+                            help="source queue, e.g. <RMQ_QUEUE>.<model> or the enrichment queue")
+    replay_cmd.add_argument("--limit", type=int)
+    args = parser.parse_args(argv)
+
+    from workers.connect import connect_to_rabbitmq
+
+    policy = make_policy(args.queue)
+    accept = _reopen_enrichment if args.queue == settings.RMQ_ENRICH_QUEUE else _reopen_task
+    connection = connect_to_rabbitmq()
+    try:
+        channel = connection.channel()
+        policy.declare(channel)
+        replayed = replay(channel, policy, limit=args.limit, accept=accept)
+    finally:
+        connection.close()
+    logging.info(f"Replayed {replayed} message(s) from '{policy.dead_letter_queue}' to '{policy.queue}'")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
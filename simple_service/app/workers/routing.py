@@ -0,0 +1,82 @@
+import collections
+import re
+from typing import Deque, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from database.config import get_settings
+
+
+settings = get_settings()
+
+# Задачи классификации публикуются в topic exchange с ключом task.<модель>
+ROUTING_PREFIX = "task"
+
+
+def model_slug(artifact_path: str) -> str:
+    """Имя модели из пути артефакта: 'entity/project/resnet18_bsl_cpu:latest' -> 'resnet18_bsl_cpu'"""
+    name = artifact_path.rsplit("/", 1)[-1].split(":", 1)[0]
+    return re.sub(r"[^A-Za-z0-9_-]", "_", name) or "default"
+
+
+def routing_key(artifact_path: str) -> str:
+    return f"{ROUTING_PREFIX}.{model_slug(artifact_path)}"
+
+
+def model_queue(slug: str) -> str:
+    """Очередь задач одной модели"""
+    return f"{settings.RMQ_QUEUE}.{slug}"
+
+
+def declare_model_queue(channel, slug: str) -> str:
+    """
+    Объявляет exchange и очередь модели с приоритетами, привязанную к task.<модель>.
+    Идемпотентно: API и воркеры объявляют одну и ту же топологию.
+    """
+    channel.exchange_declare(exchange=settings.RMQ_TASK_EXCHANGE, exchange_type="topic", durable=True)
+    queue = model_queue(slug)
+    channel.queue_declare(queue=queue, durable=True,
+                          arguments={"x-max-priority": settings.RMQ_MAX_PRIORITY})
+    channel.queue_bind(queue=queue, exchange=settings.RMQ_TASK_EXCHANGE,
+                       routing_key=f"{ROUTING_PREFIX}.{slug}")
+    return queue
+
+
+def selected_models(artifact_paths: Iterable[str], worker_models: Optional[str]) -> List[str]:
+    """
+    Модели, которые обслуживает воркер: WORKER_MODELS — имена через запятую,
+    пусто или '*' — все модели из реестра
+    """
+    available = sorted({model_slug(path) for path in artifact_paths})
+    if not worker_models or worker_models.strip() == "*":
+        return available
+    return [name.strip() for name in worker_models.split(",") if name.strip()]
+
+
+Delivery = Tuple[object, object, bytes]
+
+
+def consume_many(connection, channel, queues: Iterable[str],
+                 inactivity_timeout: float) -> Tuple[Dict[str, str], Iterator[Delivery]]:
+    """
+    Как channel.consume, но сразу из нескольких очередей: доставки складываются
+    в буфер, при простое дольше inactivity_timeout отдаётся (None, None, None).
+    Возвращает {consumer_tag: очередь} и поток доставок.
+    """
+    buffer: Deque[Delivery] = collections.deque()
+
+    def on_message(ch, method, properties, body):
+        buffer.append((method, properties, body))
+
+    consumer_tags = {channel.basic_consume(queue=queue, on_message_callback=on_message,
+                                           auto_ack=False): queue
+                     for queue in queues}
+
+    def events() -> Iterator[Delivery]:
+        while True:
+            if not buffer:
+                connection.process_data_events(time_limit=inactivity_timeout)
+            if buffer:
+                yield buffer.popleft()
+            else:
+                yield None, None, None
+
+    return consumer_tags, events()
@@ -0,0 +1,180 @@
+import logging
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from typing import Callable, Optional, Tuple
+
+import ee
+import joblib
+import numpy as np
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session, select
+
+from database.config import get_settings
+from database.database import engine
+from models.sentinel_cache import SentinelGrowthCache
+from workers.artifact_store import store
+
+
+settings = get_settings()
+
+class_labels_growth = ["S", "V", "F", "M"]  # Seedling, Vegetative, Flowering, Maturity
+
+
+@lru_cache()
+def load_growth_kmeans(artifact_path: str):
+    """KMeans-модель стадии роста из локального хранилища артефактов, один раз на процесс"""
+    manifest = store.resolve(artifact_path)
+    # Ищем .pkl или .joblib файл
+    model_file = manifest.find(".pkl", ".joblib")
+    if not model_file:
+        raise FileNotFoundError(f"No .pkl or .joblib model found in artifact {artifact_path}")
+    return joblib.load(store.path(manifest, model_file))
+
+
+def quantize_cell(latitude: float, longitude: float, decimals: int) -> str:
+    """Ячейка сетки координат: 4 знака после запятой — около 10 м"""
+    return f"{round(latitude, decimals):.{decimals}f}:{round(longitude, decimals):.{decimals}f}"
+
+
+def date_window(now: datetime, days: int) -> Tuple[str, str]:
+    """Окно дат для медианы Sentinel-1, привязанное к календарному дню"""
+    end_date = now.date()
+    start_date = end_date - timedelta(days=days)
+    return start_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d')
+
+
+class EarthEngineBackend:
+    """Значение VH Sentinel-1 для точки через Google Earth Engine"""
+
+    def __init__(self, service_account: str, key_file: str):
+        self.service_account = service_account
+        self.key_file = key_file
+        self._initialized = False
+
+    def _initialize(self) -> None:
+        # Подключаемся к Google Earth Engine один раз на процесс
+        if not self._initialized:
+            credentials = ee.ServiceAccountCredentials(self.service_account, self.key_file)
+            ee.Initialize(credentials)
+            self._initialized = True
+
+    def fetch_vh(self, latitude: float, longitude: float,
+                 start_date: str, end_date: str) -> Optional[float]:
+        self._initialize()
+        point = ee.Geometry.Point([longitude, latitude])
+
+        # Получаем данные Sentinel-1 для точки
+        sentinel1 = ee.ImageCollection('COPERNICUS/S1_GRD') \
+            .filterBounds(point) \
+            .filterDate(start_date, end_date) \
+            .select(['VH']) \
+            .median()
+
+        # Извлекаем значения для точки
+        sentinel_data = sentinel1.reduceRegion(
+            reducer=ee.Reducer.mean(),
+            geometry=point,
+            scale=10,
+            maxPixels=1e9
+        ).getInfo()
+        return sentinel_data.get('VH')
+
+
+class GrowthStageLookup:
+    """
+    Стадия роста по Sentinel-1 с персистентным кэшем в Postgres.
+    Ключ — ячейка округлённых координат и окно дат, записи живут ttl,
+    ответы без данных — miss_ttl;
+    повторные запросы по тому же участку в тот же день не ходят в Earth Engine.
+    """
+
+    def __init__(self, backend, classifier_loader: Callable[[], object],
+                 session_factory: Callable[[], Session] = lambda: Session(engine),
+                 ttl: timedelta = timedelta(hours=24),
+                 miss_ttl: timedelta = timedelta(minutes=30),
+                 decimals: int = 4, window_days: int = 10):
+        self.backend = backend
+        self.classifier_loader = classifier_loader
+        self.session_factory = session_factory
+        self.ttl = ttl
+        self.miss_ttl = miss_ttl
+        self.decimals = decimals
+        self.window_days = window_days
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, latitude: float, longitude: float,
+               now: Optional[datetime] = None) -> Tuple[Optional[float], str]:
+        """Возвращает (VH, стадия роста); 'unknown', если данных нет"""
+        now = now or datetime.now(timezone.utc)
+        cell = quantize_cell(latitude, longitude, self.decimals)
+        start_date, end_date = date_window(now, self.window_days)
+
+        with self.session_factory() as session:
+            cached = session.exec(
+                select(SentinelGrowthCache).where(
+                    SentinelGrowthCache.cell == cell,
+                    SentinelGrowthCache.window_end == end_date,
+                    SentinelGrowthCache.expires_at > now,
+                )
+            ).first()
+            if cached:
+                self.hits += 1
+                logging.info(f"Sentinel-1 cache hit for cell {cell}, window {start_date}..{end_date}")
+                return cached.vh, cached.growth_stage
+
+        # Запрос в Earth Engine идёт секунды — соединение с БД на это время не держим
+        self.misses += 1
+        vh, stage = self._compute(latitude, longitude, start_date, end_date)
+        # Пустой ответ часто временный (снимок ещё не обработан) — кэшируем его ненадолго
+        ttl = self.ttl if vh is not None else self.miss_ttl
+
+        with self.session_factory() as session:
+            # Просроченную запись по этому ключу заменяем новой
+            stale = session.exec(
+                select(SentinelGrowthCache).where(
+                    SentinelGrowthCache.cell == cell,
+                    SentinelGrowthCache.window_end == end_date,
+                )
+            ).first()
+            if stale:
+                session.delete(stale)
+                session.flush()
+            session.add(SentinelGrowthCache(
+                cell=cell, window_start=start_date, window_end=end_date,
+                vh=vh, growth_stage=stage, expires_at=now + ttl,
+            ))
+            try:
+                session.commit()
+            except IntegrityError:
+                # Параллельный воркер уже записал этот ключ
+                session.rollback()
+        return vh, stage
+
+    def _compute(self, latitude: float, longitude: float,
+                 start_date: str, end_date: str) -> Tuple[Optional[float], str]:
+        vh = self.backend.fetch_vh(latitude, longitude, start_date, end_date)
+
+        # Подготавливаем данные для модели (пример признаков)
+        if vh is None:
+            logging.warning("Failed to get Sentinel-1 data")
+            return None, "unknown"
+
+        # Создаем одномерный признак для модели
+        features_growth = np.array([[vh]])
+
+        # Получаем предсказание
+        growth_prediction = self.classifier_loader().predict(features_growth)[0]
+        predicted_growth_stage = class_labels_growth[growth_prediction]
+        logging.info(f"Predicted growth stage: {predicted_growth_stage}")
+        return vh, predicted_growth_stage
+
+
+growth_lookup = GrowthStageLookup(
+    backend=EarthEngineBackend(settings.EE_SERVICE_ACCOUNT, settings.EE_KEY_FILE),
+    classifier_loader=lambda: load_growth_kmeans(settings.GROWTH_KMEANS_ARTIFACT),
+    ttl=timedelta(hours=settings.SENTINEL_CACHE_TTL_HOURS),
+    miss_ttl=timedelta(minutes=settings.SENTINEL_MISS_TTL_MINUTES),
+    decimals=settings.SENTINEL_CELL_DECIMALS,
+    window_days=settings.SENTINEL_WINDOW_DAYS,
+)
@@ -0,0 +1,244 @@
+import functools
+import gc
+import logging
+import math
+import os
+import signal
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import torch
+
+from database.config import get_settings
+
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+settings = get_settings()
+
+CGROUP_CPU_MAX = "/sys/fs/cgroup/cpu.max"
+
+
+def cgroup_cpu_limit(path: str = CGROUP_CPU_MAX) -> Optional[float]:
+    """Квота CPU контейнера (cgroup v2, 'cpus:' в compose) в ядрах; None — без квоты"""
+    try:
+        quota, period = Path(path).read_text().split()[:2]
+    except (OSError, ValueError):
+        return None
+    if quota == "max":
+        return None
+    return int(quota) / int(period)
+
+
+def available_cores() -> List[int]:
+    """Ядра, на которых процессу разрешено работать, с учётом квоты CPU контейнера"""
+    if hasattr(os, "sched_getaffinity"):
+        cores = sorted(os.sched_getaffinity(0))
+    else:
+        cores = list(range(os.cpu_count() or 1))
+    limit = cgroup_cpu_limit()
+    if limit:
+        cores = cores[:max(1, math.ceil(limit))]
+    return cores
+
+
+def split_cores(cores: List[int], processes: int) -> List[List[int]]:
+    """
+    Делит ядра между процессами непрерывными участками (соседние ядра делят кэш).
+    Если процессов больше, чем ядер, каждому достаётся одно ядро по кругу.
+    """
+    if processes >= len(cores):
+        return [[cores[i % len(cores)]] for i in range(processes)]
+    size, extra = divmod(len(cores), processes)
+    chunks, start = [], 0
+    for i in range(processes):
+        end = start + size + (1 if i < extra else 0)
+        chunks.append(cores[start:end])
+        start = end
+    return chunks
+
+
+def pin(cores: List[int]) -> None:
+    """Привязывает текущий процесс к ядрам и выравнивает по ним пул потоков torch"""
+    if hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cores)
+    torch.set_num_threads(len(cores))
+
+
+@dataclass
+class Child:
+    """Слот дочернего процесса: его ядра и история перезапусков"""
+    index: int
+    cores: List[int]
+    pid: Optional[int] = None
+    started_at: float = 0.0
+    failures: int = 0
+    restart_at: Optional[float] = None
+
+
+class Supervisor:
+    """
+    Запускает процессы инференса через fork, по процессу на набор ядер, и перезапускает
+    упавшие. Подряд идущие быстрые падения откладывают перезапуск экспоненциально
+    (restart_delay * 2^(n-1), не дольше max_restart_delay); процесс, проработавший
+    stable_seconds, считается здоровым, и счётчик сбрасывается.
+    """
+
+    def __init__(self, target: Callable[[int, List[int]], None], core_sets: List[List[int]],
+                 restart_delay: float = 1.0, max_restart_delay: float = 30.0,
+                 stable_seconds: float = 60.0, clock: Callable[[], float] = time.monotonic):
+        self.target = target
+        self.children = [Child(index=i, cores=cores) for i, cores in enumerate(core_sets)]
+        self.restart_delay = restart_delay
+        self.max_restart_delay = max_restart_delay
+        self.stable_seconds = stable_seconds
+        self.clock = clock
+        self.stopping = False
+        self.restarts = 0
+
+    def start(self) -> None:
+        for child in self.children:
+            self._spawn(child)
+
+    def _spawn(self, child: Child) -> None:
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                signal.signal(signal.SIGTERM, signal.SIG_DFL)
+                signal.signal(signal.SIGINT, signal.SIG_DFL)
+                pin(child.cores)
+                self.target(child.index, child.cores)
+            except BaseException:
+                logging.exception(f"Worker process {child.index} crashed")
+                code = 1
+            finally:
+                # Без выхода интерпретатора: atexit-обработчики и буферы принадлежат родителю
+                os._exit(code)
+        child.pid = pid
+        child.started_at = self.clock()
+        child.restart_at = None
+        logging.info(f"Worker process {child.index} started: pid {pid}, cores {child.cores}")
+
+    def _by_pid(self) -> Dict[int, Child]:
+        return {child.pid: child for child in self.children if child.pid is not None}
+
+    def _exited(self, child: Child, status: int) -> None:
+        code = os.waitstatus_to_exitcode(status)
+        now = self.clock()
+        child.pid = None
+        if self.stopping:
+            return
+        if now - child.started_at >= self.stable_seconds:
+            child.failures = 0
+        child.failures += 1
+        delay = min(self.max_restart_delay, self.restart_delay * 2 ** (child.failures - 1))
+        child.restart_at = now + delay
+        reason = f"signal {-code}" if code < 0 else f"code {code}"
+        logging.error(f"Worker process {child.index} exited with {reason}, restart in {delay:.1f}s")
+
+    def poll(self) -> None:
+        """Подбирает завершившиеся процессы и перезапускает те, чья задержка истекла"""
+        for pid, child in self._by_pid().items():
+            try:
+                done, status = os.waitpid(pid, os.WNOHANG)
+            except ChildProcessError:
+                done, status = pid, 0
+            if done == pid:
+                self._exited(child, status)
+        if self.stopping:
+            return
+        now = self.clock()
+        for child in self.children:
+            if child.pid is None and child.restart_at is not None and now >= child.restart_at:
+                self.restarts += 1
+                self._spawn(child)
+
+    def stop(self, signum=None, frame=None) -> None:
+        self.stopping = True
+
+    def shutdown(self, timeout: float = 30.0) -> None:
+        """SIGTERM всем процессам; не завершившиеся за timeout получают SIGKILL"""
+        self.stopping = True
+        for pid in self._by_pid():
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        deadline = self.clock() + timeout
+        while self._by_pid() and self.clock() < deadline:
+            self.poll()
+            time.sleep(0.1)
+        for child in self.children:
+            if child.pid is not None:
+                logging.warning(f"Worker process {child.index} did not stop, killing")
+                os.kill(child.pid, signal.SIGKILL)
+                os.waitpid(child.pid, 0)
+                child.pid = None
+
+    def run(self, interval: float = 0.5) -> None:
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        self.start()
+        try:
+            while not self.stopping:
+                self.poll()
+                time.sleep(interval)
+        finally:
+            self.shutdown()
+
+
+def model_budget(total_bytes: int, pinned_bytes: int, processes: int) -> int:
+    """
+    Лимит реестра моделей одного процесса: закреплённые до fork модели хранятся
+    в одной копии, остаток общего лимита делится между процессами
+    """
+    return max(0, total_bytes - pinned_bytes) // processes
+
+
+def run_worker(index: int, cores: List[int], model_bytes: Optional[int] = None) -> None:
+    """Дочерний процесс: свой цикл потребления с отдельным соединением RabbitMQ"""
+    from workers import worker
+
+    if model_bytes is not None:
+        worker.registry.max_bytes = model_bytes
+    logging.info(f"Worker process {index}: {torch.get_num_threads()} threads on cores {cores}, "
+                 f"model budget {worker.registry.max_bytes / 2**20:.0f} MB")
+    worker.main()
+
+
+def main():
+    """
+    python -m workers.supervisor
+
+    Веса моделей загружаются до fork, поэтому все процессы держат в памяти
+    одну их копию (страницы делятся copy-on-write).
+    """
+    from database.database import engine
+    from workers import worker
+
+    cores = available_cores()
+    processes = settings.WORKER_PROCESSES or max(1, len(cores) // settings.WORKER_THREADS_PER_PROCESS)
+    core_sets = split_cores(cores, processes)
+
+    # Без пула потоков OpenMP в родителе: он не переживает fork
+    torch.set_num_threads(1)
+    loaded = worker.preload_models()
+    logging.info(f"Preloaded {loaded} models: {worker.registry.stats()}")
+    # Суммарный объём весов в контейнере не превышает MODEL_CACHE_MAX_MB
+    # при любом числе процессов
+    budget = model_budget(settings.MODEL_CACHE_MAX_MB * 2**20, worker.registry.pinned_bytes, processes)
+    # Соединения БД не должны достаться дочерним процессам
+    engine.dispose()
+    # Сборщик мусора не трогает объекты, созданные до fork, и не копирует их страницы
+    gc.freeze()
+
+    logging.info(f"Starting {processes} worker processes on cores {cores}")
+    Supervisor(functools.partial(run_worker, model_bytes=budget), core_sets).run()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -3,17 +3,12 @@ import json
 import os, glob, logging
 import io
 import time
-import joblib
-import ee
-import requests
 import numpy as np
 import torch
-import wandb
-import torchvision.transforms as T
 from PIL import Image
-from sqlmodel import Session, select
-from typing import Dict
-from datetime import datetime, timedelta
+from dataclasses import dataclass
+from sqlmodel import Session
+from typing import Any, Dict, List, Optional
 
 from database.database import engine
 from database.config import get_settings
@@ -21,9 +16,21 @@ from models.ml_task import MLTasks
 from models.prediction import Predictions
 from models.model import Models
 from models.user_images import UserImages
-from models.recommendation import Recommendation
+from models.task_message import TaskMessage, parse_task_message
 from services.crud import user as UserService
+from services.crud import service as PredictService
+from services.crud import credit_hold as CreditService
 from workers.connect import connect_to_rabbitmq
+from workers.recommendations import recommendation_index
+from workers.model_registry import registry
+from workers.backends import DEFAULT_BACKEND, ONNX, model_ref
+from workers.artifact_store import label_map_version, store as artifact_store
+from workers.object_store import object_store
+from workers.inference import (preprocess, preprocess_derivative, forward_batch,
+                               decode_outputs, to_readable, severity_from_extent)
+from workers.batching import collect_batches, group_by
+from workers.retry import PermanentError, RetryPolicy, make_policy
+from workers.routing import consume_many, declare_model_queue, model_slug, selected_models
 
 
 # Настройка логирования
@@ -31,302 +38,434 @@ logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(
 logging.info("Worker starting up, connecting to RabbitMQ…")
 
 settings = get_settings()
-device = torch.device("cpu")
 
-image_size = (256, 256)
-mean = (0.4536, 0.4510, 0.3253)
-std = (0.2462, 0.2511, 0.2887)
+# Повторы с задержкой и очередь недоставленных для задач классификации:
+# своя политика на каждую потребляемую очередь, общая — для прежней очереди RMQ_QUEUE
+retry_policy = make_policy(settings.RMQ_QUEUE)
+retry_policies: Dict[str, RetryPolicy] = {}
+consumer_queues: Dict[str, str] = {}
+
+
+@dataclass
+class PreparedTask:
+    """Данные задачи, подготовленные к инференсу"""
+    delivery_tag: int
+    task_id: int
+    user_id: int
+    model_id: int
+    cost: float
+    artifact_path: str
+    input_data: str
+    image_url: str
+    latitude: Optional[float]
+    longitude: Optional[float]
+    content_digest: Optional[str] = None
+    derivative_key: Optional[str] = None
+    artifact_digest: Optional[str] = None
+    label_map_version: Optional[str] = None
+    backend: str = DEFAULT_BACKEND
+    tensor: Optional[torch.Tensor] = None
+    # Результат из кэша (изображение уже классифицировано этой моделью)
+    cached_result: Optional[Dict[str, str]] = None
+
+
+class TaskRejected(Exception):
+    """Задачу не нужно выполнять: сообщение подтверждается без инференса"""
+
+    def __init__(self, task_id: int, reason: str):
+        super().__init__(reason)
+        self.task_id = task_id
+
+
+def parse_coordinate(raw: Any, name: str) -> Optional[float]:
+    """Конвертирует координату из сообщения в float, обрабатывая различные случаи"""
+    try:
+        if raw is not None and raw != "" and raw != "null":
+            value = float(raw)
+            logging.info(f'Converted {name}: {raw} -> {value}')
+            return value
+    except (ValueError, TypeError) as e:
+        logging.warning(f'Failed to convert {name} "{raw}": {e}')
+    return None
+
+
+def prepare_task(method, body: bytes) -> PreparedTask:
+    """Разбирает сообщение задачи, скачивает и препроцессит изображение"""
+    msg = parse_task_message(json.loads(body))
+    if isinstance(msg, TaskMessage):
+        prepared = prepare_from_message(method.delivery_tag, msg)
+    else:
+        prepared = prepare_from_db(method.delivery_tag, msg)
+    if prepared.cached_result is None:
+        load_input(prepared)
+    return prepared
+
+
+def prepare_from_message(delivery_tag: int, msg: TaskMessage) -> PreparedTask:
+    """
+    Сообщение версии 2 самодостаточно: БД до финализации не нужна.
+    Резерв кредитов и кэш инференса проверены API при постановке задачи.
+    """
+    logging.info(f'Task {msg.task_id}: v{msg.version} message, coordinates - latitude: {msg.latitude}, longitude: {msg.longitude}')
+    prepared = PreparedTask(
+        delivery_tag=delivery_tag,
+        task_id=msg.task_id,
+        user_id=msg.user_id,
+        model_id=msg.model_id,
+        cost=msg.cost,
+        artifact_path=msg.artifact_path,
+        input_data=msg.object_key,
+        image_url=msg.image_url,
+        latitude=msg.latitude,
+        longitude=msg.longitude,
+        content_digest=msg.content_digest,
+        derivative_key=msg.derivative_key,
+        artifact_digest=msg.artifact_digest,
+        label_map_version=msg.label_map_version,
+        backend=msg.backend,
+        cached_result=msg.cached_result,
+    )
+    if prepared.cached_result is not None:
+        logging.info(f"Task {prepared.task_id}: using cached result recorded at submission")
+    return prepared
+
+
+def prepare_from_db(delivery_tag: int, msg: Dict[str, Any]) -> PreparedTask:
+    """Сообщение версии 1 содержит только id: задачу собираем из БД"""
+    with Session(engine) as session:
+        user = UserService.get_user_by_id(msg["user_id"], session)
+        model_ent = session.get(Models, msg["model_id"])
+        raw_id = msg.get("image_id")
+        image_id = int(raw_id)
+        logging.info(f"Loading UserImages[{image_id}]")
+        user_img = session.get(UserImages, image_id)
+
+        latitude = parse_coordinate(msg.get("latitude"), "latitude")
+        longitude = parse_coordinate(msg.get("longitude"), "longitude")
+
+        # Логируем финальные координаты
+        logging.info(f'Final coordinates - latitude: {latitude}, longitude: {longitude}')
+
+        if not user_img:
+            raise PermanentError(f"Image with id={image_id} not found in UserImages")
+
+        # Не тратим CPU на задачи, которые нельзя оплатить
+        hold = CreditService.get_hold(msg["task_id"], session)
+        if hold is not None and hold.status != CreditService.HELD:
+            raise TaskRejected(msg["task_id"], f"credit hold is {hold.status}")
+        if hold is None and CreditService.available_balance(user.user_id, session) < model_ent.cost:
+            raise TaskRejected(msg["task_id"], "insufficient balance")
+
+        prepared = PreparedTask(
+            delivery_tag=delivery_tag,
+            task_id=msg["task_id"],
+            user_id=user.user_id,
+            model_id=model_ent.model_id,
+            cost=model_ent.cost,
+            artifact_path=msg["artifact_path"],
+            input_data=user_img.input_data,
+            image_url=user_img.image_url,
+            latitude=latitude,
+            longitude=longitude,
+            content_digest=user_img.content_digest,
+            derivative_key=user_img.derivative_data,
+            artifact_digest=model_ent.artifact_digest,
+            backend=model_ent.backend,
+        )
+
+        # То же изображение уже классифицировано этой моделью — инференс не нужен
+        if user_img.content_digest:
+            prepared.cached_result = PredictService.get_cached_inference(
+                user_img.content_digest, prepared.artifact_digest, prepared.backend, session)
+            if prepared.cached_result is not None:
+                logging.info(f"Task {prepared.task_id}: using cached result for image {user_img.content_digest[:12]}")
+    return prepared
+
+
+def load_input(prepared: PreparedTask) -> None:
+    """Скачивает изображение из MinIO (клиент с учётными данными, не public URL)"""
+    # Есть уменьшенная при загрузке копия — скачиваем и декодируем только её
+    if prepared.derivative_key:
+        logging.info(f"Task {prepared.task_id}: downloading derivative {prepared.derivative_key}")
+        data = object_store.get(prepared.derivative_key)
+        prepared.tensor = preprocess_derivative(np.load(io.BytesIO(data), allow_pickle=False))
+        return
+
+    logging.info(f"Task {prepared.task_id}: downloading image {prepared.input_data}")
+    data = object_store.get(prepared.input_data)
+    img = Image.open(io.BytesIO(data)).convert("RGB")
+
+    # Препроцессинг, форма (3, 256, 256)
+    prepared.tensor = preprocess(img)
+
+
+def registry_key(artifact_path: str, artifact_digest: Optional[str], backend: str) -> str:
+    """
+    Ключ реестра моделей: зафиксированная версия артефакта, если она есть в хранилище,
+    и бэкенд инференса модели
+    """
+    if artifact_digest and artifact_store.has(artifact_digest):
+        return model_ref(artifact_digest, backend)
+    return model_ref(artifact_path, backend)
+
+
+def model_key(prepared: PreparedTask) -> str:
+    return registry_key(prepared.artifact_path, prepared.artifact_digest, prepared.backend)
+
+
+def preload_models() -> int:
+    """
+    Загружает и закрепляет в реестре веса активных моделей, которые обслуживает воркер.
+    Супервизор вызывает её до fork, и дочерние процессы делят страницы весов
+    copy-on-write, не вытесняя и не перезагружая их. Сессии ONNX Runtime fork не переживают — такие модели
+    процессы загружают сами при первой задаче. Возвращает число загруженных.
+    """
+    with Session(engine) as session:
+        rows = [m for m in PredictService.get_all_models(session) if m.active]
+    served = set(selected_models([m.artifact_path for m in rows], settings.WORKER_MODELS))
+    loaded = 0
+    for m in rows:
+        if model_slug(m.artifact_path) not in served or m.backend == ONNX:
+            continue
+        try:
+            registry.pin(registry_key(m.artifact_path, m.artifact_digest, m.backend))
+            loaded += 1
+        except Exception as e:
+            logging.warning(f"Cannot preload model {m.artifact_path} ({m.backend}): {e}")
+    return loaded
+
+
+def finish_task(ch, prepared: PreparedTask, readable: Dict[str, str]) -> None:
+    """
+    Сохраняет результат классификации с предварительной рекомендацией.
+    Уточнение стадии роста по Sentinel-1 уходит в отдельную очередь обогащения.
+    """
+    latitude, longitude = prepared.latitude, prepared.longitude
+    enrich = latitude is not None and longitude is not None
+    if not enrich:
+        logging.info(f"Invalid or missing coordinates (lat: {latitude}, lon: {longitude}), skipping satellite data processing")
+
+    # Severity (предполагаем, что в prediction_result есть ключ 'extent')
+    try:
+        severity = severity_from_extent(float(readable["extent"]))
+    except (KeyError, TypeError, ValueError) as e:
+        # Та же модель на том же изображении даст ту же метку — повтор не поможет
+        raise PermanentError(f"Invalid extent label {readable.get('extent')!r}: {e}")
+
+    with Session(engine) as session:
+        # Берём рекомендацию
+        recommendation, source = recommendation_index.lookup(
+            readable["damage"], readable["growth_stage"], severity, session)
+
+        logging.info(f"⛳️ Saving to DB with coordinates: lat={latitude}, lon={longitude} (types: {type(latitude)}, {type(longitude)})")
+        pred_rec = Predictions(
+            user_id=prepared.user_id,
+            model_id=prepared.model_id,
+            input_data=prepared.input_data,
+            input_photo_url=prepared.image_url,
+            input_latitude=latitude,
+            input_longitude=longitude,
+            prediction_result=readable,
+            cost=prepared.cost,
+            recommendation=recommendation,
+            severity=severity,
+            source=source,
+            enrichment_status="pending" if enrich else None
+        )
+
+        # Предсказание, статус задачи и списание — одна транзакция
+        prediction_id, charged = PredictService.finalize_task(prepared.task_id, pred_rec, session)
+        if charged is None:
+            logging.info(f"Task {prepared.task_id}: already finalized as prediction {prediction_id}")
+        elif not charged:
+            logging.warning(f"Task {prepared.task_id}: not enough credits to charge user {prepared.user_id}")
+
+        # Кэш результата — вне транзакции биллинга. Задача уже завершена и оплачена:
+        # ошибка записи в кэш не должна отправлять сообщение на повтор.
+        # Результат кэшируется под дайджестом, только если модель загружена именно по нему
+        if (prepared.content_digest and prepared.cached_result is None
+                and prepared.artifact_digest and artifact_store.has(prepared.artifact_digest)):
+            try:
+                PredictService.save_inference_result(
+                    prepared.content_digest, prepared.artifact_digest, prepared.backend,
+                    readable, session)
+            except Exception as e:
+                session.rollback()
+                logging.warning(f"Task {prepared.task_id}: failed to cache inference result: {e}")
 
-preprocess = T.Compose([
-        T.Resize(image_size),
-        T.ToTensor(),
-        T.Normalize(mean=mean, std=std)
-    ])
+    if enrich:
+        publish_enrichment(ch, prediction_id, prepared.task_id, latitude, longitude)
 
 
-def ml_task(ch, method, properties, body):
+def publish_enrichment(ch, prediction_id: int, task_id: int,
+                       latitude: float, longitude: float) -> None:
+    """Ставит предсказание в очередь уточнения стадии роста по Sentinel-1"""
     try:
-        with Session(engine) as session:
-            msg = json.loads(body)
-            task = session.get(MLTasks, msg["task_id"])
-            user = UserService.get_user_by_id(msg["user_id"], session)
-            model_ent = session.get(Models, msg["model_id"])
-            raw_id = msg.get("image_id")
-            image_id = int(raw_id)
-            logging.info(f"Loading UserImages[{image_id}]")
-            user_img = session.get(UserImages, image_id)
-
-            raw_latitude = msg.get("latitude")
-            raw_longitude = msg.get("longitude")
-            
-            # Конвертируем в float, обрабатывая различные случаи
-            latitude = None
-            longitude = None
-            
-            try:
-                if raw_latitude is not None and raw_latitude != "" and raw_latitude != "null":
-                    latitude = float(raw_latitude)
-                    logging.info(f'Converted latitude: {raw_latitude} -> {latitude}')
-            except (ValueError, TypeError) as e:
-                logging.warning(f'Failed to convert latitude "{raw_latitude}": {e}')
-                
-            try:
-                if raw_longitude is not None and raw_longitude != "" and raw_longitude != "null":
-                    longitude = float(raw_longitude)
-                    logging.info(f'Converted longitude: {raw_longitude} -> {longitude}')
-            except (ValueError, TypeError) as e:
-                logging.warning(f'Failed to convert longitude "{raw_longitude}": {e}')
-            
-            # Логируем финальные координаты
-            logging.info(f'Final coordinates - latitude: {latitude}, longitude: {longitude}')
-
-            if not user_img:
-                raise RuntimeError(f"Image with id={image_id} not found in UserImages")
-
-            model_cache = {}
-
-            # Кэшируем модели в памяти, чтобы не загружать заново
-            def get_model_from_wandb(artifact_path: str) -> tuple[torch.jit.ScriptModule, dict]:
-                if artifact_path in model_cache:
-                    logging.info(f"Using cached model for {artifact_path}")
-                    return model_cache[artifact_path]
-
-                logging.info(f"Downloading model artifact: {artifact_path}")
-                api = wandb.Api()
-                artifact = api.artifact(artifact_path, type="model")
-
-                # Загружаем label maps из metadata
-                raw = artifact.metadata["inverse_label_maps"]
-                label_maps = {
-                    head: {int(k): v for k, v in mapping.items()}
-                    for head, mapping in raw.items()
-                }
-
-                # Ищем файл *_scripted.pt
-                model_path = next((f.name for f in artifact.files() if f.name.endswith("_scripted.pt")), None)
-                if not model_path:
-                    raise FileNotFoundError(f"No *_scripted.pt found in artifact {artifact_path}")
-
-                # Скачиваем файл и читаем
-                local_path = artifact.get_path(model_path).download()
-                with open(local_path, "rb") as f:
-                    buffer = io.BytesIO(f.read())
-                    model = torch.jit.load(buffer, map_location="cpu")
-                    model.eval()
-
-                model_cache[artifact_path] = (model, label_maps)
-                return model, label_maps
-
-            # Используем
-            artifact_path = msg["artifact_path"]
-            model, label_maps = get_model_from_wandb(artifact_path)
-            model.eval()
-
-            # Скачиваем изображение из MinIO (public URL)
-            logging.info(f"Task {msg['task_id']}: model loaded, downloading image")
-            resp = requests.get(user_img.internal_url)
-            resp.raise_for_status()
-            img = Image.open(io.BytesIO(resp.content)).convert("RGB")
-
-            # Препроцессинг
-            x = preprocess(img).unsqueeze(0).to(device)
-            logging.info(f"Shape before model: {tuple(x.shape)}")  # ожидаем (1, 3, 256, 256)
-            logging.info(f"Task {msg['task_id']}: start inference")
+        ch.basic_publish(
+            exchange="",
+            routing_key=settings.RMQ_ENRICH_QUEUE,
+            body=json.dumps({
+                "prediction_id": prediction_id,
+                "task_id": task_id,
+                "latitude": latitude,
+                "longitude": longitude,
+            }),
+            properties=pika.BasicProperties(delivery_mode=2),
+        )
+    except Exception as e:
+        # Результат классификации уже сохранён, задачу не повторяем
+        logging.error(f"Task {task_id}: failed to queue enrichment: {e}", exc_info=True)
+
+
+def process_batch(ch, deliveries: List) -> None:
+    """
+    Обрабатывает пачку сообщений: один прямой проход модели на каждый artifact_path.
+    Предсказание, рекомендация и подтверждение у каждого сообщения независимы.
+    """
+    by_tag = {delivery[0].delivery_tag: delivery for delivery in deliveries}
+    prepared: List[PreparedTask] = []
+    for method, properties, body in deliveries:
+        try:
+            p = prepare_task(method, body)
+        except TaskRejected as e:
+            logging.warning(f"Task {e.task_id} rejected: {e}")
+            reject_task(e.task_id, str(e))
+            ch.basic_ack(method.delivery_tag)
+            continue
+        except Exception as e:
+            logging.error(f"Worker error: {e}", exc_info=True)
+            fail_delivery(ch, (method, properties, body), e)
+            continue
+        if p.cached_result is not None:
+            complete(ch, p, dict(p.cached_result), by_tag[p.delivery_tag])
+        else:
+            prepared.append(p)
+
+    for artifact_path, group in group_by(prepared, model_key).items():
+        try:
+            # Модель берём из процессного реестра, загрузка — только при промахе
+            model, label_maps = registry.get(artifact_path)
+            check_label_maps(group, label_maps)
+            logging.info(f"Tasks {[p.task_id for p in group]}: start inference on batch of {len(group)}")
             t0 = time.time()
 
             # Инференс
-            with torch.no_grad():
-                out = model(x)  # ожидаем dict: head_name -> logits Tensor
+            out = forward_batch(model, [p.tensor for p in group])
 
             elapsed = time.time() - t0
-            logging.info(f"Task {msg['task_id']}: inference done in {elapsed:.3f}s")
-
-            preds: Dict[str, float] = {}
-            # Если out — не dict, приводим к единственной голове
-            if isinstance(out, dict):
-                for head_name, logits in out.items():
-                    if torch.is_tensor(logits):
-                        # для классификации: argmax
-                        val = logits.argmax(dim=1).item()
-                    else:
-                        val = float(logits)
-                    preds[head_name] = val
-            else:
-                # один выход
-                val = out.argmax(dim=1).item() if torch.is_tensor(out) else float(out)
-                preds = {"default": val}
-
-            # Сохраняем предсказание в БД
-            readable = {h: label_maps[h][v] for h, v in preds.items()}
-
-            # Severity (предполагаем, что в prediction_result есть ключ 'extent')
-            extent = float(readable["extent"])
-            if 10 <= extent < 40:
-                sev = "low"
-            elif 40 <= extent < 70:
-                sev = "medium"
-            elif 70 <= extent <= 100:
-                sev = "high"
-            else:
-                sev = "low"
-
-            if latitude is not None and longitude is not None:
-                logging.info(f'Processing valid coordinates - latitude: {latitude}, longitude: {longitude}')
-                # Подключаемся к Google Earth Engine
-                service_account = 'earthengine-service@agrispectra.iam.gserviceaccount.com'
-                credentials = ee.ServiceAccountCredentials(service_account, '/app/workers/earthengine-key.json')
-                ee.Initialize(credentials)
-                point = ee.Geometry.Point([longitude, latitude])
-                end_date = datetime.now()
-                start_date = end_date - timedelta(days=10)
-                end_date_str = end_date.strftime('%Y-%m-%d')
-                start_date_str = start_date.strftime('%Y-%m-%d')
-
-                kmeans_model_cache = {}
-
-                # Определяем стадию роста, Sentinel-1
-                # Загружаем артефакт модели с wandb
-                logging.info(f"Task {msg['task_id']}: loading growth stage model")
-
-                def get_kmeans_model_from_wandb(artifact_path: str) -> joblib:
-                    if artifact_path in kmeans_model_cache:
-                        logging.info(f"Using cached KMeans model for {artifact_path}")
-                        return kmeans_model_cache[artifact_path]
-
-                    logging.info(f"Downloading KMeans model artifact: {artifact_path}")
-                    api = wandb.Api()
-                    artifact = api.artifact(artifact_path, type='model')
-                    # Ищем .pkl или .joblib файл
-                    model_file = next(
-                        (f.name for f in artifact.files() if f.name.endswith(".pkl") or f.name.endswith(".joblib")),
-                        None
-                    )
-                    if not model_file:
-                        raise FileNotFoundError(f"No .pkl or .joblib model found in artifact {artifact_path}")
-
-                    local_path = artifact.get_path(model_file).download()
-                    with open(local_path, "rb") as f:
-                        buffer = io.BytesIO(f.read())
-                        model = joblib.load(buffer)
-
-                    kmeans_model_cache[artifact_path] = model
-                    return model
-                
-                artifact_path_kmeans = 'a-gapeeva/growth-and-moisture-kmeans/growth-kmeans:latest'
-                model_sent = get_kmeans_model_from_wandb(artifact_path_kmeans)
-
-                class_labels_growth = ["S", "V", "F", "M"]  # Seedling, Vegetative, Flowering, Maturity
-
-                # Получаем данные Sentinel-1 для точки
-                sentinel1 = ee.ImageCollection('COPERNICUS/S1_GRD') \
-                    .filterBounds(point) \
-                    .filterDate(start_date_str, end_date_str) \
-                    .select(['VH']) \
-                    .median()
-
-                # Извлекаем значения для точки
-                sentinel_data = sentinel1.reduceRegion(
-                    reducer=ee.Reducer.mean(),
-                    geometry=point,
-                    scale=10,
-                    maxPixels=1e9
-                ).getInfo()
-                
-                # Подготавливаем данные для модели (пример признаков)
-                if 'VH' in sentinel_data and sentinel_data['VH'] is not None:
-                    vh = sentinel_data['VH']
-                    # Создаем одномерный признак для модели
-                    features_growth = np.array([[vh]])
-                    
-                    # Получаем предсказание
-                    growth_prediction = model_sent.predict(features_growth)[0]
-                    predicted_growth_stage = class_labels_growth[growth_prediction]
-                    logging.info(f"Predicted growth stage: {predicted_growth_stage}")
-                else:
-                    predicted_growth_stage = "unknown"
-                    logging.warning("Failed to get Sentinel-1 data")
-                
-                wandb.finish()
-
-                # Проверяем, если предсказанная стадия роста отличается от исходной
-                original_growth_stage = readable.get("growth_stage", "unknown")
-                if predicted_growth_stage != "unknown" and predicted_growth_stage != original_growth_stage:
-                    logging.info(f"Updating growth stage from {original_growth_stage} to {predicted_growth_stage}")
-                    readable["growth_stage"] = predicted_growth_stage
-            else:
-                logging.info(f"Invalid or missing coordinates (lat: {latitude}, lon: {longitude}), skipping satellite data processing")
-
-            # Берём рекомендацию
-            rec_obj = session.exec(
-                select(Recommendation)
-                .where(
-                    Recommendation.damage_type == readable["damage"],
-                    Recommendation.growth_stage == readable["growth_stage"],
-                    Recommendation.severity == sev
-                )
-            ).one_or_none()
-
-            if rec_obj:
-                severity = sev
-                recommendation = rec_obj.recommendation
-                source = rec_obj.source
-            else:
-                severity = sev
-                recommendation = "Рекомендации не найдены для данного сочетания"
-                source = None
-                
-            logging.info(f"⛳️ Saving to DB with coordinates: lat={latitude}, lon={longitude} (types: {type(latitude)}, {type(longitude)})")
-            pred_rec = Predictions(
-                user_id=user.user_id,
-                model_id=model_ent.model_id,
-                input_data=user_img.input_data,
-                input_photo_url=user_img.image_url,
-                input_latitude=latitude,
-                input_longitude=longitude,
-                prediction_result=readable,
-                cost=model_ent.cost,
-                recommendation=recommendation,
-                severity=severity,
-                source=source
-            )
-
-            session.add(pred_rec)
-            session.commit()
-            session.refresh(pred_rec)
-
-            # Обновляем задачу
-            task.prediction_id = pred_rec.prediction_id
-            task.task_status = "complete"
-            task.prediction_result = readable
+            logging.info(f"Batch of {len(group)} for {artifact_path}: inference done in {elapsed:.3f}s")
+            results = [to_readable(preds, label_maps)
+                       for preds in decode_outputs(out, len(group))]
+        except Exception as e:
+            logging.error(f"Worker error: {e}", exc_info=True)
+            for p in group:
+                fail_delivery(ch, by_tag[p.delivery_tag], e)
+            continue
+
+        for p, readable in zip(group, results):
+            complete(ch, p, readable, by_tag[p.delivery_tag])
+
+
+def check_label_maps(group: List[PreparedTask], label_maps) -> None:
+    """Предупреждает, если API поставил задачу под другую версию меток классов"""
+    version = label_map_version(label_maps)
+    for p in group:
+        if p.label_map_version and p.label_map_version != version:
+            logging.warning(f"Task {p.task_id}: label maps {version} differ from "
+                            f"{p.label_map_version} recorded at submission")
+
+
+def reject_task(task_id: int, reason: str) -> None:
+    """Помечает невыполненную задачу как failed с причиной и снимает её резерв"""
+    with Session(engine) as session:
+        task = session.get(MLTasks, task_id)
+        if task is not None and task.task_status != "complete":
+            task.task_status = "failed"
+            task.failure_reason = reason
             session.add(task)
-            session.commit()
-
-            # Списываем баланс
-            UserService.deduct_balance(user.user_id, model_ent.cost, session)
+        CreditService.release_hold(task_id, session)
+        session.commit()
+
+
+def fail_delivery(ch, delivery, error: Exception) -> None:
+    """
+    Неудачная доставка уходит на повтор с задержкой, а после последней попытки —
+    в очередь недоставленных; тогда задача помечается failed и резерв снимается.
+    """
+    method, properties, body = delivery
+    queue = consumer_queues.get(getattr(method, "consumer_tag", None))
+    if not retry_policies.get(queue, retry_policy).fail_or_nack(ch, method, properties, body, error):
+        return
+    try:
+        task_id = int(json.loads(body)["task_id"])
+    except (ValueError, TypeError, KeyError):
+        logging.error(f"Dead-lettered message has no task_id: {body[:200]!r}")
+        return
+    try:
+        reject_task(task_id, f"{type(error).__name__}: {error}")
+    except Exception as e:
+        logging.error(f"Task {task_id}: failed to mark as failed: {e}", exc_info=True)
 
-        ch.basic_ack(method.delivery_tag)
 
+def complete(ch, prepared: PreparedTask, readable: Dict[str, str], delivery) -> None:
+    """Сохраняет результат одной задачи и подтверждает её сообщение"""
+    try:
+        finish_task(ch, prepared, readable)
+        ch.basic_ack(prepared.delivery_tag)
     except Exception as e:
         logging.error(f"Worker error: {e}", exc_info=True)
-        ch.basic_nack(method.delivery_tag)
-
-
-connection = connect_to_rabbitmq()
-channel = connection.channel()
-
-channel.queue_declare(queue=settings.RMQ_QUEUE,
-                      durable=True
-                      )
-channel.basic_consume(queue=settings.RMQ_QUEUE,
-                      on_message_callback=ml_task,
-                      auto_ack=False
-                      )
-
-try:
-    logging.info("Waiting for messages. For exit press Ctrl+C")
-    logging.info(f"Declaring queue '{settings.RMQ_QUEUE}' and starting consume loop")
-    channel.start_consuming()
-except KeyboardInterrupt:
-    logging.info(" [INFO] Остановка по Ctrl+C")
-except Exception as e:
-    logging.info(f"[ERROR] Consumer crashed: {e}")
+        fail_delivery(ch, delivery, e)
+
+
+def ml_task(ch, method, properties, body):
+    process_batch(ch, [(method, properties, body)])
+
+
+def main():
+    # Матрица рекомендаций загружается один раз на старте, дальше — из памяти
+    with Session(engine) as session:
+        recommendation_index.load(session)
+        models = selected_models([m.artifact_path for m in PredictService.get_all_models(session)],
+                                 settings.WORKER_MODELS)
+
+    connection = connect_to_rabbitmq()
+    channel = connection.channel()
+
+    channel.queue_declare(queue=settings.RMQ_ENRICH_QUEUE, durable=True)
+    # Очереди моделей из WORKER_MODELS: воркер держит в памяти только их веса
+    queues = [declare_model_queue(channel, slug) for slug in models]
+    if not settings.WORKER_MODELS:
+        # Дочитываем общую очередь, куда задачи публиковались до очередей моделей
+        channel.queue_declare(queue=settings.RMQ_QUEUE, durable=True)
+        queues.append(settings.RMQ_QUEUE)
+    for queue in queues:
+        retry_policies[queue] = make_policy(queue)
+        retry_policies[queue].declare(channel)
+    # Воркер не берёт из каждой очереди больше сообщений, чем помещается в одну пачку
+    channel.basic_qos(prefetch_count=settings.WORKER_BATCH_SIZE)
+
+    try:
+        logging.info("Waiting for messages. For exit press Ctrl+C")
+        logging.info(f"Consuming from {queues}")
+        if settings.WORKER_BATCH_SIZE > 1:
+            max_wait = settings.WORKER_BATCH_WAIT_MS / 1000
+            tags, events = consume_many(connection, channel, queues, inactivity_timeout=max_wait)
+            consumer_queues.update(tags)
+            for batch in collect_batches(events, settings.WORKER_BATCH_SIZE, max_wait):
+                process_batch(channel, batch)
+        else:
+            for queue in queues:
+                tag = channel.basic_consume(queue=queue,
+                                            on_message_callback=ml_task,
+                                            auto_ack=False
+                                            )
+                consumer_queues[tag] = queue
+            channel.start_consuming()
+    except KeyboardInterrupt:
+        logging.info(" [INFO] Остановка по Ctrl+C")
+    except Exception as e:
+        logging.info(f"[ERROR] Consumer crashed: {e}")
+
+
+if __name__ == "__main__":
+    main()